@@ -0,0 +1,94 @@
+"""Compares the writing of one sound file per event with the writing of an archive.
+
+The WAV files of a few synthetic events are written again and again under different
+event IDs, to isolate the cost of the files from that of the sonification: once as one
+file per event in a directory, then appended to the zip shards of an archive
+(`archive.ArchiveWriter`). The time to read back random events by ID is also reported.
+The gain depends on the file system, which is chosen with --output.
+
+Usage:
+    python benchmarks/bench_archive.py --nevent 5000 --shard-size 1000
+    python benchmarks/bench_archive.py --output /mnt/nfs/tmp
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sonouno_lhc.archive import ArchiveReader, ArchiveWriter
+from sonouno_lhc.encoding import encode_sound, write_samples
+from sonouno_lhc.io import extract_events
+from sonouno_lhc.lhc_data import sonify_event
+
+from synthetic import generate_lines
+
+NSOUND = 5
+NREAD = 200
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nevent', type=int, default=5000)
+    parser.add_argument('--ntrack', type=int, default=2)
+    parser.add_argument('--ncluster', type=int, default=1)
+    parser.add_argument('--shard-size', type=int, default=1000)
+    parser.add_argument('--output', type=Path, help='the directory of the written files')
+    args = parser.parse_args()
+
+    events = list(extract_events(generate_lines(NSOUND, args.ntrack, args.ncluster)))
+    payloads = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for event in events:
+            sound, _ = sonify_event(event, include_plot=False)
+            buffer = io.BytesIO()
+            write_samples(buffer, encode_sound(sound, 'int16'), sound.rate, 'int16')
+            payloads.append(buffer.getvalue())
+    event_ids = [str(_) for _ in range(args.nevent)]
+    size = sum(len(payloads[_ % NSOUND]) for _ in range(args.nevent))
+    sample = random.Random(0).sample(event_ids, min(NREAD, args.nevent))
+
+    with tempfile.TemporaryDirectory(dir=args.output) as tmpdir:
+        directory = Path(tmpdir) / 'files'
+        directory.mkdir()
+        start = time.perf_counter()
+        for index, event_id in enumerate(event_ids):
+            (directory / f'sound-dataset-{event_id}.wav').write_bytes(payloads[index % NSOUND])
+        files_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for event_id in sample:
+            (directory / f'sound-dataset-{event_id}.wav').read_bytes()
+        files_read_time = (time.perf_counter() - start) / len(sample)
+
+        start = time.perf_counter()
+        with ArchiveWriter(Path(tmpdir) / 'archive', args.shard_size) as archive:
+            for index, event_id in enumerate(event_ids):
+                filename = f'sound-dataset-{event_id}.wav'
+                archive.add(event_id, {'sound': (filename, payloads[index % NSOUND])})
+        archive_time = time.perf_counter() - start
+        start = time.perf_counter()
+        with ArchiveReader(Path(tmpdir) / 'archive') as reader:
+            for event_id in sample:
+                reader.read(event_id)
+        archive_read_time = (time.perf_counter() - start) / len(sample)
+        nfile = len(list((Path(tmpdir) / 'archive').iterdir()))
+
+    print(f'{args.nevent} events, {size / 1e6:.0f} MB.')
+    print(f'{"output":8} {"files":>7} {"write s":>8} {"MB/s":>7} {"read ms":>8}')
+    for name, count, elapsed, read_time in [
+        ('files', args.nevent, files_time, files_read_time),
+        ('archive', nfile, archive_time, archive_read_time),
+    ]:
+        print(
+            f'{name:8} {count:7} {elapsed:8.2f} {size / 1e6 / elapsed:7.0f} '
+            f'{read_time * 1000:8.2f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
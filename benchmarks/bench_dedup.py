@@ -0,0 +1,69 @@
+"""Measures the deduplication ratio of the sounds of a dataset, by quantization step.
+
+The plans of the events are fingerprinted (see `plan.EventPlan.fingerprint`) with the
+cluster energies quantized to each step, as they are by `--energy-step`, and the number
+of events per distinct sound is printed, with the time to render the sounds of all the
+events and that to render each distinct sound once. The events are read from HYPATIA
+dumps, or generated: the synthetic events with few tracks and clusters share their
+sounds more often.
+
+Usage:
+    python benchmarks/bench_dedup.py run-299184/*.txt.gz
+    python benchmarks/bench_dedup.py --nevent 1000 --ntrack 1 --ncluster 1
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import time
+
+from sonouno_lhc.batch import plan_events
+from sonouno_lhc.io import chain_sources
+from sonouno_lhc.lhc_sonification import ElementCache
+
+from synthetic import generate_lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('inputs', nargs='*', help='HYPATIA dumps (default: synthetic events)')
+    parser.add_argument('--nevent', type=int, default=1000)
+    parser.add_argument('--ntrack', type=int, default=1)
+    parser.add_argument('--ncluster', type=int, default=1)
+    parser.add_argument('--steps', type=float, nargs='+', default=[0, 0.01, 0.05, 0.1])
+    args = parser.parse_args()
+
+    if args.inputs:
+        source = chain_sources(args.inputs)
+    else:
+        source = generate_lines(args.nevent, args.ntrack, args.ncluster)
+    with contextlib.redirect_stdout(io.StringIO()):
+        plans = list(plan_events(source, strict=False, errors=[]))
+
+    print(f'{len(plans)} events.')
+    print(f'{"step":>6} {"sounds":>7} {"ratio":>6} {"all s":>7} {"dedup s":>8} {"speedup":>8}')
+    for step in args.steps:
+        distinct = {}
+        for plan in plans:
+            distinct.setdefault(plan.fingerprint(step or None), plan)
+        all_time = _timeit(plans, step)
+        dedup_time = _timeit(list(distinct.values()), step)
+        print(
+            f'{step:6g} {len(distinct):7} {len(plans) / len(distinct):6.2f} '
+            f'{all_time:7.2f} {dedup_time:8.2f} {all_time / dedup_time:7.1f}x'
+        )
+
+
+def _timeit(plans: list, step: float) -> float:
+    """Returns the time to render the sounds of plans, with a fresh cache of the elements."""
+    cache = ElementCache(step) if step else None
+    start = time.perf_counter()
+    for plan in plans:
+        plan.to_track(cache)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    main()
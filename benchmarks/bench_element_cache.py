@@ -0,0 +1,69 @@
+"""Measures the cache of the sound elements, with exact and quantized cluster energies.
+
+For each quantization step, the events are rendered twice with a fresh cache: the
+first pass fills the cache, the second one is timed. The hit rate, the speedup over
+the rendering without cache and the largest sample difference are printed.
+
+Usage:
+    python benchmarks/bench_element_cache.py --nevent 100 --ntrack 10 --ncluster 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+
+from sonouno_lhc.io import extract_events
+from sonouno_lhc.lhc_data import plan_event
+from sonouno_lhc.lhc_sonification import MAX_AMPLITUDE, ElementCache, Timeline
+
+from synthetic import generate_lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nevent', type=int, default=100)
+    parser.add_argument('--ntrack', type=int, default=10)
+    parser.add_argument('--ncluster', type=int, default=4)
+    parser.add_argument('--steps', type=float, nargs='+', default=[0, 0.01, 0.05, 0.1])
+    args = parser.parse_args()
+
+    events = list(extract_events(generate_lines(args.nevent, args.ntrack, args.ncluster)))
+    with contextlib.redirect_stdout(io.StringIO()):
+        timelines = [plan_event(_).to_timeline() for _ in events]
+    references = [_.render() for _ in timelines]
+    reference_time = _timeit(timelines, None)
+    nelement = sum(len(_.segments) for _ in timelines)
+    print(f'{args.nevent} events, {nelement / args.nevent:.1f} elements per event.')
+    print(f'no cache: {reference_time * 1000:8.2f} ms per event')
+    print(f'{"step":>8} {"ms/event":>9} {"speedup":>8} {"hit rate":>9} {"MB":>7} {"max error":>10}')
+    for step in args.steps:
+        cache = ElementCache(step)
+        error = max(
+            np.max(np.abs(_.render(cache) - reference), initial=0)
+            for _, reference in zip(timelines, references)
+        )
+        cache.hits = cache.misses = 0
+        elapsed = _timeit(timelines, cache)
+        stats = cache.stats()
+        print(
+            f'{step:8.3f} {elapsed * 1000:9.2f} {reference_time / elapsed:7.1f}x '
+            f'{stats["hit_rate"]:9.1%} {stats["size"] / 2**20:7.1f} '
+            f'{error / MAX_AMPLITUDE:10.2e}'
+        )
+
+
+def _timeit(timelines: list[Timeline], cache: ElementCache | None) -> float:
+    """Returns the average rendering time of an event."""
+    start = time.perf_counter()
+    for timeline in timelines:
+        timeline.render(cache)
+    return (time.perf_counter() - start) / len(timelines)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Compares the rendering of whole events from a timeline with the incremental Track growth.
+
+The reference implementation below appends each element and blank to an audio Track,
+as `lhc_data.sonify_event` used to do, so that the event buffer is reallocated for
+each element.
+
+Usage:
+    python benchmarks/bench_event_render.py --nevent 20 --ntrack 40 --ncluster 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+from sonounolib import Track
+
+from sonouno_lhc import lhc_sonification
+from sonouno_lhc.io import extract_events
+from sonouno_lhc.lhc_data import plan_event
+from sonouno_lhc.plan import SECONDS_BETWEEN_ELEMENTS
+from sonouno_lhc.lhc_sonification import Timeline
+
+from synthetic import generate_lines
+
+
+def legacy_render(timeline: Timeline) -> Track:
+    sound = Track(max_amplitude='int16')
+    for segment in timeline.segments:
+        arguments = () if segment.amplitude is None else (segment.amplitude,)
+        element = getattr(lhc_sonification, segment.name)(*arguments)
+        sound.add_track(element).add_blank(SECONDS_BETWEEN_ELEMENTS)
+    return sound
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nevent', type=int, default=20)
+    parser.add_argument('--ntrack', type=int, default=40)
+    parser.add_argument('--ncluster', type=int, default=20)
+    args = parser.parse_args()
+
+    events = list(extract_events(generate_lines(args.nevent, args.ntrack, args.ncluster)))
+    with contextlib.redirect_stdout(io.StringIO()):
+        timelines = [plan_event(_).to_timeline() for _ in events]
+    nelement = sum(len(_.segments) for _ in timelines)
+    for timeline in timelines[:5]:
+        if not np.array_equal(legacy_render(timeline).get_data(), timeline.to_track().get_data()):
+            raise AssertionError('The rendered event differs from the incremental one.')
+
+    legacy_time = _timeit(legacy_render, timelines)
+    timeline_time = _timeit(Timeline.to_track, timelines)
+    print(f'{args.nevent} events, {nelement / args.nevent:.1f} elements per event.')
+    print(f'incremental: {legacy_time * 1000:8.2f} ms per event')
+    print(f'timeline:    {timeline_time * 1000:8.2f} ms per event ({legacy_time / timeline_time:.1f}x)')
+
+
+def _timeit(function, timelines: list[Timeline]) -> float:
+    """Returns the average time of a call."""
+    start = time.perf_counter()
+    for timeline in timelines:
+        function(timeline)
+    return (time.perf_counter() - start) / len(timelines)
+
+
+if __name__ == '__main__':
+    main()
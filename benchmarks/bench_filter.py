@@ -0,0 +1,87 @@
+"""Compares the selection of events by a filter with the filtering of converted events.
+
+Three selections of the same events are timed:
+
+- objects: all the events are converted, then tested,
+- lines: the filter is evaluated on the raw lines (`iter_event_lines(source, where)`)
+  and only the selected events are converted,
+- store: the filter is evaluated on the columns of an event store (`EventStore.select`)
+  and only the selected events are read.
+
+The default filter selects about 1% of the synthetic events, whose run numbers cycle
+over 100 values.
+
+Usage:
+    python benchmarks/bench_filter.py --nevent 5000 --ntrack 10 --ncluster 4
+    python benchmarks/bench_filter.py --where 'count(tracks.is_muon) >= 3'
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from sonouno_lhc.filters import parse_filter
+from sonouno_lhc.io import convert_event, iter_event_lines
+from sonouno_lhc.store import convert_to_store
+
+from synthetic import write_dump
+
+DEFAULT_WHERE = 'header.run_number == 299042 and any(clusters.energy > 20)'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nevent', type=int, default=5000)
+    parser.add_argument('--ntrack', type=int, default=10)
+    parser.add_argument('--ncluster', type=int, default=4)
+    parser.add_argument('--where', default=DEFAULT_WHERE)
+    args = parser.parse_args()
+
+    where = parse_filter(args.where)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = write_dump(Path(tmpdir) / 'dump.txt', args.nevent, args.ntrack, args.ncluster)
+        store = convert_to_store(path, Path(tmpdir) / 'dump.store')
+
+        def select_objects() -> list[str]:
+            events = [(convert_event(_), _) for _ in iter_event_lines(path)]
+            return [event.id for event, lines in events if where.matches(lines)]
+
+        def select_lines() -> list[str]:
+            return [convert_event(_).id for _ in iter_event_lines(path, where)]
+
+        def select_store() -> list[str]:
+            return [store[_].id for _ in store.select(where)]
+
+        timings = {}
+        selections = {}
+        for name, function in [
+            ('objects', select_objects), ('lines', select_lines), ('store', select_store)
+        ]:
+            timings[name], selections[name] = _timeit(function)
+        if not selections['objects'] == selections['lines'] == selections['store']:
+            raise AssertionError('The selections differ.')
+
+    nselected = len(selections['objects'])
+    print(
+        f'{args.nevent} events, {nselected} selected ({nselected / args.nevent:.2%}) '
+        f'by {where!r}'
+    )
+    for name, seconds in timings.items():
+        print(
+            f'{name:8} {seconds * 1000:9.1f} ms {args.nevent / seconds:10.0f} events/s '
+            f'{timings["objects"] / seconds:6.1f}x'
+        )
+
+
+def _timeit(function: Callable[[], list[str]]) -> tuple[float, list[str]]:
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    main()
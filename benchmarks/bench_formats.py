@@ -0,0 +1,93 @@
+"""Measures the size and the encoding throughput of the sound file formats.
+
+The sounds of synthetic events are encoded and written with each combination of
+encoding, sample format and sampling rate (`encoding.encode_sound` and
+`encoding.write_samples`). For each one, the size of the files per second of audio,
+their compression ratio relative to int16 WAV at the original rate, and the time to
+resample, encode and write them are reported. FLAC is skipped if the soundfile package
+is not installed.
+
+Usage:
+    python benchmarks/bench_formats.py --nevent 10
+    python benchmarks/bench_formats.py --rates 44100 22050 --output /mnt/nfs/tmp
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from pathlib import Path
+
+from sonouno_lhc.encoding import check_encoding, encode_sound, has_flac, write_samples
+from sonouno_lhc.io import extract_events
+from sonouno_lhc.lhc_data import sonify_event
+
+from synthetic import generate_lines
+
+FORMATS = [
+    ('wav', 'int16'),
+    ('wav', 'int8'),
+    ('wav', 'float32'),
+    ('npz', 'int16'),
+    ('npz', 'int8'),
+    ('flac', 'int16'),
+    ('flac', 'int8'),
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nevent', type=int, default=10)
+    parser.add_argument('--ntrack', type=int, default=10)
+    parser.add_argument('--ncluster', type=int, default=4)
+    parser.add_argument('--rates', type=int, nargs='+', default=[44100, 22050, 16000])
+    parser.add_argument('--output', type=Path, help='the directory of the written files')
+    args = parser.parse_args()
+
+    events = list(extract_events(generate_lines(args.nevent, args.ntrack, args.ncluster)))
+    with contextlib.redirect_stdout(io.StringIO()):
+        sounds = [sonify_event(_, include_plot=False)[0] for _ in events]
+    audio_seconds = sum(_.duration for _ in sounds)
+    print(f'{args.nevent} events, {audio_seconds:.0f} s of audio.')
+    if not has_flac():
+        print('FLAC skipped: the soundfile package is not installed.')
+
+    print(f'{"encoding":8} {"format":7} {"rate":>6} {"kB/s":>8} {"ratio":>6} {"audio s/s":>10}')
+    reference_size = None
+    with tempfile.TemporaryDirectory(dir=args.output) as tmpdir:
+        for rate in args.rates:
+            for encoding, format in FORMATS:
+                try:
+                    check_encoding(encoding, format)
+                except ValueError:
+                    continue
+                size, elapsed = _write(sounds, Path(tmpdir), encoding, format, rate)
+                if reference_size is None:
+                    reference_size = size
+                print(
+                    f'{encoding:8} {format:7} {rate:6} {size / audio_seconds / 1000:8.1f} '
+                    f'{reference_size / size:6.1f} {audio_seconds / elapsed:10.0f}'
+                )
+
+
+def _write(sounds, path: Path, encoding: str, format: str, rate: int) -> tuple[int, float]:
+    """Returns the total size of the files and the time to write them."""
+    size = 0
+    start = time.perf_counter()
+    for index, sound in enumerate(sounds):
+        file = path / f'{index}.{encoding}'
+        samples = encode_sound(sound, format, rate)
+        write_samples(file, samples, rate, format, encoding)
+    elapsed = time.perf_counter() - start
+    for index in range(len(sounds)):
+        file = path / f'{index}.{encoding}'
+        size += file.stat().st_size
+        file.unlink()
+    return size, elapsed
+
+
+if __name__ == '__main__':
+    main()
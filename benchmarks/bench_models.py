@@ -0,0 +1,122 @@
+"""Measures the memory footprint of the particle track and cluster models.
+
+The current slotted models are compared with the former dict-based dataclasses, which
+kept most of the columns as strings, and with the rows of the columnar arrays.
+
+Usage:
+    python benchmarks/bench_models.py --events 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import tracemalloc
+from dataclasses import dataclass, fields
+from typing import Callable
+
+from synthetic import generate_lines
+
+from sonouno_lhc.io import convert_batch, iter_event_lines
+from sonouno_lhc.models import Cluster, ParticleTrack
+
+
+@dataclass
+class LegacyParticleTrack:
+    """The particle track model, as a regular dataclass keeping the raw strings."""
+    id: str
+    field1: str
+    field2: str
+    field3: str
+    phi: float
+    theta: float
+    eta: float
+    field7: str
+    field8: str
+    field9: str
+    field10: str
+    is_muon: bool
+    field12: str
+    field13: float
+    field14: float
+    field15: float
+    field16: float
+    field17: float
+    field18: float
+
+    @classmethod
+    def from_data(cls, line: str) -> LegacyParticleTrack:
+        values = line.split()
+        kwargs = {}
+        for field, value in zip(fields(cls), values):
+            if field.type == 'float':
+                value = float(value)
+            elif field.type == 'bool':
+                value = int(value) == 1
+            kwargs[field.name] = value
+        return cls(**kwargs)
+
+
+@dataclass
+class LegacyCluster:
+    """The cluster model, as a regular dataclass keeping the raw strings."""
+    id: str
+    field1: str
+    field2: str
+    energy: float
+    phi: float
+    theta: float
+    eta: float
+    field7: str
+    field8: str
+    field9: str
+    field10: str
+    field11: str
+    field12: str
+    field13: str
+    field14: str
+    field15: str
+    field16: str
+    field17: str
+    field18: str
+
+    from_data = LegacyParticleTrack.from_data
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--tracks', type=int, default=10)
+    parser.add_argument('--clusters', type=int, default=4)
+    args = parser.parse_args()
+
+    events_lines = list(iter_event_lines(generate_lines(args.events, args.tracks, args.clusters)))
+    track_lines = [line for lines in events_lines for line in lines if line.startswith('track')]
+    cluster_lines = [line for lines in events_lines for line in lines if line.startswith('cluster')]
+
+    print(f'{"model":22} {"bytes/track":>12} {"bytes/cluster":>14}')
+    for name, track_factory, cluster_factory in [
+        ('legacy dataclass', LegacyParticleTrack.from_data, LegacyCluster.from_data),
+        ('slotted dataclass', ParticleTrack.from_data, Cluster.from_data),
+    ]:
+        track_size = _measure(track_factory, track_lines)
+        cluster_size = _measure(cluster_factory, cluster_lines)
+        print(f'{name:22} {track_size:12.0f} {cluster_size:14.0f}')
+
+    batch = convert_batch(events_lines)
+    print(f'{"structured array row":22} {batch.tracks.itemsize:12} {batch.clusters.itemsize:14}')
+
+
+def _measure(factory: Callable[[str], object], lines: list[str]) -> float:
+    """Returns the number of bytes allocated per instance."""
+    gc.collect()
+    tracemalloc.start()
+    instances = [factory(line) for line in lines]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del instances
+    return size / len(lines)
+
+
+if __name__ == '__main__':
+    main()
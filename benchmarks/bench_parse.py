@@ -0,0 +1,74 @@
+"""Compares the object and columnar parsers on a large synthetic HYPATIA dump.
+
+Usage:
+    python benchmarks/bench_parse.py --events 20000 --tracks 10 --clusters 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from synthetic import write_dump
+
+from sonouno_lhc.io import convert_batch, convert_event, extract_batches, extract_events, iter_event_lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=20_000)
+    parser.add_argument('--tracks', type=int, default=10)
+    parser.add_argument('--clusters', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = write_dump(Path(tmpdir) / 'dump.txt', args.events, args.tracks, args.clusters)
+        size = path.stat().st_size / 2**20
+        print(f'{args.events} events, {args.tracks} tracks and {args.clusters} clusters per event ({size:.1f} MiB)')
+
+        events_lines = list(iter_event_lines(path))
+        batches_lines = [
+            events_lines[start:start + args.batch_size]
+            for start in range(0, len(events_lines), args.batch_size)
+        ]
+
+        def convert_events() -> None:
+            for lines in events_lines:
+                convert_event(lines)
+
+        def convert_batches() -> None:
+            for lines in batches_lines:
+                convert_batch(lines)
+
+        def read_events() -> None:
+            for event in extract_events(path):
+                pass
+
+        def read_batches() -> None:
+            for batch in extract_batches(path, args.batch_size):
+                pass
+
+        for title, functions in [
+            ('Conversion of in-memory lines', [('convert_event', convert_events), ('convert_batch', convert_batches)]),
+            ('Reading and conversion', [('extract_events', read_events), ('extract_batches', read_batches)]),
+        ]:
+            print(f'\n{title}')
+            timings = []
+            for name, function in functions:
+                timings.append(min(_timeit(function) for _ in range(args.repeat)))
+                print(f'  {name:15} {timings[-1]:8.3f} s  {args.events / timings[-1]:12,.0f} events/s')
+            print(f'  {"speedup":15} {timings[0] / timings[1]:8.1f}x')
+
+
+def _timeit(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    main()
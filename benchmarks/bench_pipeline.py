@@ -0,0 +1,75 @@
+"""Compares the sequential sonification of a dump with the pipelined one.
+
+The events are sonified by `batch.sonify_events` in the current process, where the
+writes of each event wait for its synthesis and conversely, then by a `Pipeline`, whose
+writer threads write the outputs while the next events are synthesized. The gain
+depends on the share of the writes, which is larger on a slow or network-mounted
+output volume, given with --output.
+
+Usage:
+    python benchmarks/bench_pipeline.py --nevent 100 --writers 2
+    python benchmarks/bench_pipeline.py --nevent 20 --plot --output /mnt/nfs/tmp
+"""
+
+from __future__ import annotations
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from sonouno_lhc.batch import sonify_events
+from sonouno_lhc.pipeline import Pipeline
+
+from synthetic import write_dump
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nevent', type=int, default=100)
+    parser.add_argument('--ntrack', type=int, default=10)
+    parser.add_argument('--ncluster', type=int, default=4)
+    parser.add_argument('--plot', action='store_true')
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=4)
+    parser.add_argument('--output', type=Path, help='the parent of the output directories')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = write_dump(Path(tmpdir) / 'dump.txt', args.nevent, args.ntrack, args.ncluster)
+        output_path = Path(tempfile.mkdtemp(dir=args.output or tmpdir))
+        try:
+            start = time.perf_counter()
+            for result in sonify_events(path, output_path / 'sequential', args.plot):
+                assert result.ok, result.error
+            sequential_time = time.perf_counter() - start
+
+            pipeline = Pipeline(
+                output_path / 'pipeline', args.plot, writers=args.writers,
+                queue_size=args.queue_size,
+            )
+            start = time.perf_counter()
+            for result in pipeline.run(path):
+                assert result.ok, result.error
+            pipeline_time = time.perf_counter() - start
+        finally:
+            shutil.rmtree(output_path)
+
+    print(f'{args.nevent} events, {"with" if args.plot else "without"} plots.')
+    print(f'sequential: {sequential_time / args.nevent * 1000:8.2f} ms per event')
+    print(
+        f'pipeline:   {pipeline_time / args.nevent * 1000:8.2f} ms per event '
+        f'({sequential_time / pipeline_time:.2f}x)'
+    )
+    print(f'{"stage":8} {"threads":>7} {"busy":>6} {"starved":>8} {"blocked":>8}')
+    for stats in pipeline.stats.values():
+        total = stats.elapsed * stats.workers
+        print(
+            f'{stats.name:8} {stats.workers:7} {stats.utilization:6.0%} '
+            f'{stats.starved / total:8.0%} {stats.blocked / total:8.0%}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Measures the parsing of the Tiles and Clusters sections into arrays.
+
+The conversion of the events is timed without accessing the sections, which are only
+kept as lines, then with their arrays, and with the creation of one Python object per
+row instead of the arrays.
+
+Usage:
+    python benchmarks/bench_sections.py --nevent 200 --ntile 5000 --nhit 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from sonouno_lhc.io import convert_event, iter_event_lines
+
+from synthetic import generate_lines
+
+
+@dataclass(slots=True)
+class Tile:
+    id: int
+    et: float
+    phi: float
+    theta: float
+
+
+@dataclass(slots=True)
+class ClusterHit:
+    et: float
+    phi: float
+    theta: float
+    cluster: str
+    kind: int
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nevent', type=int, default=200)
+    parser.add_argument('--ntrack', type=int, default=10)
+    parser.add_argument('--ncluster', type=int, default=4)
+    parser.add_argument('--ntile', type=int, default=5000)
+    parser.add_argument('--nhit', type=int, default=20)
+    args = parser.parse_args()
+
+    lines = generate_lines(
+        args.nevent, args.ntrack, args.ncluster, ntile=args.ntile, nhit=args.nhit
+    )
+    events_lines = list(iter_event_lines(lines))
+
+    def convert_only() -> None:
+        for lines in events_lines:
+            convert_event(lines)
+
+    def convert_arrays() -> None:
+        for lines in events_lines:
+            event = convert_event(lines)
+            event.tiles
+            for cluster in event.clusters:
+                event.get_cluster_hits(cluster.id)
+
+    def convert_objects() -> None:
+        for lines in events_lines:
+            event = convert_event(lines)
+            tiles = [_parse_tile(_) for _ in event.sections['Tiles']]
+            hits: dict[str, list[ClusterHit]] = {}
+            for line in event.sections['Clusters']:
+                hit = _parse_cluster_hit(line)
+                hits.setdefault(hit.cluster, []).append(hit)
+            del tiles
+
+    print(
+        f'{args.nevent} events, {args.ntile} tiles and {args.ncluster} x {args.nhit} '
+        'cluster hits per event.'
+    )
+    timings = {
+        name: _timeit(function, args.nevent)
+        for name, function in [
+            ('lines only', convert_only), ('arrays', convert_arrays), ('objects', convert_objects)
+        ]
+    }
+    for name, elapsed in timings.items():
+        print(
+            f'{name:10} {elapsed * 1000:8.2f} ms per event '
+            f'({timings["objects"] / elapsed:.1f}x faster than objects)'
+        )
+
+
+def _parse_tile(line: str) -> Tile:
+    id_, et, phi, theta = line.split()
+    return Tile(int(id_), float(et), float(phi), float(theta))
+
+
+def _parse_cluster_hit(line: str) -> ClusterHit:
+    et, phi, theta, cluster, kind = line.split()
+    return ClusterHit(float(et), float(phi), float(theta), cluster, int(kind))
+
+
+def _timeit(function: Callable[[], None], nevent: int) -> float:
+    """Returns the time per event."""
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) / nevent
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Compares the cached sonification templates with a synthesis from scratch.
+
+The reference implementation below reloads the bip and synthesizes every sine wave
+for each element, as the sonification primitives used to do.
+
+Usage:
+    python benchmarks/bench_synthesis.py --repeat 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from sonounolib import Track
+
+from sonouno_lhc import lhc_sonification
+from sonouno_lhc.lhc_sonification import DEFAULT_AMPLITUDE
+
+BIP_PATH = Path(lhc_sonification.__file__).parent / 'bip.wav'
+
+
+def legacy_bip() -> Track:
+    return Track.load(BIP_PATH, max_amplitude='int16')
+
+
+def legacy_add_cluster(sound: Track, amplitude: float) -> None:
+    if amplitude != 0:
+        amplitude = amplitude * 2000 + 100
+    for frequency in lhc_sonification.CLUSTER_FREQUENCIES:
+        sound.add_sine_wave(frequency, 0.1, amplitude)
+
+
+def legacy_muontrack_with_cluster(amplitude: float) -> Track:
+    sound = legacy_bip()
+    sound.add_sine_wave('D6', 2, DEFAULT_AMPLITUDE)
+    sound.add_sine_wave('F7', 0.1, DEFAULT_AMPLITUDE)
+    cue = sound.duration
+    legacy_add_cluster(sound, amplitude)
+    sound.set_cue_write(cue).add_sine_wave('D6', 1, DEFAULT_AMPLITUDE)
+    sound.add_sine_wave('D6', 2, DEFAULT_AMPLITUDE)
+    return sound.add_blank(0.5)
+
+
+def legacy_muontrack_only() -> Track:
+    sound = legacy_bip()
+    sound.add_sine_wave('D6', 2, DEFAULT_AMPLITUDE)
+    sound.add_sine_wave('F7', 0.1, DEFAULT_AMPLITUDE)
+    cue = sound.duration
+    sound.set_cue_write(cue).add_sine_wave('D6', 1, DEFAULT_AMPLITUDE)
+    sound.add_sine_wave('D6', 2, DEFAULT_AMPLITUDE)
+    return sound.add_blank(0.5)
+
+
+def legacy_singletrack_with_cluster(amplitude: float) -> Track:
+    sound = legacy_bip()
+    sound.add_sine_wave('D6', 2, DEFAULT_AMPLITUDE)
+    sound.add_sine_wave('F7', 0.1, DEFAULT_AMPLITUDE)
+    legacy_add_cluster(sound, amplitude)
+    return sound
+
+
+def legacy_doubletrack_withcluster(amplitude: float) -> Track:
+    sound = legacy_bip()
+    cue = sound.duration
+    sound.add_sine_wave('C6', 2, DEFAULT_AMPLITUDE)
+    sound.set_cue_write(cue).add_sine_wave('D6', 2, DEFAULT_AMPLITUDE)
+    sound.add_sine_wave('F7', 0.1, DEFAULT_AMPLITUDE)
+    legacy_add_cluster(sound, amplitude)
+    return sound
+
+
+def legacy_singletrack_only() -> Track:
+    sound = legacy_bip()
+    sound.add_sine_wave('D6', 2, DEFAULT_AMPLITUDE)
+    return sound.add_sine_wave('F7', 0.1, DEFAULT_AMPLITUDE)
+
+
+def legacy_cluster_only(amplitude: float) -> Track:
+    sound = legacy_bip()
+    sound.add_blank(2)
+    sound.add_sine_wave('F7', 0.1, DEFAULT_AMPLITUDE)
+    legacy_add_cluster(sound, amplitude)
+    return sound
+
+
+ELEMENTS: list[tuple[str, Callable[..., Track], Callable[..., Track], bool]] = [
+    ('muontrack_with_cluster', legacy_muontrack_with_cluster, lhc_sonification.muontrack_with_cluster, True),
+    ('muontrack_only', legacy_muontrack_only, lhc_sonification.muontrack_only, False),
+    ('singletrack_with_cluster', legacy_singletrack_with_cluster, lhc_sonification.singletrack_with_cluster, True),
+    ('doubletrack_withcluster', legacy_doubletrack_withcluster, lhc_sonification.doubletrack_withcluster, True),
+    ('singletrack_only', legacy_singletrack_only, lhc_sonification.singletrack_only, False),
+    ('cluster_only', legacy_cluster_only, lhc_sonification.cluster_only, True),
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    amplitudes = np.random.default_rng(0).uniform(0, 1.5, args.repeat).tolist()
+    print('Time per element, in milliseconds, and speedup with respect to the legacy synthesis.')
+    print('"track" returns an audio Track, "samples" returns the NumPy array of samples.\n')
+    print(f'{"element":26} {"legacy":>8} {"track":>8} {"samples":>8} {"speedup":>17}')
+    for name, legacy, cached, has_cluster in ELEMENTS:
+        arguments = [(_,) if has_cluster else () for _ in amplitudes]
+        for argument in arguments[:10]:
+            expected = legacy(*argument).get_data()
+            if not np.array_equal(expected, cached(*argument).get_data()) or not np.array_equal(
+                expected, lhc_sonification.get_element_data(name, *argument)
+            ):
+                raise AssertionError(f'The cached {name} sound differs from the legacy one.')
+        legacy_time = _timeit(legacy, arguments)
+        track_time = _timeit(cached, arguments)
+        data_time = _timeit(lambda *_: lhc_sonification.get_element_data(name, *_), arguments)
+        print(
+            f'{name:26} {legacy_time * 1000:8.3f} {track_time * 1000:8.3f} {data_time * 1000:8.3f} '
+            f'{legacy_time / track_time:7.1f}x {legacy_time / data_time:7.1f}x'
+        )
+
+
+def _timeit(function: Callable[..., object], arguments: list[tuple[float, ...]]) -> float:
+    """Returns the average time of a call."""
+    start = time.perf_counter()
+    for argument in arguments:
+        function(*argument)
+    return (time.perf_counter() - start) / len(arguments)
+
+
+if __name__ == '__main__':
+    main()
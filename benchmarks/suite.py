@@ -0,0 +1,256 @@
+"""Times each stage of the sonification of synthetic HYPATIA dumps.
+
+The stages are run one after the other on each event, and timed separately:
+
+- parse: reading and converting the lines of the event (`iter_event_lines`, `convert_event`),
+- match: finding the clusters and partner tracks of each track (`match_event`),
+- plan: choosing the sound elements of the event (`plan_event`, which matches again),
+- synthesize: rendering the samples of the event (`EventPlan.to_track`),
+- write: writing the WAV file (`Track.to_wav`),
+- plot: drawing the plan of the event (`draw_plan`), only with --plot-events,
+- savefig: rendering the PNG file (`EventPlot.savefig`), only with --plot-events.
+
+The report is written in JSON, with the throughput of each stage in events and audio
+seconds per wall-clock second and the peak memory. A report from a previous version
+can be given with --compare, to print the speedup of each stage.
+
+Usage:
+    python benchmarks/suite.py --events 200 --tracks 10 --clusters 4 --output report.json
+    python benchmarks/suite.py --compare report.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from importlib import metadata
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from synthetic import write_dump
+
+from sonouno_lhc.io import convert_event, iter_event_lines
+from sonouno_lhc.lhc_data import draw_plan, plan_event
+from sonouno_lhc.lhc_plot import EventPlot
+from sonouno_lhc.matching import match_event
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ['parse', 'match', 'plan', 'synthesize', 'write']
+PLOT_STAGES = ['plot', 'savefig']
+
+
+def run_stages(path: Path, output_path: Path, nevent_plot: int, traced: bool = False) -> dict:
+    """Runs the stages on each event of a dump.
+
+    Parameters:
+        path: The path of the HYPATIA dump.
+        output_path: The directory in which the sound and plot files are written.
+        nevent_plot: The number of events that are also plotted.
+        traced: If set to True, the peak memory allocated by each stage is measured
+            with tracemalloc, instead of its duration.
+
+    Returns:
+        The total duration (or the peak memory) of each stage, the number of events,
+        and the duration of the rendered sounds.
+    """
+    measures: dict[str, float] = defaultdict(float)
+    counts: dict[str, int] = defaultdict(int)
+    audio_seconds = 0.0
+    plot = EventPlot() if nevent_plot else None
+
+    @contextlib.contextmanager
+    def stage(name: str) -> Iterator[None]:
+        counts[name] += 1
+        if traced:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            yield
+            measures[name] = max(measures[name], tracemalloc.get_traced_memory()[1] - before)
+        else:
+            start = time.perf_counter()
+            yield
+            measures[name] += time.perf_counter() - start
+
+    events_lines = iter_event_lines(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for index in itertools.count():
+            with stage('parse'):
+                lines = next(events_lines, None)
+                event = convert_event(lines) if lines is not None else None
+            if event is None:
+                counts['parse'] -= 1
+                break
+            with stage('match'):
+                match_event(event)
+            with stage('plan'):
+                plan = plan_event(event)
+            with stage('synthesize'):
+                timeline = plan.to_timeline()
+                sound = timeline.to_track()
+            with stage('write'):
+                sound.to_wav(output_path / f'{event.id}.wav')
+            audio_seconds += timeline.duration
+            if index < nevent_plot:
+                with stage('plot'):
+                    plot.reset()
+                    draw_plan(plan, event, plot)
+                with stage('savefig'):
+                    plot.savefig(output_path / f'{event.id}.png', format='png')
+    return {'measures': dict(measures), 'counts': dict(counts), 'audio_seconds': audio_seconds}
+
+
+def get_report(args: argparse.Namespace) -> dict:
+    """Runs the benchmark and returns its report."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        path = write_dump(tmpdir / 'dump.txt', args.events, args.tracks, args.clusters, args.seed)
+        small_path = write_dump(
+            tmpdir / 'small.txt', args.memory_events, args.tracks, args.clusters, args.seed
+        )
+        run_stages(small_path, tmpdir, min(1, args.plot_events))  # warm up the caches
+        timings = run_stages(path, tmpdir, args.plot_events)
+        # tracemalloc slows down the allocations: the memory is measured on fewer events
+        tracemalloc.start()
+        nevent_plot = min(args.plot_events, args.memory_events)
+        memory = run_stages(small_path, tmpdir, nevent_plot, traced=True)
+        tracemalloc.stop()
+
+    audio_seconds = timings['audio_seconds']
+    stages = {}
+    for stage, seconds in timings['measures'].items():
+        nevent = timings['counts'][stage]
+        stages[stage] = {
+            'events': nevent,
+            'seconds': seconds,
+            'ms_per_event': 1000 * seconds / nevent,
+            'events_per_second': nevent / seconds,
+            'peak_traced_mb': memory['measures'].get(stage, 0) / 2**20,
+        }
+        if stage not in PLOT_STAGES:
+            stages[stage]['audio_seconds_per_second'] = audio_seconds / seconds
+
+    total = sum(timings['measures'][_] for _ in STAGES)
+    plot_seconds_per_event = sum(stages[_]['ms_per_event'] for _ in PLOT_STAGES if _ in stages) / 1000
+    total_with_plot = total + plot_seconds_per_event * args.events
+    return {
+        'version': _get_version(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'parameters': {
+            'events': args.events,
+            'tracks': args.tracks,
+            'clusters': args.clusters,
+            'seed': args.seed,
+            'plot_events': args.plot_events,
+        },
+        'audio_seconds': audio_seconds,
+        'stages': stages,
+        'total': {
+            'without_plot': {
+                'seconds': total,
+                'events_per_second': args.events / total,
+                'audio_seconds_per_second': audio_seconds / total,
+            },
+            # Extrapolated from the plotted events
+            'with_plot': {
+                'seconds': total_with_plot,
+                'events_per_second': args.events / total_with_plot,
+                'audio_seconds_per_second': audio_seconds / total_with_plot,
+            },
+        },
+        'peak_rss_mb': _get_peak_rss_mb(),
+    }
+
+
+def print_report(report: dict, baseline: dict | None = None) -> None:
+    """Prints a summary of the report, compared with a baseline if specified."""
+    parameters = report['parameters']
+    print(
+        f'{parameters["events"]} events, {parameters["tracks"]} tracks and '
+        f'{parameters["clusters"]} clusters per event, {report["audio_seconds"]:.0f} s of audio.',
+        file=sys.stderr,
+    )
+    header = f'{"stage":12} {"ms/event":>10} {"events/s":>10} {"audio s/s":>10} {"peak MB":>8}'
+    if baseline is not None:
+        header += f' {"speedup":>8}'
+    print(header, file=sys.stderr)
+    for stage, values in report['stages'].items():
+        line = (
+            f'{stage:12} {values["ms_per_event"]:10.3f} {values["events_per_second"]:10.1f} '
+            f'{values.get("audio_seconds_per_second", float("nan")):10.1f} '
+            f'{values["peak_traced_mb"]:8.1f}'
+        )
+        if baseline is not None and stage in baseline['stages']:
+            line += f' {baseline["stages"][stage]["ms_per_event"] / values["ms_per_event"]:7.2f}x'
+        print(line, file=sys.stderr)
+    for name, values in report['total'].items():
+        print(
+            f'total ({name.replace("_", " ")}): {values["events_per_second"]:.1f} events/s, '
+            f'{values["audio_seconds_per_second"]:.1f} audio s/s',
+            file=sys.stderr,
+        )
+    if report['peak_rss_mb'] is not None:
+        print(f'peak RSS: {report["peak_rss_mb"]:.0f} MB', file=sys.stderr)
+
+
+def _get_version() -> str:
+    try:
+        return metadata.version('sonouno_lhc')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+def _get_peak_rss_mb() -> float | None:
+    """Returns the peak resident memory of the process, in MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--tracks', type=int, default=8)
+    parser.add_argument('--clusters', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--plot-events', type=int, default=10, help='number of events that are also plotted'
+    )
+    parser.add_argument(
+        '--memory-events', type=int, default=20,
+        help='number of events on which the peak memory of the stages is measured',
+    )
+    parser.add_argument('--output', type=Path, help='path of the JSON report (default: stdout)')
+    parser.add_argument('--compare', type=Path, help='path of a JSON report to compare with')
+    args = parser.parse_args()
+
+    report = get_report(args)
+    baseline = json.loads(args.compare.read_text()) if args.compare is not None else None
+    print_report(report, baseline)
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        args.output.write_text(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Generator of synthetic HYPATIA dumps, for benchmarking purposes.
+
+The generated events follow the layout of the data sample shipped with the package,
+with a configurable number of tracks and clusters per event.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+SEPARATOR = '---------------------------------'
+
+
+def generate_lines(
+    nevent: int,
+    ntrack: int = 8,
+    ncluster: int = 3,
+    seed: int = 0,
+    ntile: int = 0,
+    nhit: int = 0,
+) -> Iterator[str]:
+    """Yields the lines of a synthetic HYPATIA dump.
+
+    Parameters:
+        nevent: The number of events.
+        ntrack: The number of particle tracks per event.
+        ncluster: The number of clusters per event.
+        seed: The seed of the random generator.
+        ntile: The number of hits in the Tiles section of each event.
+        nhit: The number of constituent hits of each cluster, in the Clusters section.
+    """
+    rng = np.random.default_rng(seed)
+    for ievent in range(nevent):
+        event_id = 100_000_000 + ievent
+        yield str(event_id)
+        yield (
+            f'{rng.uniform(0, 100):g} {rng.uniform(-np.pi, np.pi):g} 2016-05-15 00:23:55 CEST '
+            f'{event_id} {299_000 + ievent % 100} 107.499 0 1'
+        )
+
+        # Clusters are drawn first, so that some tracks can point to them
+        cluster_phis = rng.uniform(-np.pi, np.pi, ncluster)
+        cluster_thetas = rng.uniform(0, np.pi, ncluster)
+        phis = rng.uniform(-np.pi, np.pi, ntrack)
+        thetas = rng.uniform(0, np.pi, ntrack)
+        if ncluster:
+            pointing = rng.random(ntrack) < 0.5
+            targets = rng.integers(ncluster, size=ntrack)
+            phis[pointing] = cluster_phis[targets[pointing]] + rng.normal(0, 0.02, pointing.sum())
+            thetas[pointing] = cluster_thetas[targets[pointing]] + rng.normal(0, 0.02, pointing.sum())
+
+        for itrack in range(ntrack):
+            charge = '+' if rng.random() < 0.5 else '-'
+            is_muon = int(rng.random() < 0.2)
+            eta = -np.log(np.tan(thetas[itrack] / 2))
+            start = rng.normal(0, 3, 3)
+            stop = rng.uniform(-250, 250, 3)
+            yield (
+                f'track_{itrack + 1} {charge} {rng.uniform(1, 100):g} {rng.uniform(1, 50):g} '
+                f'{phis[itrack]:g} {thetas[itrack]:g} {eta:g} {1 / np.tan(thetas[itrack]):g} '
+                f'{rng.normal(0, 0.1):g} 0 0 {is_muon} 0 '
+                + ' '.join(f'{_:g}' for _ in np.concatenate([start, stop]))
+            )
+
+        for icluster in range(ncluster):
+            eta = -np.log(np.tan(cluster_thetas[icluster] / 2))
+            yield (
+                f'cluster_{icluster + 1} 0 {rng.uniform(1, 150):g} {rng.uniform(1, 100):g} '
+                f'{cluster_phis[icluster]:g} {cluster_thetas[icluster]:g} {eta:g} {eta:g} '
+                f'0 {rng.normal(0, 1):g} 0 5 1 0 0 0 0 0 0'
+            )
+        # The sections are only drawn when requested, to keep the other events unchanged
+        if ntile or nhit:
+            yield from _generate_sections(rng, ntile, nhit, cluster_phis, cluster_thetas)
+        yield SEPARATOR
+
+
+def _generate_sections(
+    rng: np.random.Generator,
+    ntile: int,
+    nhit: int,
+    cluster_phis: np.ndarray,
+    cluster_thetas: np.ndarray,
+) -> Iterator[str]:
+    """Yields the Hits, Clusters and Tiles sections of an event."""
+    yield 'Hits'
+    yield 'Clusters'
+    for icluster, (phi, theta) in enumerate(zip(cluster_phis, cluster_thetas)):
+        for _ in range(nhit):
+            yield (
+                f'{rng.exponential(2):g} {phi + rng.normal(0, 0.02):g} '
+                f'{theta + rng.normal(0, 0.02):g} cluster_{icluster + 1} 3'
+            )
+    yield 'Tiles'
+    for itile in range(ntile):
+        yield (
+            f'{itile} {rng.exponential(0.5):g} {rng.uniform(-np.pi, np.pi):g} '
+            f'{rng.uniform(0, np.pi):g}'
+        )
+    yield from ['RPC', 'TGC', 'MDT', 'CSC']
+
+
+def write_dump(
+    path: str | Path,
+    nevent: int,
+    ntrack: int = 8,
+    ncluster: int = 3,
+    seed: int = 0,
+    ntile: int = 0,
+    nhit: int = 0,
+) -> Path:
+    """Writes a synthetic HYPATIA dump and returns its path."""
+    path = Path(path)
+    with path.open('w') as f:
+        for line in generate_lines(nevent, ntrack, ncluster, seed, ntile, nhit):
+            f.write(line + '\n')
+    return path
@@ -1,29 +1,498 @@
+"""Command-line interface: python -m sonouno_lhc [INPUT ...] [options]."""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import glob
+import logging
+import os
+import sys
 from importlib import resources
 from pathlib import Path
+from typing import Iterator
 
 from sonouno_lhc import data
-from sonouno_lhc.lhc_data import sonify_event
-from sonouno_lhc.io import extract_events
+from sonouno_lhc.archive import DEFAULT_SHARD_SIZE, ArchiveWriter
+from sonouno_lhc.batch import plan_events, render_plans, select_events, sonify_events
+from sonouno_lhc.dedup import DEDUP_FILENAME, DedupStats
+from sonouno_lhc.encoding import ENCODINGS, check_encoding
+from sonouno_lhc.filters import parse_filter
+from sonouno_lhc.io import ParseError, Source, chain_sources
+from sonouno_lhc.lhc_sonification import get_rate
+from sonouno_lhc.metrics import Metrics
+from sonouno_lhc.pipeline import DEFAULT_QUEUE_SIZE, DEFAULT_WRITERS, Pipeline
+from sonouno_lhc.plan import load_plans, save_plans
+from sonouno_lhc.realtime import (
+    DEFAULT_LATENCY, DEFAULT_LOOKAHEAD, NullSink, RealtimePlayer, SoundDeviceSink
+)
+from sonouno_lhc.store import convert_to_store, is_store
+from sonouno_lhc.wav import WavStreamWriter
 
 DATA = resources.files(data)
 OUTPUT_PATH = Path('sonouno-lhc-outputs')
-OUTPUT_PATH.mkdir(exist_ok=True)
 
 
-def sonify_events(path: Path, include_plot) -> None:
-    data = path.read_text().split('\n')
-    for event in extract_events(data):
-        sound, fig = sonify_event(event, include_plot=include_plot)
+def main(argv: list[str] | None = None) -> int:
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        format='%(message)s',
+        level={0: logging.WARNING, 1: logging.INFO}.get(args.verbose, logging.DEBUG),
+    )
+    try:
+        check_encoding(args.encoding, args.format)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.rate is not None and args.rate <= 0:
+        parser.error(f'the sampling rate is not positive: {args.rate}')
+
+    if args.from_plans is not None:
+        if args.inputs or args.plot or args.play or args.stream is not None:
+            parser.error('--from-plans cannot be used with inputs, --plot, --play or --stream')
+        return render(args)
+
+    try:
+        sources = list(expand_inputs(args.inputs))
+    except FileNotFoundError as exc:
+        parser.error(str(exc))
+
+    stores = [_ for _ in sources if isinstance(_, Path) and is_store(_)]
+    if stores:
+        if len(sources) > 1:
+            parser.error('an event store must be the only input')
+        if args.convert is not None:
+            parser.error('the input is already an event store')
+        source = stores[0]
+    else:
+        source = chain_sources(sources)
+
+    if args.where is not None:
+        try:
+            args.where = parse_filter(args.where)
+        except ValueError as exc:
+            parser.error(str(exc))
+
+    if args.convert is not None:
+        try:
+            store = convert_to_store(
+                source, args.convert, where=args.where, strict=not args.lenient
+            )
+        except ParseError as exc:
+            print(f'{exc}\nUse --lenient to skip the invalid lines.', file=sys.stderr)
+            return 1
+        print(f'{len(store)} event(s) converted into the event store {args.convert}.')
+        return 0
+
+    if args.save_plans is not None:
+        errors: list[ParseError] = []
+        plans = plan_events(
+            source, args.event, args.start, args.stop, args.where, not args.lenient, errors
+        )
+        count = save_plans(plans, args.save_plans)
+        print(f'{count} sonification plan(s) written in {args.save_plans}.')
+        for error in errors:
+            print(f'  skipped: {error}', file=sys.stderr)
+        return 1 if errors else 0
+
+    if args.play:
+        return play(args, source)
+
+    if args.stream is None and (args.raw or args.cue or args.markers is not None):
+        parser.error('--raw, --cue and --markers require --stream')
+    if args.stream is not None and args.unordered:
+        parser.error('--unordered cannot be used with --stream')
+    if args.stream is not None and args.incremental:
+        parser.error('--incremental cannot be used with --stream')
+    if args.pipeline and args.stream is not None:
+        parser.error('--pipeline cannot be used with --stream')
+    if args.stream is not None and args.encoding != 'wav':
+        parser.error('--stream can only be used with the wav encoding')
+    if args.archive is not None and (args.stream is not None or args.incremental or args.pipeline):
+        parser.error('--archive cannot be used with --stream, --incremental or --pipeline')
+    if args.dedup and (args.stream is not None or args.archive is not None or args.pipeline):
+        parser.error('--dedup cannot be used with --stream, --archive or --pipeline')
+
+    element_cache = get_element_cache(args)
+    failures = []
+    repaired = []
+    nskipped = 0
+    dedup_stats = DedupStats()
+    metrics = Metrics() if args.metrics is not None else None
+    with contextlib.ExitStack() as stack:
+        stream = None
+        if args.stream is not None:
+            file = sys.stdout.buffer if args.stream == '-' else args.stream
+            try:
+                stream = stack.enter_context(WavStreamWriter(
+                    file, args.rate or get_rate(), args.format, raw=args.raw, cue_chunk=args.cue,
+                    sidecar=args.markers,
+                ))
+            except ValueError as exc:
+                parser.error(str(exc))
+        archive = None
+        if args.archive is not None:
+            try:
+                archive = stack.enter_context(ArchiveWriter(args.archive, args.shard_size))
+            except ValueError as exc:
+                parser.error(str(exc))
+
+        if args.pipeline:
+            pipeline = Pipeline(
+                args.output,
+                include_plot=args.plot,
+                synth_workers=args.workers or os.cpu_count() or 1,
+                writers=args.writers,
+                queue_size=args.queue_size,
+                format=args.format,
+                element_cache=element_cache,
+                strict=not args.lenient,
+                encoding=args.encoding,
+                rate=args.rate,
+            )
+            results = pipeline.run(
+                source, args.event, args.start, args.stop, args.where, metrics, args.incremental
+            )
+        else:
+            results = sonify_events(
+                source,
+                args.output,
+                include_plot=args.plot,
+                workers=args.workers or None,
+                chunksize=args.chunksize,
+                ordered=not args.unordered,
+                event_ids=args.event,
+                start=args.start,
+                stop=args.stop,
+                format=args.format,
+                stream=stream,
+                metrics=metrics,
+                incremental=args.incremental,
+                element_cache=element_cache,
+                where=args.where,
+                strict=not args.lenient,
+                encoding=args.encoding,
+                rate=args.rate,
+                archive=archive,
+                dedup=args.dedup,
+            )
+        for result in results:
+            if not result.ok:
+                failures.append(result)
+            elif result.warnings:
+                repaired.append(result)
+            nskipped += result.skipped
+            if result.ok and result.fingerprint is not None:
+                dedup_stats.add(result.fingerprint, not result.reused)
+
+    if metrics is not None:
+        metrics.export(args.metrics)
+    if archive is not None:
+        print(f'{archive.nevent} event(s) archived in {args.archive}.', file=sys.stderr)
+    if args.pipeline:
+        print_pipeline_stats(pipeline)
+    if args.dedup:
+        print_dedup_stats(dedup_stats)
+    if nskipped:
+        print(f'{nskipped} event(s) skipped, their outputs being up to date.', file=sys.stderr)
+
+    if repaired:
+        print(
+            f'\n{len(repaired)} event(s) were sonified without their invalid lines:',
+            file=sys.stderr,
+        )
+        for result in repaired:
+            for warning in result.warnings:
+                print(f'  #{result.index}: {warning}', file=sys.stderr)
+    if failures:
+        print(f'\n{len(failures)} event(s) could not be sonified:', file=sys.stderr)
+        for result in failures:
+            print(f'  event {result.event_id} (#{result.index}): {result.error}', file=sys.stderr)
+        return 1
+    return 0
+
+
+def render(args: argparse.Namespace) -> int:
+    """Renders the sounds of stored sonification plans."""
+    failures = []
+    nevent = 0
+    for result in render_plans(
+        load_plans(args.from_plans),
+        args.output,
+        args.format,
+        get_element_cache(args),
+        args.encoding,
+        args.rate,
+    ):
+        nevent += 1
+        if not result.ok:
+            failures.append(result)
+    print(f'{nevent - len(failures)} event(s) rendered in {args.output}.')
+    for result in failures:
+        print(f'  event {result.event_id} (#{result.index}): {result.error}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+def print_pipeline_stats(pipeline: Pipeline) -> None:
+    """Reports the share of the time each stage of the pipeline was busy or waiting."""
+    print(
+        f'\n{"stage":8} {"threads":>7} {"events":>7} {"busy":>6} {"starved":>8} {"blocked":>8}',
+        file=sys.stderr,
+    )
+    for stats in pipeline.stats.values():
+        total = stats.elapsed * stats.workers or 1
+        print(
+            f'{stats.name:8} {stats.workers:7} {stats.items:7} {stats.utilization:6.0%} '
+            f'{stats.starved / total:8.0%} {stats.blocked / total:8.0%}',
+            file=sys.stderr,
+        )
+
+
+def print_dedup_stats(stats: DedupStats) -> None:
+    """Reports the deduplication of the sounds of the events on the standard error."""
+    print(
+        f'{stats.events} event(s) sonified with {stats.sounds} distinct sound(s), a '
+        f'deduplication ratio of {stats.ratio:.2f}: {stats.rendered} sound(s) rendered, '
+        f'{stats.events - stats.rendered} reused.',
+        file=sys.stderr,
+    )
+
+
+def get_element_cache(args: argparse.Namespace) -> tuple[float | None, int] | None:
+    """Returns the configuration of the cache of the sound elements, if it is used."""
+    if not args.element_cache:
+        return None
+    return args.energy_step, args.element_cache * 2**20
+
+
+def play(args: argparse.Namespace, source: Source) -> int:
+    """Plays the selected events in real time."""
+    sink = NullSink() if args.sink == 'null' else SoundDeviceSink()
+    player = RealtimePlayer(sink, lookahead=args.lookahead, latency=args.latency)
+    errors: list[ParseError] = []
+    events = select_events(
+        source, args.event, args.start, args.stop, args.where, not args.lenient, errors
+    )
+    try:
+        stats = player.play(events)
+    except KeyboardInterrupt:
+        stats = player.stop()
+    except RuntimeError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    print(
+        f'\n{stats.events} event(s) played, {stats.played_frames / player.rate:.1f} s, '
+        f'{stats.underruns} underrun(s) ({stats.underrun_frames / player.rate:.2f} s of silence).',
+        file=sys.stderr,
+    )
+    for event_id, error in stats.failed_events:
+        print(f'  event {event_id}: {error}', file=sys.stderr)
+    for error in errors:
+        print(f'  skipped: {error}', file=sys.stderr)
+    return 1 if stats.failed_events or errors else 0
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """Returns the parser of the command-line arguments."""
+    parser = argparse.ArgumentParser(
+        prog='python -m sonouno_lhc',
+        description='Sonify (and plot) the events of HYPATIA dumps.',
+    )
+    parser.add_argument(
+        'inputs', nargs='*', metavar='INPUT',
+        help='HYPATIA dumps, possibly compressed, as paths or glob patterns, or - for '
+        'the standard input, or a single event store (default: the data sample shipped '
+        'with the package)',
+    )
+    parser.add_argument(
+        '-v', '--verbose', action='count', default=0,
+        help='report the progress on the standard error, -vv for each sound element',
+    )
+    parser.add_argument(
+        '--metrics', type=Path, metavar='FILE',
+        help='write the timings and counts of each event in this file, in CSV if its '
+        'extension is .csv, in JSON otherwise',
+    )
+    parser.add_argument(
+        '--convert', type=Path, metavar='STORE',
+        help='convert the inputs into an event store, for fast access to the events, '
+        'instead of sonifying them',
+    )
+    parser.add_argument(
+        '--save-plans', type=Path, metavar='FILE',
+        help='write the sonification plans of the events in this JSON Lines file, '
+        'instead of sonifying them',
+    )
+    parser.add_argument(
+        '--from-plans', type=Path, metavar='FILE',
+        help='render the sounds of the plans written by --save-plans, instead of '
+        'sonifying inputs',
+    )
+    parser.add_argument(
+        '-o', '--output', type=Path, default=OUTPUT_PATH,
+        help=f'output directory (default: {OUTPUT_PATH})',
+    )
+    parser.add_argument(
+        '--plot', action=argparse.BooleanOptionalAction, default=False,
+        help='also plot the events (default: no)',
+    )
+    parser.add_argument(
+        '--format', choices=['int8', 'int16', 'int32', 'float32', 'float64'], default='int16',
+        help='data type of the samples in the sound files (default: int16)',
+    )
+    parser.add_argument(
+        '--encoding', choices=ENCODINGS, default='wav',
+        help='encoding of the sound files: uncompressed WAV, FLAC, which requires the '
+        'soundfile package and the int8 or int16 format, or compressed NumPy archives '
+        '(default: wav)',
+    )
+    parser.add_argument(
+        '--rate', type=int, metavar='HZ',
+        help='resample the sounds to this sampling rate (default: the rate of the sounds, '
+        '44100 Hz)',
+    )
+    parser.add_argument(
+        '--dedup', action='store_true',
+        help='render and write only once the identical sounds, which are shared by their '
+        f'events, and list the sound of each event in {DEDUP_FILENAME}',
+    )
+    archiving = parser.add_argument_group(
+        'archiving', 'append the sound and plot files to a few zip shards, indexed by event '
+        'ID, instead of writing one file per output'
+    )
+    archiving.add_argument(
+        '--archive', type=Path, metavar='DIR',
+        help='directory of the archive, which is created or appended to',
+    )
+    archiving.add_argument(
+        '--shard-size', type=int, default=DEFAULT_SHARD_SIZE, metavar='N',
+        help=f'maximum number of events per shard (default: {DEFAULT_SHARD_SIZE})',
+    )
+    streaming = parser.add_argument_group(
+        'streaming', 'write the sounds of all the events one after the other, in a single output'
+    )
+    streaming.add_argument(
+        '--stream', metavar='FILE',
+        help='path of the WAV file, or - for the standard output',
+    )
+    streaming.add_argument(
+        '--raw', action='store_true',
+        help='write raw PCM samples, without a WAV header',
+    )
+    streaming.add_argument(
+        '--cue', action='store_true',
+        help='mark the start of each event in a cue chunk of the WAV file',
+    )
+    streaming.add_argument(
+        '--markers', type=Path, metavar='CSV',
+        help='write the start of each event in this CSV file',
+    )
+    playback = parser.add_argument_group(
+        'real-time playback', 'play the events one after the other, as they are sonified'
+    )
+    playback.add_argument(
+        '--play', action='store_true',
+        help='play the events instead of writing sound files',
+    )
+    playback.add_argument(
+        '--sink', choices=['device', 'null'], default='device',
+        help='play on the sound card, or discard the samples at the same pace (default: device)',
+    )
+    playback.add_argument(
+        '--lookahead', type=float, default=DEFAULT_LOOKAHEAD, metavar='SECONDS',
+        help=f'duration of sound synthesized ahead of the playback (default: {DEFAULT_LOOKAHEAD})',
+    )
+    playback.add_argument(
+        '--latency', type=float, default=DEFAULT_LATENCY, metavar='SECONDS',
+        help=f'duration of the blocks sent to the sound card (default: {DEFAULT_LATENCY})',
+    )
+    selection = parser.add_argument_group('event selection')
+    selection.add_argument(
+        '--event', action='append', metavar='ID',
+        help='only sonify the event with this ID (can be repeated)',
+    )
+    selection.add_argument(
+        '--start', type=int, default=0,
+        help='index of the first event to be sonified (default: 0)',
+    )
+    selection.add_argument(
+        '--stop', type=int,
+        help='index after the last event to be sonified (default: all the events)',
+    )
+    selection.add_argument(
+        '--where', metavar='EXPR',
+        help='only sonify the events satisfying this filter, such as '
+        '"any(tracks.is_muon) and any(clusters.energy > 50) and header.run_number == 299184"',
+    )
+    execution = parser.add_argument_group('execution')
+    execution.add_argument(
+        '-j', '--workers', type=int, default=1,
+        help='number of worker processes, 0 for one per CPU (default: 1)',
+    )
+    execution.add_argument(
+        '--chunksize', type=int, default=1,
+        help='number of events sent at once to a worker (default: 1)',
+    )
+    execution.add_argument(
+        '--unordered', action='store_true',
+        help='report the events as soon as they are sonified, in any order',
+    )
+    execution.add_argument(
+        '--pipeline', action='store_true',
+        help='overlap the reading, the synthesis and the writes of the events in threads '
+        'connected by bounded queues, with --workers synthesis threads, and report the '
+        'utilization of each stage',
+    )
+    execution.add_argument(
+        '--writers', type=int, default=DEFAULT_WRITERS,
+        help=f'number of writer threads of the pipeline (default: {DEFAULT_WRITERS})',
+    )
+    execution.add_argument(
+        '--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+        help='maximum number of events waiting between two stages of the pipeline '
+        f'(default: {DEFAULT_QUEUE_SIZE})',
+    )
+    execution.add_argument(
+        '--element-cache', type=float, default=0, metavar='MB',
+        help='cache the sound elements across events, up to this size per process '
+        '(default: 0, no cache)',
+    )
+    execution.add_argument(
+        '--energy-step', type=float, metavar='STEP',
+        help='quantization step of the normalized cluster energies in the cache of the '
+        'sound elements (default: no quantization, the sounds are unchanged)',
+    )
+    execution.add_argument(
+        '--incremental', action='store_true',
+        help='skip the events whose outputs are up to date, according to the manifest '
+        'of the output directory, for example to resume an interrupted run',
+    )
+    execution.add_argument(
+        '--lenient', action='store_true',
+        help='skip the invalid lines of the events and report them at the end, instead '
+        'of failing the events',
+    )
+    return parser
+
 
-        if include_plot:
-            assert fig is not None
-            # Save the plot
-            plot_path = OUTPUT_PATH / f'plot-dataset-{event.id}.png'
-            fig.savefig(plot_path, format='png')
+def expand_inputs(inputs: list[str]) -> Iterator[Source]:
+    """Expands the glob patterns of the command-line inputs.
 
-        # Generate the wav file with the sonification
-        sound_path = OUTPUT_PATH / f'sound-dataset-{event.id}.wav'
-        sound.to_wav(sound_path)
+    Raises:
+        FileNotFoundError: When an input matches no file.
+    """
+    if not inputs:
+        yield DATA / 'sonification_reduced.txt'
+        return
+    for pattern in inputs:
+        if pattern == '-':
+            yield sys.stdin
+            continue
+        paths = sorted(glob.glob(pattern, recursive=True))
+        if not paths:
+            raise FileNotFoundError(f'No such file: {pattern}')
+        yield from map(Path, paths)
 
 
-sonify_events(DATA / 'sonification_reduced.txt', False)
+if __name__ == '__main__':
+    sys.exit(main())
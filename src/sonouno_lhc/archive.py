@@ -0,0 +1,213 @@
+"""Archive output: the files of many events in a few zip shards, instead of one file each.
+
+An archive is a directory holding:
+
+- `shard-00000.zip`, `shard-00001.zip`, ...: the sound and plot files of at most
+  `shard_size` events each, under the names of the files of the output directories,
+- `index.jsonl`: one line per event, with its ID, its shard and the names of its files.
+
+The shards are standard zip files, which can be listed and extracted with any tool. An
+event is read by ID without scanning the shards, through the index and the central
+directory of its shard. Appending to an existing archive adds new shards; an event
+that is archived again is superseded by its latest files.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import zipfile
+from pathlib import Path
+from typing import IO, Iterator
+
+INDEX_FILENAME = 'index.jsonl'
+SHARD_FILENAME = 'shard-{:05}.zip'
+DEFAULT_SHARD_SIZE = 1000
+
+
+def is_archive(path: str | os.PathLike) -> bool:
+    """Returns True if the path is the directory of an archive."""
+    return (Path(path) / INDEX_FILENAME).is_file()
+
+
+class ArchiveWriter:
+    """Appends the files of events to the shards of an archive.
+
+    The writer is a context manager, which closes the current shard on exit. The index
+    lines of the events of a shard are written once the shard is complete, so that the
+    index never refers to a truncated shard.
+
+    Attributes:
+        path: The directory of the archive.
+        shard_size: The maximum number of events per shard.
+        compression: The zip compression method of the files, such as
+            `zipfile.ZIP_DEFLATED`. By default, the files are stored as is.
+        nevent: The number of events added by the writer.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        compression: int = zipfile.ZIP_STORED,
+    ) -> None:
+        """The class constructor. The archive is created if needed.
+
+        Parameters:
+            path: The directory of the archive.
+            shard_size: The maximum number of events per shard.
+            compression: The zip compression method of the files.
+        """
+        if shard_size < 1:
+            raise ValueError(f'The shard size is not positive: {shard_size}.')
+        self.path = Path(path)
+        self.shard_size = shard_size
+        self.compression = compression
+        self.nevent = 0
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._index = (self.path / INDEX_FILENAME).open('a', encoding='utf-8')
+        self._next_shard = _count_shards(self.path)
+        self._shard: zipfile.ZipFile | None = None
+        self._entries: list[dict] = []
+        self.closed = False
+
+    def __enter__(self) -> ArchiveWriter:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def add(self, event_id: str, files: dict[str, tuple[str, bytes]]) -> None:
+        """Appends the files of an event to the current shard.
+
+        Parameters:
+            event_id: The event ID.
+            files: The name and the content of each output, such as `sound` or `plot`.
+        """
+        if self._shard is None:
+            name = SHARD_FILENAME.format(self._next_shard)
+            self._next_shard += 1
+            self._shard = zipfile.ZipFile(self.path / name, 'w', self.compression)
+        for filename, data in files.values():
+            self._shard.writestr(filename, data)
+        self._entries.append({
+            'event_id': event_id,
+            'shard': os.path.basename(self._shard.filename),
+            'files': {output: filename for output, (filename, _) in files.items()},
+        })
+        self.nevent += 1
+        if len(self._entries) == self.shard_size:
+            self._close_shard()
+
+    def close(self) -> None:
+        """Completes the current shard and closes the index."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._close_shard()
+        finally:
+            self._index.close()
+
+    def _close_shard(self) -> None:
+        if self._shard is None:
+            return
+        self._shard.close()
+        self._shard = None
+        self._index.writelines(json.dumps(_) + '\n' for _ in self._entries)
+        self._index.flush()
+        self._entries = []
+
+
+class ArchiveReader:
+    """Random access by event ID to the files of an archive.
+
+    The shards are opened on demand and kept open until the reader is closed.
+
+    Attributes:
+        path: The directory of the archive.
+        entries: The shard and the file names of each event, by event ID.
+    """
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        """The class constructor.
+
+        Raises:
+            ValueError: When the path is not the directory of an archive.
+        """
+        self.path = Path(path)
+        if not is_archive(self.path):
+            raise ValueError(f'Not an archive: {self.path}.')
+        self.entries: dict[str, dict] = {}
+        with (self.path / INDEX_FILENAME).open(encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[entry['event_id']] = entry
+        self._shards: dict[str, zipfile.ZipFile] = {}
+
+    def __enter__(self) -> ArchiveReader:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, event_id: str) -> bool:
+        return event_id in self.entries
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterates through the event IDs, in the order in which they were archived."""
+        return iter(self.entries)
+
+    def get_filename(self, event_id: str, output: str = 'sound') -> str:
+        """Returns the name of a file of an event in its shard.
+
+        Raises:
+            KeyError: When the event or its output is not in the archive.
+        """
+        return self.entries[event_id]['files'][output]
+
+    def open(self, event_id: str, output: str = 'sound') -> IO[bytes]:
+        """Opens a file of an event, such as its `sound` or its `plot`.
+
+        Raises:
+            KeyError: When the event or its output is not in the archive.
+        """
+        filename = self.get_filename(event_id, output)
+        return self._get_shard(self.entries[event_id]['shard']).open(filename)
+
+    def read(self, event_id: str, output: str = 'sound') -> bytes:
+        """Returns the content of a file of an event.
+
+        Raises:
+            KeyError: When the event or its output is not in the archive.
+        """
+        with self.open(event_id, output) as f:
+            return f.read()
+
+    def extract(self, event_id: str, path: str | os.PathLike) -> list[Path]:
+        """Extracts the files of an event in a directory and returns their paths."""
+        entry = self.entries[event_id]
+        shard = self._get_shard(entry['shard'])
+        return [Path(shard.extract(_, path)) for _ in entry['files'].values()]
+
+    def close(self) -> None:
+        """Closes the open shards."""
+        for shard in self._shards.values():
+            shard.close()
+        self._shards.clear()
+
+    def _get_shard(self, name: str) -> zipfile.ZipFile:
+        shard = self._shards.get(name)
+        if shard is None:
+            shard = self._shards[name] = zipfile.ZipFile(self.path / name)
+        return shard
+
+
+def _count_shards(path: Path) -> int:
+    """Returns the number of the next shard of an archive."""
+    numbers = [int(_.stem[6:]) for _ in path.glob('shard-*.zip') if _.stem[6:].isdigit()]
+    return max(numbers, default=-1) + 1
@@ -0,0 +1,689 @@
+"""Sonification of whole HYPATIA dumps, with the events spread over a pool of processes.
+
+Each event is sonified independently and its outputs are written under a name that
+only depends on the event ID, so that the results do not depend on the number of
+workers nor on the order in which the events are completed.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import functools
+import io
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Collection, Iterable, Iterator, Union
+
+import numpy as np
+from sonounolib import Track as AudioTrack
+
+from .archive import ArchiveWriter
+from .dedup import DedupManifest, claim_sound, get_shared_filename, write_shared_samples
+from .encoding import Encoding, check_encoding, encode_sound, write_samples
+from .filters import Filter
+from .io import ParseError, Source, as_filter, convert_event, iter_event_lines
+from .lhc_data import draw_plan, plan_event, render_plan, sonify_event
+from .lhc_plot import EventPlot
+from .lhc_sonification import ELEMENT_CACHE_SIZE, ElementCache
+from .manifest import Manifest, get_output_keys
+from .metrics import NULL_METRICS, EventMetrics, Metrics, NullMetrics
+from .models import Event
+from .plan import EventPlan
+from .store import EventStore, is_store
+from .wav import Format, WavStreamWriter
+
+SOUND_FILENAME = 'sound-dataset-{}.{}'
+"""The name of a sound file, from the event ID and the encoding."""
+PLOT_FILENAME = 'plot-dataset-{}.png'
+
+# Number of chunks submitted to the pool per worker, ahead of the results.
+_CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+_Item = tuple[int, Union[list[str], Event]]
+"""An event to be sonified: its position and either its lines or the event itself."""
+
+
+@dataclass
+class EventResult:
+    """The outcome of the sonification of one event.
+
+    Attributes:
+        index: The position of the event in the input data.
+        event_id: The event ID.
+        sound_path: The path of the written sound file.
+        plot_path: The path of the written plot, if requested.
+        stream_start: The start time of the event in the output stream, in seconds, if
+            the sounds are streamed.
+        error: The description of the error that stopped the sonification of the event.
+        metrics: The timings and counts of the event, if they are collected.
+        skipped: True if the outputs of the event were already up to date.
+        warnings: The errors of the invalid lines skipped in lenient mode.
+        fingerprint: The fingerprint of the plan of the event, in deduplication mode.
+        reused: True if the sound of the event, in deduplication mode, is rendered for
+            another event of the run with the same fingerprint, or was written by a
+            previous run. Its file is complete at the end of the run.
+    """
+    index: int
+    event_id: str
+    sound_path: Path | None = None
+    plot_path: Path | None = None
+    stream_start: float | None = None
+    error: str | None = None
+    metrics: EventMetrics | None = None
+    skipped: bool = False
+    warnings: list[str] = field(default_factory=list)
+    fingerprint: str | None = None
+    reused: bool = False
+    # The encoded samples, sent by the workers to be streamed.
+    _samples: np.ndarray | None = field(default=None, repr=False)
+    # The name and content of the files, sent by the workers to be archived.
+    _files: dict[str, tuple[str, bytes]] | None = field(default=None, repr=False)
+
+    @property
+    def ok(self) -> bool:
+        """True if the event has been sonified successfully."""
+        return self.error is None
+
+
+def sonify_events(
+    source: Source | EventStore,
+    output_path: str | Path,
+    include_plot: bool = False,
+    workers: int | None = 1,
+    chunksize: int = 1,
+    ordered: bool = True,
+    event_ids: Collection[str] | None = None,
+    start: int = 0,
+    stop: int | None = None,
+    format: Format = 'int16',
+    stream: WavStreamWriter | None = None,
+    metrics: Metrics | None = None,
+    incremental: bool = False,
+    element_cache: tuple[float | None, int] | None = None,
+    where: Filter | str | None = None,
+    strict: bool = True,
+    encoding: Encoding = 'wav',
+    rate: int | None = None,
+    archive: ArchiveWriter | None = None,
+    dedup: bool = False,
+) -> Iterator[EventResult]:
+    """Sonifies the events of a HYPATIA dump, possibly using several processes.
+
+    The failure of an event does not stop the processing of the other events: it is
+    reported in the `error` attribute of its result.
+
+    In incremental mode, the outputs of the events are recorded in a manifest in the
+    output directory (see `manifest.Manifest`), and the events whose outputs are up
+    to date are skipped, so that an interrupted run can be resumed.
+
+    In deduplication mode, the events with the same sound share one sound file, which
+    is only rendered once (see `dedup`), and the sound file of each event is recorded
+    in the deduplication manifest of the output directory.
+
+    Parameters:
+        source: The path of the HYPATIA dump, an open stream, an iterable of lines or
+            an event store. When an event store is specified, the selected events are
+            read directly, without scanning the other ones.
+        output_path: The directory in which the sound and plot files are written.
+        include_plot: If set to True, the events are also plotted.
+        workers: The number of worker processes. If set to 1, the events are sonified
+            in the current process. If set to None, the number of CPUs is used.
+        chunksize: The number of events sent at once to a worker.
+        ordered: If set to True, the results are yielded in the order of the input
+            events. Otherwise, they are yielded as soon as they are available.
+        event_ids: If specified, only the events with these IDs are sonified.
+        start: The position in the input data of the first event to be sonified.
+        stop: The position in the input data after the last event to be sonified.
+        format: The data type of the samples in the sound files.
+        stream: If specified, the sounds of the events are appended to this stream,
+            in the order of the input events and with a marker at the start of each
+            event, instead of being written to one file per event. The format and the
+            rate of the stream override the `format` and `rate` arguments.
+        metrics: If specified, the timings and counts of each event are collected in
+            the worker processes and added to this collector.
+        incremental: If set to True, skip the events whose outputs are up to date.
+        element_cache: If specified, the quantization step of the cluster energies and
+            the maximum size in bytes of the cache of the sound elements (see
+            `lhc_sonification.ElementCache`). Each process has its own cache, which is
+            kept from one chunk to the next.
+        where: If specified, only the events satisfying this filter are sonified (see
+            `filters`). It is evaluated before the events are converted.
+        strict: If set to False, the invalid lines of the events are skipped and
+            reported in the `warnings` of their results. Otherwise, an event with an
+            invalid line fails with a `ParseError` (see `io.convert_event`).
+        encoding: The encoding of the sound files (see `encoding`).
+        rate: If specified, the sounds are resampled to this rate, in Hertz.
+        archive: If specified, the sound and plot files are appended to this archive
+            (see `archive`), instead of being written in the output directory, and the
+            `sound_path` and `plot_path` of the results are not set.
+        dedup: If set to True, the identical sounds are deduplicated.
+
+    Returns:
+        An iterator over the results, one per event.
+    """
+    output_path = Path(output_path)
+    if archive is None:
+        output_path.mkdir(parents=True, exist_ok=True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError(f'The number of workers is not positive: {workers}.')
+    if chunksize < 1:
+        raise ValueError(f'The chunk size is not positive: {chunksize}.')
+    check_encoding(encoding, format)
+    if stream is not None:
+        if not ordered:
+            raise ValueError('The events can only be streamed in the input order.')
+        format = stream.format
+        rate = stream.rate
+        if encoding != 'wav':
+            raise ValueError('The events can only be streamed in WAV.')
+        if incremental:
+            raise ValueError('The events cannot be streamed in incremental mode.')
+    if archive is not None:
+        if stream is not None:
+            raise ValueError('The events cannot be both streamed and archived.')
+        if incremental:
+            raise ValueError('The events cannot be archived in incremental mode.')
+    if dedup and (stream is not None or archive is not None):
+        raise ValueError('The sounds can only be deduplicated in the output directory.')
+
+    with contextlib.ExitStack() as stack:
+        manifest = stack.enter_context(Manifest(output_path)) if incremental else None
+        dedup_manifest = None
+        claims_path = None
+        if dedup:
+            dedup_manifest = stack.enter_context(DedupManifest(output_path))
+            claims_path = Path(stack.enter_context(
+                tempfile.TemporaryDirectory(prefix='.dedup-', dir=output_path)
+            ))
+        collect = _Collector(stream, metrics, manifest, archive, dedup_manifest)
+        works = _iter_works(
+            _select(source, event_ids, start, stop, where), chunksize, collect, include_plot,
+            format, encoding, rate, dedup,
+        )
+        options = (
+            output_path, include_plot, format, stream is not None, metrics is not None,
+            element_cache, strict, encoding, rate, archive is not None, claims_path,
+        )
+        if workers == 1:
+            for work in works:
+                if isinstance(work, EventResult):
+                    yield from collect([work])
+                else:
+                    yield from collect(sonify_chunk(work, *options))
+            return
+
+        # The chunks are submitted progressively, so that the input is read as the
+        # results are consumed, instead of being loaded at once in memory.
+        max_in_flight = workers * _CHUNKS_IN_FLIGHT_PER_WORKER
+        with ProcessPoolExecutor(workers) as executor:
+            pending: deque[Future[list[EventResult]]] = deque()
+            for work in works:
+                if isinstance(work, EventResult):
+                    # Queued as a completed future, to keep the order of the results
+                    future: Future[list[EventResult]] = Future()
+                    future.set_result([work])
+                    pending.append(future)
+                else:
+                    pending.append(executor.submit(sonify_chunk, work, *options))
+                if len(pending) >= max_in_flight:
+                    yield from collect(_pop_results(pending, ordered))
+            while pending:
+                yield from collect(_pop_results(pending, ordered))
+
+
+def select_events(
+    source: Source | EventStore,
+    event_ids: Collection[str] | None = None,
+    start: int = 0,
+    stop: int | None = None,
+    where: Filter | str | None = None,
+    strict: bool = True,
+    errors: list[ParseError] | None = None,
+) -> Iterator[Event]:
+    """Iterates through the selected events of a HYPATIA dump or of an event store.
+
+    Parameters:
+        source: The path of the HYPATIA dump, an open stream, an iterable of lines or
+            an event store.
+        event_ids: If specified, only the events with these IDs are selected.
+        start: The position in the input data of the first selected event.
+        stop: The position in the input data after the last selected event.
+        where: If specified, only the events satisfying this filter are selected.
+        strict: If set to False, the invalid lines of the events are skipped.
+        errors: If specified, the events that cannot be converted are skipped and
+            their errors appended to this list. Otherwise, the errors are raised.
+    """
+    for _, item in _select(source, event_ids, start, stop, where):
+        if isinstance(item, Event):
+            yield item
+            continue
+        try:
+            event = convert_event(item, strict)
+        except ParseError as exc:
+            if errors is None:
+                raise
+            errors.append(exc)
+            continue
+        yield event
+
+
+def plan_events(
+    source: Source | EventStore,
+    event_ids: Collection[str] | None = None,
+    start: int = 0,
+    stop: int | None = None,
+    where: Filter | str | None = None,
+    strict: bool = True,
+    errors: list[ParseError] | None = None,
+) -> Iterator[EventPlan]:
+    """Iterates through the sonification plans of the selected events.
+
+    The plans can be stored with `plan.save_plans`, and rendered later by `render_plans`
+    without matching the events again. The parameters are those of `select_events`.
+    """
+    for event in select_events(source, event_ids, start, stop, where, strict, errors):
+        yield plan_event(event)
+
+
+def render_plans(
+    plans: Iterable[EventPlan],
+    output_path: str | Path,
+    format: Format = 'int16',
+    element_cache: tuple[float | None, int] | None = None,
+    encoding: Encoding = 'wav',
+    rate: int | None = None,
+) -> Iterator[EventResult]:
+    """Renders the sounds of sonification plans and writes them, one file per event.
+
+    The sound files are the same as those written by `sonify_events`.
+
+    Parameters:
+        plans: The plans, for example read by `plan.load_plans`.
+        output_path: The directory in which the sound files are written.
+        format: The data type of the samples in the sound files.
+        element_cache: If specified, the quantization step of the cluster energies and
+            the maximum size in bytes of the cache of the sound elements.
+        encoding: The encoding of the sound files.
+        rate: If specified, the sounds are resampled to this rate, in Hertz.
+    """
+    check_encoding(encoding, format)
+    output_path = Path(output_path)
+    output_path.mkdir(parents=True, exist_ok=True)
+    cache = get_process_cache(*element_cache) if element_cache is not None else None
+    for index, plan in enumerate(plans):
+        result = EventResult(index, plan.event_id)
+        try:
+            sound = plan.to_track(cache)
+            result.sound_path = output_path / SOUND_FILENAME.format(plan.event_id, encoding)
+            samples = encode_sound(sound, format, rate)
+            write_samples(result.sound_path, samples, rate or sound.rate, format, encoding)
+        except Exception as exc:
+            result.error = f'{type(exc).__name__}: {exc}'
+        yield result
+
+
+def _select(
+    source: Source | EventStore,
+    event_ids: Collection[str] | None,
+    start: int,
+    stop: int | None,
+    where: Filter | str | None = None,
+) -> Iterator[_Item]:
+    """Selects the events of a HYPATIA dump or of an event store."""
+    if where is not None:
+        where = as_filter(where)
+    if isinstance(source, (str, os.PathLike)) and is_store(source):
+        source = EventStore(source)
+    if isinstance(source, EventStore):
+        return _select_stored_events(source, event_ids, start, stop, where)
+    return _select_events(source, event_ids, start, stop, where)
+
+
+def _select_events(
+    source: Source,
+    event_ids: Collection[str] | None,
+    start: int,
+    stop: int | None,
+    where: Filter | None = None,
+) -> Iterator[_Item]:
+    """Selects the events of a HYPATIA dump, which is scanned sequentially."""
+    items: Iterable[_Item] = islice(enumerate(iter_event_lines(source)), start, stop)
+    if event_ids is not None:
+        event_ids = set(event_ids)
+        items = (_ for _ in items if _[1] and _[1][0] in event_ids)
+    if where is not None:
+        items = (_ for _ in items if where.matches(_[1]))
+    return iter(items)
+
+
+def _select_stored_events(
+    store: EventStore,
+    event_ids: Collection[str] | None,
+    start: int,
+    stop: int | None,
+    where: Filter | None = None,
+) -> Iterator[_Item]:
+    """Selects the events of an event store, which are read by random access."""
+    positions: Iterable[int] = range(len(store))[start:stop]
+    if event_ids is not None:
+        selected = range(len(store))[start:stop]
+        positions = sorted({
+            _ for event_id in event_ids for _ in store.positions(event_id) if _ in selected
+        })
+    if where is not None:
+        # The filter is evaluated on the columns of the whole range at once
+        start, stop, _ = slice(start, stop).indices(len(store))
+        matching = store.select(where, start, stop)
+        if event_ids is not None:
+            matching = np.intersect1d(np.array(positions, dtype=np.int64), matching)
+        positions = matching.tolist()
+    for index in positions:
+        yield index, store[index]
+
+
+def sonify_chunk(
+    chunk: list[_Item],
+    output_path: Path,
+    include_plot: bool,
+    format: Format = 'int16',
+    to_stream: bool = False,
+    collect_metrics: bool = False,
+    element_cache: tuple[float | None, int] | None = None,
+    strict: bool = True,
+    encoding: Encoding = 'wav',
+    rate: int | None = None,
+    to_archive: bool = False,
+    dedup_claims: Path | None = None,
+) -> list[EventResult]:
+    """Sonifies a chunk of events and writes their outputs.
+
+    Parameters:
+        chunk: The position in the input data and the lines of each event, or the event
+            itself if it has already been converted.
+        output_path: The directory in which the sound and plot files are written.
+        include_plot: If set to True, the events are also plotted.
+        format: The data type of the samples in the sound files.
+        to_stream: If set to True, the encoded samples are returned with the results,
+            to be streamed, instead of being written to sound files.
+        collect_metrics: If set to True, the timings and counts of each event are
+            returned with the results.
+        element_cache: The quantization step and the size of the cache of the sound
+            elements of the process, if it is used.
+        strict: If set to False, the invalid lines of the events are skipped.
+        encoding: The encoding of the sound files.
+        rate: If specified, the sounds are resampled to this rate, in Hertz.
+        to_archive: If set to True, the content of the sound and plot files is returned
+            with the results, to be archived, instead of being written.
+        dedup_claims: In deduplication mode, the directory of the claims of the shared
+            sound files of the run. The sound of an event is only rendered and written
+            in the shared sound file of its plan fingerprint if the event claims it.
+    """
+    results = []
+    plot = EventPlot() if include_plot else None
+    metrics = Metrics() if collect_metrics else NULL_METRICS
+    cache = get_process_cache(*element_cache) if element_cache is not None else None
+    for index, item in chunk:
+        result = EventResult(index, _get_event_id(item))
+        metrics.start_event(result.event_id)
+        try:
+            if dedup_claims is not None:
+                sound = dedup_item(
+                    item, result, output_path, dedup_claims, format, encoding, rate, plot,
+                    metrics, cache, strict,
+                )
+            else:
+                sound = sonify_item(item, result, plot, metrics, cache, strict)
+            files = {}
+            if plot is not None:
+                plot_filename = PLOT_FILENAME.format(result.event_id)
+                with metrics.stage('plot'):
+                    if to_archive:
+                        buffer = io.BytesIO()
+                        plot.savefig(buffer, format='png')
+                        files['plot'] = plot_filename, buffer.getvalue()
+                    else:
+                        result.plot_path = output_path / plot_filename
+                        plot.savefig(result.plot_path, format='png')
+            # In deduplication mode, the shared sound may be rendered for another event.
+            if sound is not None:
+                with metrics.stage('write'):
+                    samples = encode_sound(sound, format, rate)
+                    sound_filename = SOUND_FILENAME.format(result.event_id, encoding)
+                    if to_stream:
+                        result._samples = samples
+                    elif to_archive:
+                        buffer = io.BytesIO()
+                        write_samples(buffer, samples, rate or sound.rate, format, encoding)
+                        result._files = {'sound': (sound_filename, buffer.getvalue()), **files}
+                    elif dedup_claims is not None:
+                        write_shared_samples(
+                            result.sound_path, samples, rate or sound.rate, format, encoding
+                        )
+                    else:
+                        result.sound_path = output_path / sound_filename
+                        write_samples(
+                            result.sound_path, samples, rate or sound.rate, format, encoding
+                        )
+        except Exception as exc:
+            result.error = f'{type(exc).__name__}: {exc}'
+        if collect_metrics:
+            result.metrics = metrics.current
+        metrics.finish()
+        results.append(result)
+    return results
+
+
+def sonify_item(
+    item: Union[list[str], Event],
+    result: EventResult,
+    plot: EventPlot | None = None,
+    metrics: NullMetrics = NULL_METRICS,
+    cache: ElementCache | None = None,
+    strict: bool = True,
+) -> AudioTrack:
+    """Converts and sonifies an event, without writing its outputs.
+
+    Parameters:
+        item: The lines of the event, or the event itself.
+        result: The result of the event, to which the skipped invalid lines are added.
+        plot: If specified, the event is drawn in this plot, after it is reset.
+        metrics: The collector of the timings and counts of the event.
+        cache: If specified, the cache of the sound elements.
+        strict: If set to False, the invalid lines of the event are skipped.
+    """
+    event = convert_item(item, result, metrics, strict)
+    sound, _ = sonify_event(
+        event, include_plot=plot is not None, plot=plot, metrics=metrics, cache=cache
+    )
+    return sound
+
+
+def dedup_item(
+    item: Union[list[str], Event],
+    result: EventResult,
+    output_path: Path,
+    claims_path: Path,
+    format: Format,
+    encoding: Encoding = 'wav',
+    rate: int | None = None,
+    plot: EventPlot | None = None,
+    metrics: NullMetrics = NULL_METRICS,
+    cache: ElementCache | None = None,
+    strict: bool = True,
+) -> AudioTrack | None:
+    """Converts and plans an event, and renders its sound if no other event claimed it.
+
+    The `fingerprint`, `sound_path` and `reused` attributes of the result are set to
+    those of the shared sound file of the event (see `dedup`).
+
+    Parameters:
+        item: The lines of the event, or the event itself.
+        result: The result of the event.
+        output_path: The directory of the shared sound files.
+        claims_path: The directory of the claims of the shared sound files of the run.
+        format: The data type of the samples in the sound files.
+        encoding: The encoding of the sound files.
+        rate: The sampling rate of the sound files, if they are resampled.
+        plot: If specified, the event is drawn in this plot, after it is reset.
+        metrics: The collector of the timings and counts of the event.
+        cache: If specified, the cache of the sound elements, whose quantization step is
+            applied to the amplitudes of the fingerprint.
+        strict: If set to False, the invalid lines of the event are skipped.
+
+    Returns:
+        The sound of the event, or None if it is rendered for another event or was
+        written by a previous run.
+    """
+    event = convert_item(item, result, metrics, strict)
+    plan = plan_event(event, metrics=metrics)
+    if plot is not None:
+        with metrics.stage('plot'):
+            plot.reset()
+            draw_plan(plan, event, plot)
+    result.fingerprint = plan.fingerprint(cache.step if cache is not None else None)
+    filename = get_shared_filename(result.fingerprint, format, encoding, rate)
+    result.sound_path = output_path / filename
+    result.reused = not claim_sound(claims_path, filename) or result.sound_path.exists()
+    if result.reused:
+        return None
+    return render_plan(plan, metrics, cache)
+
+
+def convert_item(
+    item: Union[list[str], Event],
+    result: EventResult,
+    metrics: NullMetrics = NULL_METRICS,
+    strict: bool = True,
+) -> Event:
+    """Converts the lines of an event, and adds the skipped invalid lines to its result."""
+    with metrics.stage('parse'):
+        event = item if isinstance(item, Event) else convert_event(item, strict)
+    for error in event.errors:
+        metrics.warn(str(error))
+        result.warnings.append(str(error))
+    return event
+
+
+@functools.cache
+def get_process_cache(
+    step: float | None = None, max_size: int = ELEMENT_CACHE_SIZE
+) -> ElementCache:
+    """Returns the cache of the sound elements of the current process, for a configuration."""
+    return ElementCache(step, max_size)
+
+
+def _get_event_id(item: Union[list[str], Event]) -> str:
+    """Returns the ID of an event, from its lines or the event itself."""
+    if isinstance(item, Event):
+        return item.id
+    return item[0] if item else ''
+
+
+@dataclass
+class _Collector:
+    """Post-processes the results in the main process.
+
+    The samples of the results are streamed and released, their files archived, their
+    metrics collected and their outputs recorded in the manifest.
+
+    Attributes:
+        stream: The stream to which the sounds are appended, if any.
+        metrics: The collector of the metrics, if any.
+        manifest: The manifest of the outputs, in incremental mode.
+        archive: The archive to which the files are appended, if any.
+        dedup: The manifest of the shared sound files, in deduplication mode.
+        keys: The output keys of the events being sonified, by position.
+    """
+    stream: WavStreamWriter | None
+    metrics: Metrics | None
+    manifest: Manifest | None
+    archive: ArchiveWriter | None = None
+    dedup: DedupManifest | None = None
+    keys: dict[int, dict[str, str]] = field(default_factory=dict)
+
+    def __call__(self, results: list[EventResult]) -> list[EventResult]:
+        for result in results:
+            if self.metrics is not None and result.metrics is not None:
+                self.metrics.add(result.metrics)
+            keys = self.keys.pop(result.index, None)
+            if self.manifest is not None and keys is not None and result.ok:
+                paths = {'sound': result.sound_path, 'plot': result.plot_path}
+                self.manifest.record(
+                    result.event_id, {_: (paths[_], key) for _, key in keys.items()}
+                )
+            if self.dedup is not None and result.fingerprint is not None and result.ok:
+                self.dedup.record(
+                    result.event_id, result.fingerprint, result.sound_path, not result.reused
+                )
+            if self.archive is not None and result._files is not None:
+                self.archive.add(result.event_id, result._files)
+                result._files = None
+            if self.stream is None or result._samples is None:
+                continue
+            result.stream_start = self.stream.duration
+            self.stream.add_marker(result.event_id)
+            self.stream.write(result._samples, encoded=True)
+            result._samples = None
+        return results
+
+
+def _iter_works(
+    items: Iterable[_Item],
+    chunksize: int,
+    collect: _Collector,
+    include_plot: bool,
+    format: str,
+    encoding: str = 'wav',
+    rate: int | None = None,
+    dedup: bool = False,
+) -> Iterator[list[_Item] | EventResult]:
+    """Groups the events to be sonified in chunks of at most `chunksize` events.
+
+    In incremental mode, the results of the events that are up to date are yielded
+    instead, between the chunks, and the output keys of the other events are stored
+    in the collector, to be recorded once the events are sonified.
+    """
+    manifest = collect.manifest
+    chunk: list[_Item] = []
+    for index, item in items:
+        if manifest is not None:
+            event_id = _get_event_id(item)
+            keys = get_output_keys(item, include_plot, format, encoding, rate, dedup)
+            if manifest.is_up_to_date(event_id, keys):
+                if chunk:
+                    yield chunk
+                    chunk = []
+                yield EventResult(
+                    index,
+                    event_id,
+                    sound_path=manifest.get_path(event_id, 'sound'),
+                    plot_path=manifest.get_path(event_id, 'plot') if include_plot else None,
+                    skipped=True,
+                )
+                continue
+            collect.keys[index] = keys
+        chunk.append((index, item))
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _pop_results(pending: deque[Future[list[EventResult]]], ordered: bool) -> list[EventResult]:
+    """Waits for a chunk of results and removes it from the pending futures."""
+    if ordered:
+        return pending.popleft().result()
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    results = []
+    for future in done:
+        pending.remove(future)
+        results.extend(future.result())
+    return results
@@ -0,0 +1,180 @@
+"""Deduplication of the sounds of the events that have the same sonification plan.
+
+Many events are sonified by the same sequence of sound elements, with the same
+amplitudes: their sounds are identical. In deduplication mode, the sound of an event is
+named after the fingerprint of its plan (see `plan.EventPlan.fingerprint`), the sample
+format and the rate. The events with the same fingerprint thus share one sound file,
+whatever the process or the run that wrote it. During a run, the first event of each
+fingerprint claims its sound atomically (see `claim_sound`): it is the only one to
+render it, unless the file was written by a previous run.
+
+The sound file of each event is recorded in the deduplication manifest of the output
+directory, `dedup.jsonl`, one line per event with its ID, its fingerprint and the name
+of its sound file. The plots, which depend on the geometry of the events, are not
+deduplicated.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from .encoding import Encoding, write_samples
+from .manifest import get_version
+from .wav import Format
+
+DEDUP_FILENAME = 'dedup.jsonl'
+SHARED_SOUND_FILENAME = 'sound-shared-{}.{}'
+"""The name of a shared sound file, from its key and its encoding."""
+
+
+def get_shared_filename(
+    fingerprint: str, format: Format, encoding: Encoding = 'wav', rate: int | None = None
+) -> str:
+    """Returns the name of the sound file shared by the events with a plan fingerprint.
+
+    The name also depends on the encoding of the file and on the version of the package,
+    so that the files written with other options or by other versions are not reused.
+    """
+    parts = [fingerprint, get_version(), f'format={format}', f'rate={rate}']
+    key = hashlib.sha256('\0'.join(parts).encode()).hexdigest()[:32]
+    return SHARED_SOUND_FILENAME.format(key, encoding)
+
+
+def write_shared_samples(
+    path: Path, samples: np.ndarray, rate: int, format: Format, encoding: Encoding = 'wav'
+) -> None:
+    """Writes a shared sound file atomically, so that it is never read half written.
+
+    Concurrent runs in the same directory may render the same sound at the same time:
+    the last one replaces the file with the same content.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix='.', suffix=path.suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write_samples(f, samples, rate, format, encoding)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def claim_sound(claims_path: Path, filename: str) -> bool:
+    """Claims the rendering of a shared sound file, for the current run.
+
+    The claim is the exclusive creation of an empty file, which is atomic across the
+    processes of the run. The claims of a run are kept in their own directory, removed
+    at the end of the run.
+
+    Parameters:
+        claims_path: The directory of the claims of the run.
+        filename: The name of the shared sound file.
+
+    Returns:
+        True if the sound was not claimed yet in the run.
+    """
+    try:
+        os.close(os.open(claims_path / filename, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+    return True
+
+
+@dataclass
+class DedupStats:
+    """The outcome of the deduplication of the sounds.
+
+    Attributes:
+        events: The number of events recorded.
+        rendered: The number of events whose sound was rendered, the other ones reusing
+            an existing sound file.
+        fingerprints: The distinct plan fingerprints of the recorded events.
+    """
+    events: int = 0
+    rendered: int = 0
+    fingerprints: set[str] = field(default_factory=set)
+
+    @property
+    def sounds(self) -> int:
+        """The number of distinct sounds of the recorded events."""
+        return len(self.fingerprints)
+
+    @property
+    def ratio(self) -> float:
+        """The number of events per distinct sound."""
+        return self.events / self.sounds if self.sounds else 1.0
+
+    def add(self, fingerprint: str, rendered: bool) -> None:
+        """Counts an event, with the fingerprint of its plan."""
+        self.events += 1
+        self.rendered += rendered
+        self.fingerprints.add(fingerprint)
+
+
+class DedupManifest:
+    """The manifest of the shared sound file of each event, in an output directory.
+
+    The manifest is appended to as the events are sonified. When an event is recorded
+    several times, its latest line is the valid one.
+
+    Attributes:
+        path: The path of the manifest file.
+        stats: The deduplication of the events recorded since the manifest was opened.
+    """
+
+    def __init__(self, output_path: str | os.PathLike) -> None:
+        """The class constructor. The manifest is created if needed.
+
+        Parameters:
+            output_path: The directory of the outputs.
+        """
+        self.output_path = Path(output_path)
+        self.path = self.output_path / DEDUP_FILENAME
+        self.stats = DedupStats()
+        self._file = self.path.open('a', encoding='utf-8')
+
+    def __enter__(self) -> DedupManifest:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def record(self, event_id: str, fingerprint: str, path: Path, rendered: bool) -> None:
+        """Records the shared sound file of an event.
+
+        Parameters:
+            event_id: The event ID.
+            fingerprint: The fingerprint of the plan of the event.
+            path: The path of the sound file.
+            rendered: True if the sound was rendered for this event, False if an existing
+                sound file was reused.
+        """
+        entry = {
+            'event_id': event_id,
+            'fingerprint': fingerprint,
+            'sound': os.path.relpath(path, self.output_path),
+        }
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        self.stats.add(fingerprint, rendered)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def load_dedup_manifest(output_path: str | os.PathLike) -> dict[str, Path]:
+    """Returns the path of the sound file of each event of an output directory."""
+    output_path = Path(output_path)
+    sounds = {}
+    with (output_path / DEDUP_FILENAME).open(encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                sounds[entry['event_id']] = output_path / entry['sound']
+    return sounds
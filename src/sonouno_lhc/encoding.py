@@ -0,0 +1,172 @@
+"""Encodings of the sound files, at the sampling rate of the sounds or at a lower one.
+
+Three encodings are available:
+
+- wav: uncompressed PCM or floating-point samples (see `wav.WavStreamWriter`),
+- flac: lossless compression of int8 or int16 samples, which requires the soundfile
+  package,
+- npz: the samples and the sampling rate in a compressed NumPy archive, which can be
+  read back with `read_npz`, when no audio codec is available.
+
+The samples can be resampled to a lower rate before being encoded, with a band-limited
+Fourier resampling, to reduce the size of the files.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from typing import BinaryIO, Literal
+
+import numpy as np
+from sonounolib import Track
+
+from .wav import Format, WavStreamWriter, encode
+
+Encoding = Literal['wav', 'flac', 'npz']
+
+ENCODINGS = ['wav', 'flac', 'npz']
+
+# libsndfile subtypes of the sample formats that can be compressed in FLAC.
+_FLAC_SUBTYPES = {'int8': 'PCM_S8', 'int16': 'PCM_16'}
+
+
+def has_flac() -> bool:
+    """Returns True if the sounds can be encoded in FLAC."""
+    try:
+        import soundfile  # noqa: F401
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+def check_encoding(encoding: Encoding, format: Format) -> None:
+    """Checks that the samples of a format can be written with an encoding.
+
+    Raises:
+        ValueError: When the encoding is unknown, or does not support the format, or
+            FLAC is requested but the soundfile package is not available.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f'Unknown encoding: {encoding!r}.')
+    if encoding != 'flac':
+        return
+    if format not in _FLAC_SUBTYPES:
+        raise ValueError(f'FLAC only supports the int8 and int16 formats, not {format}.')
+    if not has_flac():
+        raise ValueError(
+            'FLAC requires the soundfile package: install it or use the npz encoding.'
+        )
+
+
+def encode_sound(sound: Track, format: Format, rate: int | None = None) -> np.ndarray:
+    """Converts the samples of a sound to the data type of a sound file.
+
+    Parameters:
+        sound: The sound.
+        format: The data type of the samples.
+        rate: If specified and different from the sampling rate of the sound, the
+            samples are resampled to this rate.
+    """
+    data = sound.get_data()
+    if rate is not None and rate != sound.rate:
+        data = resample(data, sound.rate, rate)
+        # The ringing of the band-limited signal may exceed the maximum amplitude.
+        np.clip(data, -sound.max_amplitude, sound.max_amplitude, out=data)
+    return encode(data, format, sound.max_amplitude)
+
+
+def resample(data: np.ndarray, rate: int, new_rate: int) -> np.ndarray:
+    """Resamples a signal by truncating or zero-padding its Fourier transform.
+
+    When the rate is lowered, the frequencies above the new Nyquist frequency are
+    removed, which prevents their aliasing.
+
+    Parameters:
+        data: The samples.
+        rate: The sampling rate of the samples, in Hertz.
+        new_rate: The sampling rate of the returned samples, in Hertz.
+    """
+    if new_rate <= 0:
+        raise ValueError(f'The sampling rate is not positive: {new_rate}.')
+    size = len(data)
+    new_size = round(size * new_rate / rate)
+    if rate == new_rate or size == 0:
+        return np.array(data, dtype=float)
+
+    # The signal is padded with silence to a length whose transform is fast, and which
+    # is a whole number of samples at both rates.
+    step = rate // math.gcd(rate, new_rate)
+    padded_size = _get_fast_multiple(size, step)
+    padded_new_size = padded_size * new_rate // rate
+    spectrum = np.fft.rfft(data, padded_size)
+    nfrequency = padded_new_size // 2 + 1
+    if nfrequency <= len(spectrum):
+        spectrum = spectrum[:nfrequency]
+    else:
+        spectrum = np.concatenate([spectrum, np.zeros(nfrequency - len(spectrum), complex)])
+    resampled = np.fft.irfft(spectrum, padded_new_size)[:new_size]
+    resampled *= padded_new_size / padded_size
+    return resampled
+
+
+def _get_fast_multiple(size: int, step: int) -> int:
+    """Returns the smallest multiple of `step` not less than `size` by a 5-smooth number."""
+    multiple = -(-size // step)
+    while True:
+        remainder = multiple
+        for factor in (2, 3, 5):
+            while remainder % factor == 0:
+                remainder //= factor
+        if remainder == 1:
+            return multiple * step
+        multiple += 1
+
+
+def write_samples(
+    path: str | os.PathLike | BinaryIO,
+    samples: np.ndarray,
+    rate: int,
+    format: Format,
+    encoding: Encoding = 'wav',
+) -> None:
+    """Writes samples returned by `encode_sound` in a sound file.
+
+    Parameters:
+        path: The path of the sound file, or a binary stream.
+        samples: The encoded samples.
+        rate: The sampling rate of the samples, in Hertz.
+        format: The data type of the samples.
+        encoding: The encoding of the sound file.
+    """
+    if encoding == 'wav':
+        with WavStreamWriter(path, rate, format) as writer:
+            writer.write(samples, encoded=True)
+    elif encoding == 'flac':
+        check_encoding(encoding, format)
+        import soundfile
+
+        if format == 'int8':
+            # soundfile reads int16 arrays, which libsndfile scales down to 8 bits.
+            samples = samples.astype(np.int16) << 8
+        soundfile.write(path, samples, rate, subtype=_FLAC_SUBTYPES[format], format='FLAC')
+    elif encoding == 'npz':
+        if isinstance(path, (str, os.PathLike)):
+            # Unlike numpy, keep the name of the file as is, without appending .npz
+            with open(path, 'wb') as f:
+                np.savez_compressed(f, samples=samples, rate=rate)
+        else:
+            np.savez_compressed(path, samples=samples, rate=rate)
+    else:
+        raise ValueError(f'Unknown encoding: {encoding!r}.')
+
+
+def read_npz(path: str | os.PathLike | BinaryIO) -> tuple[np.ndarray, int]:
+    """Returns the samples and the sampling rate of a sound file in the npz encoding.
+
+    Parameters:
+        path: The path of the sound file, or a binary stream such as a member of an
+            archive (see `archive.ArchiveReader.open`).
+    """
+    with np.load(path) as archive:
+        return archive['samples'], int(archive['rate'])
@@ -0,0 +1,590 @@
+"""Selection of the events by predicates on their header, tracks and clusters.
+
+The filters are evaluated on the raw lines of the events, or on the columns of an
+`EventBatch`, so that the rejected events are never converted into model instances.
+
+A filter is built from the fields of the description line (`header`) and from the
+columns of the particle tracks (`tracks`) and clusters (`clusters`), whose names are
+those of the model attributes. A comparison on a column is a condition on each row,
+which is turned into a condition on the event with `any`, `all` or `count`:
+
+    >>> from sonouno_lhc.filters import clusters, header, tracks
+    >>> where = tracks.is_muon.any() & (clusters.energy > 50).any()
+    >>> where &= header.run_number == 299184
+
+The same filter can be written as a string, for the command line:
+
+    >>> where = parse_filter(
+    ...     'any(tracks.is_muon) and any(clusters.energy > 50) and header.run_number == 299184'
+    ... )
+
+The header fields are `missing_et`, `missing_et_phi`, `date` (compared as a string,
+such as `'2016-05-15 00:23:55 CEST'`), `event_number` and `run_number`. The operands
+of `&` are evaluated from the cheapest, so that the header is checked first.
+"""
+
+from __future__ import annotations
+
+import ast
+import operator
+from typing import Any, Callable, Union
+
+import numpy as np
+
+from .models import CLUSTER_DTYPE, TRACK_DTYPE, EventBatch, _parse_charge
+
+_OPERATORS: dict[str, Callable[[Any, Any], Any]] = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+# The comparison operator obtained when the operands are swapped.
+_SWAPPED = {'==': '==', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+
+
+def _get_header_values(description: str) -> dict[str, Any] | None:
+    """Returns the fields of a description line, or None if it is invalid.
+
+    The layout is that of `models.EventHeader`, without creating an instance.
+    """
+    values = description.split()
+    try:
+        return {
+            'missing_et': float(values[0]),
+            'missing_et_phi': float(values[1]),
+            'date': ' '.join(values[2:-5]),
+            'event_number': int(values[-5]),
+            'run_number': int(values[-4]),
+        }
+    except (IndexError, ValueError):
+        return None
+
+
+HEADER_FIELDS = ['missing_et', 'missing_et_phi', 'date', 'event_number', 'run_number']
+
+# The data type of the columns of each section.
+SECTIONS = {'tracks': TRACK_DTYPE, 'clusters': CLUSTER_DTYPE}
+
+
+def _get_converter(dtype: np.dtype) -> Callable[[str], Any]:
+    """Returns the function converting a raw column value, as in the models."""
+    if dtype.kind == 'b':
+        return lambda value: float(value) == 1
+    if dtype.kind == 'i':
+        return _parse_charge
+    if dtype.kind == 'U':
+        return str
+    return float
+
+
+class Filter:
+    """A condition on an event. The filters can be combined with `&`, `|` and `~`.
+
+    Attributes:
+        cost: The relative cost of the evaluation, to order the operands of `&`.
+    """
+    cost = 1
+
+    def matches(self, lines: list[str]) -> bool:
+        """Returns True if the event, given by its raw lines, satisfies the condition.
+
+        An event with an invalid value in a row read by the filter is selected, so that
+        its error is reported when it is converted (see `io.convert_event`).
+        """
+        try:
+            return self._matches(lines)
+        except (ValueError, IndexError):
+            return True
+
+    def _matches(self, lines: list[str]) -> bool:
+        """Evaluates the condition on the raw lines, raising on the invalid values."""
+        raise NotImplementedError
+
+    def evaluate(self, batch: EventBatch) -> np.ndarray:
+        """Returns the boolean mask of the events of a batch satisfying the condition."""
+        raise NotImplementedError
+
+    def __call__(self, lines: list[str]) -> bool:
+        return self.matches(lines)
+
+    def __and__(self, other: Filter) -> Filter:
+        return _And(self, _check_filter(other))
+
+    def __or__(self, other: Filter) -> Filter:
+        return _Or(self, _check_filter(other))
+
+    def __invert__(self) -> Filter:
+        return _Not(self)
+
+
+class _And(Filter):
+    def __init__(self, *operands: Filter) -> None:
+        flattened = []
+        for operand in operands:
+            flattened += operand.operands if isinstance(operand, _And) else [operand]
+        self.operands = sorted(flattened, key=lambda _: _.cost)
+        self.cost = max(_.cost for _ in self.operands)
+
+    def _matches(self, lines: list[str]) -> bool:
+        return all(_._matches(lines) for _ in self.operands)
+
+    def evaluate(self, batch: EventBatch) -> np.ndarray:
+        mask = self.operands[0].evaluate(batch)
+        for operand in self.operands[1:]:
+            mask &= operand.evaluate(batch)
+        return mask
+
+    def __repr__(self) -> str:
+        return '(' + ' & '.join(map(repr, self.operands)) + ')'
+
+
+class _Or(Filter):
+    def __init__(self, *operands: Filter) -> None:
+        self.operands = operands
+        self.cost = max(_.cost for _ in operands)
+
+    def _matches(self, lines: list[str]) -> bool:
+        return any(_._matches(lines) for _ in self.operands)
+
+    def evaluate(self, batch: EventBatch) -> np.ndarray:
+        mask = self.operands[0].evaluate(batch)
+        for operand in self.operands[1:]:
+            mask |= operand.evaluate(batch)
+        return mask
+
+    def __repr__(self) -> str:
+        return '(' + ' | '.join(map(repr, self.operands)) + ')'
+
+
+class _Not(Filter):
+    def __init__(self, operand: Filter) -> None:
+        self.operand = operand
+        self.cost = operand.cost
+
+    def _matches(self, lines: list[str]) -> bool:
+        return not self.operand._matches(lines)
+
+    def evaluate(self, batch: EventBatch) -> np.ndarray:
+        return ~self.operand.evaluate(batch)
+
+    def __repr__(self) -> str:
+        return f'~{self.operand!r}'
+
+
+class _HeaderComparison(Filter):
+    """A comparison of a field of the description line with a constant."""
+    cost = 0
+
+    def __init__(self, name: str, op: str, value: Any) -> None:
+        self.name = name
+        self.op = op
+        self.value = value
+        self._function = _OPERATORS[op]
+
+    def _compare(self, description: str) -> bool:
+        values = _get_header_values(description)
+        return values is not None and bool(self._function(values[self.name], self.value))
+
+    def _matches(self, lines: list[str]) -> bool:
+        return len(lines) > 1 and self._compare(lines[1])
+
+    def evaluate(self, batch: EventBatch) -> np.ndarray:
+        return np.array([self._compare(_) for _ in batch.descriptions], dtype=bool)
+
+    def __repr__(self) -> str:
+        return f'header.{self.name} {self.op} {self.value!r}'
+
+
+class HeaderField:
+    """A field of the description line, to be compared with a constant."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def _compare(self, op: str, value: Any) -> Filter:
+        return _HeaderComparison(self.name, op, value)
+
+    def __eq__(self, value: Any) -> Filter:  # type: ignore[override]
+        return self._compare('==', value)
+
+    def __ne__(self, value: Any) -> Filter:  # type: ignore[override]
+        return self._compare('!=', value)
+
+    def __lt__(self, value: Any) -> Filter:
+        return self._compare('<', value)
+
+    def __le__(self, value: Any) -> Filter:
+        return self._compare('<=', value)
+
+    def __gt__(self, value: Any) -> Filter:
+        return self._compare('>', value)
+
+    def __ge__(self, value: Any) -> Filter:
+        return self._compare('>=', value)
+
+    __hash__ = None  # type: ignore[assignment]
+
+
+class RowCondition:
+    """A condition on the rows of a section, the particle tracks or the clusters.
+
+    The conditions on the same section can be combined with `&`, `|` and `~`, and
+    turned into a condition on the event with `any`, `all` or `count`.
+    """
+
+    def __init__(self, section: str) -> None:
+        self.section = section
+
+    def matches(self, values: list[str]) -> bool:
+        """Returns True if the row, given by the columns of its raw line, satisfies it."""
+        raise NotImplementedError
+
+    def evaluate(self, rows: np.ndarray) -> np.ndarray:
+        """Returns the boolean mask of the rows of a structured array satisfying it."""
+        raise NotImplementedError
+
+    def any(self) -> Filter:
+        """The condition that at least one row of the event satisfies this one."""
+        return _Aggregate(self, 'any')
+
+    def all(self) -> Filter:
+        """The condition that all the rows of the event satisfy this one."""
+        return _Aggregate(self, 'all')
+
+    def count(self) -> RowCount:
+        """The number of rows of the event satisfying this one, to be compared."""
+        return RowCount(self)
+
+    def __and__(self, other: RowCondition) -> RowCondition:
+        return _RowOperation(self, 'and', _check_row_condition(self, other))
+
+    def __or__(self, other: RowCondition) -> RowCondition:
+        return _RowOperation(self, 'or', _check_row_condition(self, other))
+
+    def __invert__(self) -> RowCondition:
+        return _RowNot(self)
+
+
+class _RowComparison(RowCondition):
+    def __init__(self, section: str, name: str, op: str, value: Any) -> None:
+        super().__init__(section)
+        dtype = SECTIONS[section]
+        self.name = name
+        self.op = op
+        self.value = value
+        self._index = dtype.names.index(name)
+        self._convert = _get_converter(dtype[name])
+        self._function = _OPERATORS[op]
+
+    def matches(self, values: list[str]) -> bool:
+        return bool(self._function(self._convert(values[self._index]), self.value))
+
+    def evaluate(self, rows: np.ndarray) -> np.ndarray:
+        return np.asarray(self._function(rows[self.name], self.value), dtype=bool)
+
+    def __repr__(self) -> str:
+        return f'{self.section}.{self.name} {self.op} {self.value!r}'
+
+
+class _RowOperation(RowCondition):
+    def __init__(self, left: RowCondition, op: str, right: RowCondition) -> None:
+        super().__init__(left.section)
+        self.left = left
+        self.op = op
+        self.right = right
+
+    def matches(self, values: list[str]) -> bool:
+        if self.op == 'and':
+            return self.left.matches(values) and self.right.matches(values)
+        return self.left.matches(values) or self.right.matches(values)
+
+    def evaluate(self, rows: np.ndarray) -> np.ndarray:
+        if self.op == 'and':
+            return self.left.evaluate(rows) & self.right.evaluate(rows)
+        return self.left.evaluate(rows) | self.right.evaluate(rows)
+
+    def __repr__(self) -> str:
+        return f'({self.left!r} {"&" if self.op == "and" else "|"} {self.right!r})'
+
+
+class _RowNot(RowCondition):
+    def __init__(self, operand: RowCondition) -> None:
+        super().__init__(operand.section)
+        self.operand = operand
+
+    def matches(self, values: list[str]) -> bool:
+        return not self.operand.matches(values)
+
+    def evaluate(self, rows: np.ndarray) -> np.ndarray:
+        return ~self.operand.evaluate(rows)
+
+    def __repr__(self) -> str:
+        return f'~{self.operand!r}'
+
+
+class Column:
+    """A column of the particle tracks or of the clusters, to be compared with a constant.
+
+    A column can also be used as a condition, true when its value is not zero.
+    """
+
+    def __init__(self, section: str, name: str) -> None:
+        self.section = section
+        self.name = name
+
+    def _compare(self, op: str, value: Any) -> RowCondition:
+        return _RowComparison(self.section, self.name, op, value)
+
+    def __eq__(self, value: Any) -> RowCondition:  # type: ignore[override]
+        return self._compare('==', value)
+
+    def __ne__(self, value: Any) -> RowCondition:  # type: ignore[override]
+        return self._compare('!=', value)
+
+    def __lt__(self, value: Any) -> RowCondition:
+        return self._compare('<', value)
+
+    def __le__(self, value: Any) -> RowCondition:
+        return self._compare('<=', value)
+
+    def __gt__(self, value: Any) -> RowCondition:
+        return self._compare('>', value)
+
+    def __ge__(self, value: Any) -> RowCondition:
+        return self._compare('>=', value)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def as_condition(self) -> RowCondition:
+        """The condition that the value of the column is not zero."""
+        return self._compare('!=', 0)
+
+    def any(self) -> Filter:
+        return self.as_condition().any()
+
+    def all(self) -> Filter:
+        return self.as_condition().all()
+
+    def count(self) -> RowCount:
+        return self.as_condition().count()
+
+
+class RowCount:
+    """The number of rows of an event satisfying a condition, to be compared."""
+
+    def __init__(self, condition: RowCondition) -> None:
+        self.condition = condition
+
+    def _compare(self, op: str, value: int) -> Filter:
+        return _Aggregate(self.condition, 'count', op, value)
+
+    def __eq__(self, value: int) -> Filter:  # type: ignore[override]
+        return self._compare('==', value)
+
+    def __ne__(self, value: int) -> Filter:  # type: ignore[override]
+        return self._compare('!=', value)
+
+    def __lt__(self, value: int) -> Filter:
+        return self._compare('<', value)
+
+    def __le__(self, value: int) -> Filter:
+        return self._compare('<=', value)
+
+    def __gt__(self, value: int) -> Filter:
+        return self._compare('>', value)
+
+    def __ge__(self, value: int) -> Filter:
+        return self._compare('>=', value)
+
+    __hash__ = None  # type: ignore[assignment]
+
+
+class _Aggregate(Filter):
+    """A condition on the rows of a section, aggregated over the event."""
+
+    def __init__(
+        self, condition: RowCondition, kind: str, op: str | None = None, value: int | None = None
+    ) -> None:
+        self.condition = condition
+        self.kind = kind
+        self.op = op
+        self.value = value
+
+    def _matches(self, lines: list[str]) -> bool:
+        # The rows are those seen by the parser, which stops at the other sections
+        from .io import _split_sections
+
+        tracks, clusters, _, _ = _split_sections(lines, strict=False)
+        lines = tracks if self.condition.section == 'tracks' else clusters
+        rows = (line.split() for _, line in lines)
+        if self.kind == 'any':
+            return any(self.condition.matches(_) for _ in rows)
+        if self.kind == 'all':
+            return all(self.condition.matches(_) for _ in rows)
+        count = sum(self.condition.matches(_) for _ in rows)
+        return bool(_OPERATORS[self.op](count, self.value))
+
+    def evaluate(self, batch: EventBatch) -> np.ndarray:
+        if self.condition.section == 'tracks':
+            rows, offsets = batch.tracks, batch.track_offsets
+        else:
+            rows, offsets = batch.clusters, batch.cluster_offsets
+        # The number of matching rows of each event, from the cumulated mask
+        cumulated = np.concatenate([[0], np.cumsum(self.condition.evaluate(rows))])
+        counts = cumulated[offsets[1:]] - cumulated[offsets[:-1]]
+        if self.kind == 'any':
+            return counts > 0
+        if self.kind == 'all':
+            return counts == np.diff(offsets)
+        return np.asarray(_OPERATORS[self.op](counts, self.value), dtype=bool)
+
+    def __repr__(self) -> str:
+        if self.kind == 'count':
+            return f'count({self.condition!r}) {self.op} {self.value!r}'
+        return f'{self.kind}({self.condition!r})'
+
+
+class _Namespace:
+    """The fields of the description line, or the columns of a section."""
+
+    def __init__(self, section: str, names: list[str]) -> None:
+        self._section = section
+        self._names = names
+
+    def __getattr__(self, name: str) -> Union[HeaderField, Column]:
+        if name.startswith('_') or name not in self._names:
+            raise AttributeError(
+                f'Unknown field {name!r} of the {self._section}. '
+                f'Valid fields are: {", ".join(self._names)}.'
+            )
+        if self._section == 'header':
+            return HeaderField(name)
+        return Column(self._section, name)
+
+    def __dir__(self) -> list[str]:
+        return list(self._names)
+
+
+header = _Namespace('header', HEADER_FIELDS)
+tracks = _Namespace('tracks', list(TRACK_DTYPE.names))
+clusters = _Namespace('clusters', list(CLUSTER_DTYPE.names))
+
+
+def _check_filter(value: Any) -> Filter:
+    if isinstance(value, (Column, RowCondition)):
+        raise TypeError(
+            'A condition on the tracks or clusters must be aggregated with any, all or count.'
+        )
+    if not isinstance(value, Filter):
+        raise TypeError(f'Not a filter: {value!r}.')
+    return value
+
+
+def _check_row_condition(condition: RowCondition, value: Any) -> RowCondition:
+    if isinstance(value, Column):
+        value = value.as_condition()
+    if not isinstance(value, RowCondition):
+        raise TypeError(f'Not a condition on the {condition.section}: {value!r}.')
+    if value.section != condition.section:
+        raise TypeError(
+            f'The conditions on the {condition.section} and on the {value.section} cannot be '
+            'combined row by row: aggregate them with any, all or count first.'
+        )
+    return value
+
+
+def parse_filter(text: str) -> Filter:
+    """Parses a filter written as a Python expression.
+
+    The expression is not evaluated by Python: only the comparisons of the header
+    fields and of the columns with constants, the aggregations `any`, `all` and
+    `count`, and the operators `and`, `or` and `not` are allowed.
+
+    Parameters:
+        text: The filter, such as `any(clusters.energy > 50) and header.run_number == 299184`.
+
+    Raises:
+        ValueError: When the expression is invalid.
+    """
+    try:
+        tree = ast.parse(text.strip(), mode='eval')
+    except SyntaxError as exc:
+        raise ValueError(f'Invalid filter {text!r}: {exc.msg}.') from None
+    try:
+        return _check_filter(_translate(tree.body))
+    except (TypeError, AttributeError) as exc:
+        raise ValueError(f'Invalid filter {text!r}: {exc}') from None
+
+
+def _translate(node: ast.AST) -> Any:
+    """Translates a node of the syntax tree of a filter expression."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (bool, int, float, str)):
+        return node.value
+    if (
+        isinstance(node, ast.UnaryOp)
+        and isinstance(node.op, (ast.USub, ast.UAdd))
+        and isinstance(node.operand, ast.Constant)
+        and isinstance(node.operand.value, (int, float))
+    ):
+        return -node.operand.value if isinstance(node.op, ast.USub) else node.operand.value
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+        namespaces = {'header': header, 'tracks': tracks, 'clusters': clusters}
+        if node.value.id in namespaces:
+            return getattr(namespaces[node.value.id], node.attr)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        if node.func.id in ('any', 'all', 'count') and len(node.args) == 1:
+            operand = _translate(node.args[0])
+            if isinstance(operand, (Column, RowCondition)):
+                return getattr(operand, node.func.id)()
+            raise TypeError(f'{node.func.id} expects a condition on the tracks or clusters.')
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        operand = _translate(node.operand)
+        if isinstance(operand, Column):
+            operand = operand.as_condition()
+        if isinstance(operand, (Filter, RowCondition)):
+            return ~operand
+    if isinstance(node, ast.BoolOp):
+        operands = [_translate(_) for _ in node.values]
+        combine = operator.and_ if isinstance(node.op, ast.And) else operator.or_
+        result = operands[0]
+        if isinstance(result, Column):
+            result = result.as_condition()
+        if isinstance(result, (Filter, RowCondition)):
+            for operand in operands[1:]:
+                result = combine(result, operand)
+            return result
+    if isinstance(node, ast.Compare):
+        comparisons = []
+        left = _translate(node.left)
+        for op_node, right_node in zip(node.ops, node.comparators):
+            right = _translate(right_node)
+            comparisons.append(_compare(left, _get_operator(op_node), right))
+            left = right
+        result = comparisons[0]
+        for comparison in comparisons[1:]:
+            result = result & comparison
+        return result
+    raise TypeError(f'unsupported expression {ast.unparse(node)!r}.')
+
+
+def _get_operator(node: ast.cmpop) -> str:
+    symbols = {
+        ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>='
+    }
+    if type(node) not in symbols:
+        raise TypeError(f'unsupported comparison operator {type(node).__name__}.')
+    return symbols[type(node)]
+
+
+def _compare(left: Any, op: str, right: Any) -> Union[Filter, RowCondition]:
+    """Compares a field, a column or a count with a constant, in either order."""
+    operands = (HeaderField, Column, RowCount)
+    if not isinstance(left, operands) and isinstance(right, operands):
+        left, op, right = right, _SWAPPED[op], left
+    if not isinstance(left, operands) or isinstance(right, operands):
+        raise TypeError('a field, a column or a count must be compared with a constant.')
+    return left._compare(op, right)
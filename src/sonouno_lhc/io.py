@@ -30,43 +30,433 @@ For each event, the following information are kept:
   Tile ID | ET (GeV) | φ | θ
 
 - The remaining sections (RPC, TGC, MDT, CSC) are not used.
+
+Each section after the tracks and clusters starts with a line holding its name. Their
+lines are kept as is, without being converted.
+
+An invalid line raises a `ParseError` locating it in its event. In lenient mode, the
+invalid lines are skipped instead, and their errors are recorded in the event.
 """
 
 from __future__ import annotations
 
-from typing import Iterator
+import bz2
+import gzip
+import io
+import logging
+import lzma
+import os
+from itertools import islice
+from typing import IO, Any, Callable, Iterable, Iterator, Union
+
+import numpy as np
+
+from .filters import Filter, parse_filter
+from .models import (
+    CLUSTER_DTYPE, TRACK_DTYPE, Cluster, Event, EventBatch, ParticleTrack, _load_rows,
+    _parse_charge,
+)
 
-from .models import Event, ParticleTrack, Cluster
+logger = logging.getLogger(__name__)
 
 SEPARATOR = '---------'
 
+# The names of the sections following the tracks and clusters, in the order of the dumps.
+SECTION_NAMES = ['Hits', 'Clusters', 'Tiles', 'RPC', 'TGC', 'MDT', 'CSC']
+
+Source = Union[str, os.PathLike, Iterable[str], IO[bytes]]
+"""A HYPATIA dump: a file path, a text stream, a binary stream or any iterable of lines."""
+
+# Leading bytes of the compressed formats that can be read on the fly.
+_MAGIC_NUMBERS: list[tuple[bytes, Callable[..., IO[str]]]] = [
+    (b'\x1f\x8b', gzip.open),
+    (b'BZh', bz2.open),
+    (b'\xfd7zXZ\x00', lzma.open),
+]
+
+
+class ParseError(ValueError):
+    """Error raised when a line of an event cannot be parsed.
+
+    Attributes:
+        event_id: The event ID.
+        line_number: The number of the line in the event, starting from 1 for its ID.
+        line: The invalid line.
+        reason: The description of the error.
+    """
+
+    def __init__(self, event_id: str, line_number: int, line: str, reason: str) -> None:
+        message = f'Event {event_id}, line {line_number}: {reason}'
+        super().__init__(f'{message}: {line!r}' if line else message)
+        self.event_id = event_id
+        self.line_number = line_number
+        self.line = line
+        self.reason = reason
+
+    def __reduce__(self):
+        # The errors are sent back by the worker processes
+        return type(self), (self.event_id, self.line_number, self.line, self.reason)
+
+
+def open_text(path: str | os.PathLike) -> IO[str]:
+    """Opens a HYPATIA dump as a text stream.
+
+    Files compressed with gzip, bzip2 or xz are detected from their leading bytes and
+    decompressed on the fly, without being unpacked to disk.
+
+    Parameters:
+        path: The path of the (possibly compressed) HYPATIA dump.
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(6)
+    for prefix, opener in _MAGIC_NUMBERS:
+        if magic.startswith(prefix):
+            return opener(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
 
-def extract_events(lines: list[str]) -> Iterator[Event]:
-    """Iterates through the data, one event at a time."""
-    extracted_lines = []
+def extract_events(
+    source: Source, where: Filter | str | None = None, strict: bool = True
+) -> Iterator[Event]:
+    """Iterates through the data, one event at a time.
+
+    Parameters:
+        source: The path of the HYPATIA dump, an open stream or an iterable of lines.
+            The data is read incrementally, so that only one event at a time is kept
+            in memory. The path of an event store (see `store.convert_to_store`) is
+            also accepted, in which case the events are read from the store.
+        where: If specified, only the events satisfying this filter are converted
+            (see `filters`).
+        strict: If set to False, the invalid lines are skipped (see `convert_event`).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        from .store import EventStore, is_store
+
+        if is_store(source):
+            store = EventStore(source)
+            if where is None:
+                yield from store
+            else:
+                for index in store.select(where):
+                    yield store[index]
+            return
+    for lines in iter_event_lines(source, where):
+        yield convert_event(lines, strict)
+
+
+def chain_sources(sources: Iterable[Source]) -> Iterator[str]:
+    """Iterates through the lines of several HYPATIA dumps, as if they were only one.
+
+    Parameters:
+        sources: The paths of the HYPATIA dumps, open streams or iterables of lines.
+    """
+    for source in sources:
+        for lines in iter_event_lines(source):
+            yield from lines
+            yield SEPARATOR
+
+
+def iter_event_lines(source: Source, where: Filter | str | None = None) -> Iterator[list[str]]:
+    """Iterates through the data, yielding the lines of one event at a time.
+
+    The line terminators are removed.
+
+    Parameters:
+        source: The path of the HYPATIA dump, an open stream or an iterable of lines.
+        where: If specified, only the events whose lines satisfy this filter are
+            yielded (see `filters`).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open_text(source) as f:
+            events_lines = _split_events(f)
+            yield from events_lines if where is None else filter(as_filter(where), events_lines)
+        return
+    if isinstance(source, (io.RawIOBase, io.BufferedIOBase)):
+        events_lines = _split_events(io.TextIOWrapper(source, encoding='utf-8'))
+    else:
+        events_lines = _split_events(source)
+    yield from events_lines if where is None else filter(as_filter(where), events_lines)
+
+
+def as_filter(where: Filter | str) -> Filter:
+    """Returns a filter, parsing it if it is given as a string (see `filters.parse_filter`)."""
+    return parse_filter(where) if isinstance(where, str) else where
+
+
+def _split_events(lines: Iterable[str]) -> Iterator[list[str]]:
+    """Groups the lines by event, using the separator lines as delimiters."""
+    extracted_lines: list[str] = []
     for line in lines:
         if SEPARATOR in line:
             if not extracted_lines:
                 continue
-            yield convert_event(extracted_lines)
+            yield extracted_lines
             extracted_lines = []
         else:
-            extracted_lines.append(line)
-
-
-def convert_event(lines: list[str]) -> Event:
-    """Converts data lines into an Event instance."""
-    id_ = lines[0]
-    description = lines[1]
-    tracks = []
-    clusters = []
-    for line in lines[2:]:
-        if line.startswith('track'):
-            tracks.append(ParticleTrack.from_data(line))
-        elif line.startswith('cluster'):
-            clusters.append(Cluster.from_data(line))
-        else:
-            raise
-    event = Event(id=id_, description=description, tracks=tracks, clusters=clusters)
-    return event
+            extracted_lines.append(line.rstrip('\r\n'))
+
+    # The last event may not be followed by a separator.
+    while extracted_lines and not extracted_lines[-1].strip():
+        extracted_lines.pop()
+    if extracted_lines:
+        yield extracted_lines
+
+
+def convert_event(lines: list[str], strict: bool = True) -> Event:
+    """Converts data lines into an Event instance.
+
+    The tracks and clusters are converted, and the lines of the other sections are
+    kept as is in `Event.sections`.
+
+    Parameters:
+        lines: The lines of the event, starting with its ID and its description.
+        strict: If set to True, an invalid line raises a ParseError. Otherwise, it is
+            skipped and its error is recorded in `Event.errors`.
+
+    Raises:
+        ParseError: When a line is invalid in strict mode, or when the description
+            line is missing.
+    """
+    track_lines, cluster_lines, sections, errors = _split_sections(lines, strict)
+    tracks = _convert_rows(lines[0], track_lines, ParticleTrack.from_data, strict, errors)
+    clusters = _convert_rows(lines[0], cluster_lines, Cluster.from_data, strict, errors)
+    return Event(
+        id=lines[0],
+        description=lines[1],
+        tracks=tracks,
+        clusters=clusters,
+        sections=sections,
+        errors=sorted(errors, key=lambda _: _.line_number),
+    )
+
+
+def _split_sections(
+    lines: list[str], strict: bool
+) -> tuple[list[tuple[int, str]], list[tuple[int, str]], dict[str, list[str]], list[ParseError]]:
+    """Splits the lines of an event by section.
+
+    Returns:
+        The track lines and the cluster lines, with their numbers in the event, the
+        lines of the other sections by name and, in lenient mode, the errors of the
+        unexpected lines.
+    """
+    if len(lines) < 2:
+        raise ParseError(lines[0] if lines else '', len(lines) + 1, '', 'missing description line')
+    tracks: list[tuple[int, str]] = []
+    clusters: list[tuple[int, str]] = []
+    sections: dict[str, list[str]] = {}
+    errors: list[ParseError] = []
+    section = None
+    for number, line in enumerate(lines[2:], 3):
+        if section is None:
+            if line.startswith('track'):
+                tracks.append((number, line))
+                continue
+            if line.startswith('cluster'):
+                clusters.append((number, line))
+                continue
+        name = _get_section_name(line)
+        if name is not None:
+            section = sections.setdefault(name, [])
+        elif section is not None:
+            section.append(line)
+        elif line.strip():
+            error = ParseError(lines[0], number, line, 'unexpected line')
+            if strict:
+                raise error
+            errors.append(error)
+    return tracks, clusters, sections, errors
+
+
+def _get_section_name(line: str) -> str | None:
+    """Returns the name of the section started by a line, if any."""
+    if not line[:1].isupper():
+        return None
+    name = line.split(None, 1)[0]
+    return name if name in SECTION_NAMES else None
+
+
+def _convert_rows(
+    event_id: str,
+    lines: list[tuple[int, str]],
+    convert: Callable[[str], Any],
+    strict: bool,
+    errors: list[ParseError],
+) -> list:
+    """Converts the numbered track or cluster lines of an event into model instances."""
+    rows = []
+    for number, line in lines:
+        try:
+            rows.append(convert(line))
+        except ValueError as exc:
+            error = ParseError(event_id, number, line, str(exc))
+            if strict:
+                raise error from None
+            errors.append(error)
+    return rows
+
+
+def extract_batches(
+    source: Source,
+    batch_size: int = 1000,
+    where: Filter | str | None = None,
+    strict: bool = True,
+) -> Iterator[EventBatch]:
+    """Iterates through the data, one batch of events at a time.
+
+    Unlike `extract_events`, the tracks and clusters are not converted into model
+    instances, but stored in structured arrays.
+
+    Parameters:
+        source: The path of the HYPATIA dump, an open stream or an iterable of lines.
+        batch_size: The maximum number of events in a batch.
+        where: If specified, only the events satisfying this filter are kept. It is
+            evaluated on the raw lines, before the columns are converted.
+        strict: If set to False, the invalid lines are skipped (see `convert_batch`).
+    """
+    events_lines = iter_event_lines(source, where)
+    while batch := list(islice(events_lines, batch_size)):
+        yield convert_batch(batch, strict)
+
+
+def convert_batch(events_lines: list[list[str]], strict: bool = True) -> EventBatch:
+    """Converts the data lines of several events into an EventBatch instance.
+
+    The lines of the sections other than the tracks and clusters are kept as is in
+    `EventBatch.sections`.
+
+    Parameters:
+        events_lines: The lines of each event.
+        strict: If set to True, an invalid line raises a ParseError. Otherwise, it is
+            skipped and its error is logged.
+
+    Raises:
+        ParseError: When a line is invalid in strict mode.
+    """
+    ids = []
+    descriptions = []
+    sections = []
+    track_lines: list[tuple[int, str]] = []
+    cluster_lines: list[tuple[int, str]] = []
+    track_offsets = [0]
+    cluster_offsets = [0]
+    for lines in events_lines:
+        try:
+            event_tracks, event_clusters, event_sections, errors = _split_sections(lines, strict)
+        except ParseError as exc:
+            if strict:
+                raise
+            # Events without a description are dropped
+            logger.warning('%s', exc)
+            continue
+        for error in errors:
+            logger.warning('%s', error)
+        ids.append(lines[0])
+        descriptions.append(lines[1])
+        sections.append(event_sections)
+        track_lines += event_tracks
+        cluster_lines += event_clusters
+        track_offsets.append(len(track_lines))
+        cluster_offsets.append(len(cluster_lines))
+
+    tracks, track_offset_array = _convert_checked_columns(
+        track_lines, track_offsets, TRACK_DTYPE, ids, strict
+    )
+    clusters, cluster_offset_array = _convert_checked_columns(
+        cluster_lines, cluster_offsets, CLUSTER_DTYPE, ids, strict
+    )
+    return EventBatch(
+        ids=ids,
+        descriptions=descriptions,
+        tracks=tracks,
+        clusters=clusters,
+        track_offsets=track_offset_array,
+        cluster_offsets=cluster_offset_array,
+        sections=sections,
+    )
+
+
+def _convert_checked_columns(
+    numbered_lines: list[tuple[int, str]],
+    offsets: list[int],
+    dtype: np.dtype,
+    ids: list[str],
+    strict: bool,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Converts track or cluster lines into a structured array, with the event offsets.
+
+    The lines are converted in bulk. If it fails, they are checked one at a time to
+    locate the invalid ones, which are dropped in lenient mode.
+
+    Parameters:
+        numbered_lines: The lines of the events, with their numbers in their event.
+        offsets: The position of the first line of each event, and the number of lines.
+        dtype: The data type of the rows.
+        ids: The IDs of the events.
+        strict: If set to True, an invalid line raises a ParseError.
+    """
+    offsets = np.array(offsets, dtype=np.int64)
+    lines = [line for _, line in numbered_lines]
+    try:
+        return _convert_columns(lines, dtype), offsets
+    except ValueError:
+        pass
+    kept = np.ones(len(lines), dtype=bool)
+    for position, (number, line) in enumerate(numbered_lines):
+        try:
+            _convert_columns([line], dtype)
+        except ValueError as exc:
+            event_id = ids[np.searchsorted(offsets, position, side='right') - 1]
+            ncolumn = len(line.split())
+            if ncolumn != len(dtype.names):
+                reason = f'{ncolumn} columns instead of {len(dtype.names)}'
+            else:
+                # The row number of NumPy's message is that of the checked line
+                reason = str(exc).split(' at row ')[0]
+            error = ParseError(event_id, number, line, reason)
+            if strict:
+                raise error from None
+            logger.warning('%s', error)
+            kept[position] = False
+    cumulated = np.concatenate([[0], np.cumsum(kept)])
+    kept_lines = [line for line, keep in zip(lines, kept) if keep]
+    return _convert_columns(kept_lines, dtype), cumulated[offsets]
+
+
+def _convert_columns(lines: list[str], dtype: np.dtype) -> np.ndarray:
+    """Converts track or cluster lines into a structured array.
+
+    The lines are parsed in bulk by NumPy's C tokenizer, instead of one value at a time.
+
+    Raises:
+        ValueError: When a line is invalid, as it is for `ParticleTrack.from_data` and
+            `Cluster.from_data`, or when an ID is too long for the `id` field.
+    """
+    if not lines:
+        return np.empty(0, dtype=dtype)
+    if dtype != TRACK_DTYPE:
+        return _load_rows(lines, dtype)
 
+    # The charge is encoded as a sign and the muon flag as an integer: they are read as
+    # such and converted afterwards.
+    raw_dtype = np.dtype([
+        (name, 'U8' if name == 'field1' else 'f8' if name == 'is_muon' else dtype[name])
+        for name in dtype.names
+    ])
+    raw = _load_rows(lines, raw_dtype)
+    result = np.empty(len(raw), dtype=dtype)
+    for name in dtype.names:
+        if name not in ('field1', 'is_muon'):
+            result[name] = raw[name]
+    charges = raw['field1']
+    is_positive = charges == '+'
+    is_negative = charges == '-'
+    result['field1'] = is_positive.astype(np.int8) - is_negative
+    # The other charges are integers, as accepted by `ParticleTrack.from_data`
+    for position in np.flatnonzero(~(is_positive | is_negative)).tolist():
+        charge = _parse_charge(str(charges[position]))
+        if not -128 <= charge <= 127:
+            raise ValueError(f'charge out of range: {charge}')
+        result['field1'][position] = charge
+    result['is_muon'] = raw['is_muon'] == 1
+    return result
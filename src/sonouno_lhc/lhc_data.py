@@ -1,60 +1,195 @@
 from __future__ import annotations
 
-import math
-import typing
-import matplotlib.pyplot as plt
-from pathlib import Path
-
-from matplotlib.figure import Figure
+import logging
+from typing import TYPE_CHECKING, Mapping
 
 from sonounolib import Track as AudioTrack
 
-from . import lhc_plot
 from . import lhc_sonification
+from .lhc_plot import EventPlot
+from .lhc_sonification import ElementCache
+from .matching import TrackMatches, match_event, match_tracks
+from .metrics import NULL_METRICS, NullMetrics
 from .models import Cluster, ParticleTrack, Event
+from .plan import EventPlan, PlanElement
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
 
-SECONDS_BETWEEN_ELEMENTS = 1
+logger = logging.getLogger(__name__)
 
 
 def sonify_event(
-    event: Event, include_plot=True) -> tuple[AudioTrack, Figure | None]:
+    event: Event,
+    include_plot=True,
+    plot: EventPlot | None = None,
+    metrics: NullMetrics = NULL_METRICS,
+    cache: ElementCache | None = None,
+) -> tuple[AudioTrack, Figure | None]:
     """Sonify one event.
 
+    The plan of the event is computed first (see `plan_event`), then drawn and
+    rendered into audio.
+
     Parameters:
         event: The event to be sonify.
         include_plot: If set to True, plot the event.
+        plot: The plot in which the event is drawn, after being reset. It can be
+            reused from one event to the next, once its figure has been saved.
+            By default, a new plot is created for the event.
+        metrics: The collector of the timings and counts of the event.
+        cache: If specified, the samples of the sound elements are looked up in this
+            cache, which is shared across events.
 
     """
-    print()
-    print(event.id)
-    print(len(event.id) * '=')
+    logger.info('Sonifying event %s', event.id)
+    metrics.start_event(event.id)
 
+    plan = plan_event(event, metrics=metrics)
     if include_plot:
-        fig = plt.figure(figsize=plt.figaspect(0.5))
-        lhc_plot.plot3D_init(fig)
+        with metrics.stage('plot'):
+            if plot is None:
+                plot = EventPlot()
+            else:
+                plot.reset()
+            draw_plan(plan, event, plot)
     else:
-        fig = None
+        plot = None
+
+    sound = render_plan(plan, metrics, cache)
+    return sound, plot.figure if plot is not None else None
+
+
+def render_plan(
+    plan: EventPlan, metrics: NullMetrics = NULL_METRICS, cache: ElementCache | None = None
+) -> AudioTrack:
+    """Synthesizes the sound of the plan of an event.
+
+    Parameters:
+        plan: The plan of the event, returned by `plan_event`.
+        metrics: The collector of the timings and counts of the event.
+        cache: If specified, the samples of the sound elements are looked up in this
+            cache, which is shared across events.
+    """
+    if cache is not None:
+        hits, misses = cache.hits, cache.misses
+    with metrics.stage('synth'):
+        sound = plan.to_track(cache)
+    if cache is not None:
+        metrics.count('element_cache.hits', cache.hits - hits)
+        metrics.count('element_cache.misses', cache.misses - misses)
+    return sound
+
 
-    sound = AudioTrack(max_amplitude='int16')
+def plan_event(
+    event: Event, plot: EventPlot | None = None, metrics: NullMetrics = NULL_METRICS
+) -> EventPlan:
+    """Chooses the sound elements of an event, without synthesizing them.
+
+    Parameters:
+        event: The event to be sonified.
+        plot: If specified, plot the event elements in it.
+        metrics: The collector of the timings and counts of the event.
+    """
+    plan = EventPlan(event.id)
     sonified_ids = set()
+    with metrics.stage('match'):
+        matches = match_event(event)
+    if metrics.enabled:
+        _count_matches(event, matches, metrics)
 
     for index, track in enumerate(event.tracks):
         if track.id not in sonified_ids:
-            track_sound = sonify_track(
+            element = plan_track(
                 sonified_ids,
                 track,
-                event.tracks[index+1:],
-                event.clusters,
-                include_plot,
+                [event.tracks[_] for _ in matches.partners[index]],
+                [event.clusters[_] for _ in matches.clusters[index]],
+                metrics,
             )
-            sound.add_track(track_sound).add_blank(SECONDS_BETWEEN_ELEMENTS)
+            plan.elements.append(element)
+            metrics.count(f'elements.{element.kind}')
 
     for cluster in event.clusters:
         if cluster.id not in sonified_ids:
-            cluster_sound = sonify_cluster(cluster, include_plot)
-            sound.add_track(cluster_sound).add_blank(SECONDS_BETWEEN_ELEMENTS)
+            element = plan_cluster(cluster)
+            plan.elements.append(element)
+            metrics.count(f'elements.{element.kind}')
+
+    metrics.count('elements', len(plan.elements))
+    if plot is not None:
+        with metrics.stage('plot'):
+            draw_plan(plan, event, plot)
+    return plan
+
 
-    return sound, fig
+def draw_plan(plan: EventPlan, event: Event, plot: EventPlot) -> None:
+    """Plots the elements of the plan of an event.
+
+    The tracks and clusters of the elements are looked up in the event by ID.
+    """
+    # The first track or cluster with an ID is the one that was planned
+    tracks = {_.id: _ for _ in reversed(event.tracks)}
+    clusters = {_.id: _ for _ in reversed(event.clusters)}
+    for element in plan.elements:
+        draw_element(plot, element, tracks, clusters)
+
+
+def draw_element(
+    plot: EventPlot,
+    element: PlanElement,
+    tracks: Mapping[str, ParticleTrack],
+    clusters: Mapping[str, Cluster],
+) -> None:
+    """Plots a sound element: its track, partner tracks and clusters.
+
+    Parameters:
+        plot: The plot in which the element is drawn.
+        element: The sound element.
+        tracks: The tracks of the event, by ID.
+        clusters: The clusters of the event, by ID.
+    """
+    if element.track_id is None:
+        cluster = clusters[element.cluster_ids[0]]
+        plot.plot_cluster(
+            phi=cluster.phi,
+            theta=cluster.theta,
+            eta=cluster.eta,
+            amplitude=cluster.energy / 100,
+        )
+        return
+
+    track = tracks[element.track_id]
+    if track.is_muon:
+        # If the track is a muon plot it
+        plot.plot_muontrack(track)
+    else:
+        # If the track is not a muon plot a simple track
+        plot.plot_innertrack(track)
+
+    # The clusters pointed by the track are drawn in its direction, with its close
+    # tracks
+    for cluster_id in element.cluster_ids:
+        plot.plot_cluster(
+            phi=track.phi,
+            theta=track.theta,
+            eta=track.eta,
+            amplitude=clusters[cluster_id].energy / 100,
+        )
+        for partner_id in element.partner_ids:
+            plot.plot_innertrack(tracks[partner_id])
+
+
+def _count_matches(event: Event, matches: TrackMatches, metrics: NullMetrics) -> None:
+    """Counts the tracks and clusters of an event, and how many were matched."""
+    matched_tracks = sum(1 for _ in matches.clusters if _)
+    matched_clusters = len({_ for clusters in matches.clusters for _ in clusters})
+    metrics.count('tracks', len(event.tracks))
+    metrics.count('clusters', len(event.clusters))
+    metrics.count('tracks.matched', matched_tracks)
+    metrics.count('tracks.unmatched', len(event.tracks) - matched_tracks)
+    metrics.count('clusters.matched', matched_clusters)
+    metrics.count('clusters.unmatched', len(event.clusters) - matched_clusters)
 
 
 def sonify_track(
@@ -62,11 +197,14 @@ def sonify_track(
     track: ParticleTrack,
     other_tracks: list[ParticleTrack],
     clusters: list[Cluster],
-    include_plot: bool,
+    include_plot: bool = False,
+    plot: EventPlot | None = None,
+    metrics: NullMetrics = NULL_METRICS,
 ) -> AudioTrack:
-    """
-    This method allows to iterate through a given event ploting and sonifying
-    the data provided.
+    """Sonifies a particle track, as described in `plan_track`.
+
+    The clusters pointed by the track and its close tracks are searched for in the
+    specified lists, with `matching.match_tracks`.
 
     Parameters:
         sonified_ids: The tracks or clusters that have already been sonified.
@@ -74,58 +212,74 @@ def sonify_track(
         other_tracks: The other particule tracks that have not been yet sonified.
         clusters: The clusters to be sonified.
         include_plot: If set to True, plot the particle track.
+        plot: The plot in which the track is drawn, if it is plotted.
+        metrics: The collector of the timings, counts and warnings of the event.
+    """
+    if include_plot and plot is None:
+        raise ValueError('The plot in which the track is drawn is not specified.')
+    matches = match_tracks(
+        [_.phi for _ in [track, *other_tracks]],
+        [_.theta for _ in [track, *other_tracks]],
+        [_.field1 for _ in [track, *other_tracks]],
+        [_.phi for _ in clusters],
+        [_.theta for _ in clusters],
+    )
+    close_tracks = [other_tracks[_ - 1] for _ in matches.partners[0]]
+    pointed_clusters = [clusters[_] for _ in matches.clusters[0]]
+    element = plan_track(sonified_ids, track, close_tracks, pointed_clusters, metrics)
+    if include_plot:
+        with metrics.stage('plot'):
+            draw_element(
+                plot,
+                element,
+                {_.id: _ for _ in reversed([track, *close_tracks])},
+                {_.id: _ for _ in reversed(pointed_clusters)},
+            )
+    return _render_element(element)
+
+
+def plan_track(
+    sonified_ids: set[str],
+    track: ParticleTrack,
+    close_tracks: list[ParticleTrack],
+    clusters: list[Cluster],
+    metrics: NullMetrics = NULL_METRICS,
+) -> PlanElement:
+    """
+    This method allows to iterate through a given event choosing the sound of the
+    data provided. The element is plotted separately, by `draw_element`.
+
+    The neighbours of the track are found beforehand by `matching.match_event`.
+
+    Parameters:
+        sonified_ids: The tracks or clusters that have already been sonified.
+        track: The particule track to be sonified.
+        close_tracks: The following particule tracks of opposite charge that are
+            close to the track.
+        clusters: The clusters pointed by the track.
+        metrics: The collector of the timings, counts and warnings of the event.
+
+    Returns:
+        The sound element of the track, with the IDs of its clusters and close tracks.
     """
 
     cluster_tosonify = []
 
     # Restore variables
     converted_photon = ' '
- 
-    if include_plot:
-        if track.is_muon:
-            # If the track is a muon plot it
-            lhc_plot.plot_muontrack(track)
-        else:
-            # If the track is not a muon plot a simple track
-            lhc_plot.plot_innertrack(track)
 
-    # With each track calculate if it points out a cluster or not, if points a
-    # cluster we will sonify the track and the cluster; and check if there
-    # are a close track
+    # If the track points out a cluster we will sonify the track and the
+    # cluster; and check if there are close tracks
     for cluster in clusters:
-        # Search if the track points a cluster
-        distance = math.sqrt(
-            (track.phi - cluster.phi) ** 2 + (track.theta - cluster.theta) **2
-        )
-        if distance > 0.07:
-            continue
-
-        # If the track points to the cluster, plot it and include it
-        # in the list to sonify.
-        if include_plot:
-            lhc_plot.plot_cluster(
-                phi=track.phi,
-                theta=track.theta,
-                eta=track.eta,
-                amplitude=cluster.energy / 100,
-            )
+        # The track points to the cluster, include it in the list to sonify.
         cluster_tosonify.append(cluster)
 
-        # In addition, search if there is a close track
-        for track2 in other_tracks:
-            distance = math.sqrt((track.phi - track2.phi)**2 + (track.theta - track2.theta)**2)
-
-            if (
-                distance < 0.04
-                and track.field1 != track2.field1
-            ):
-                # If a very close track exists, plot it and set the variable
-                # to reproduce the converted photon sound
-                if track2.id not in sonified_ids:
-                    sonified_ids.add(track2.id)
-                if include_plot:
-                    lhc_plot.plot_innertrack(track2)
-                converted_photon = track2.id
+        # In addition, if a very close track exists, set the variable to
+        # reproduce the converted photon sound
+        for track2 in close_tracks:
+            if track2.id not in sonified_ids:
+                sonified_ids.add(track2.id)
+            converted_photon = track2.id
 
     """
     Sonification part
@@ -135,15 +289,14 @@ def sonify_track(
 
         # The track point out a cluster
         if len(cluster_tosonify) > 1:
-            # Arreglar el mensaje aqui
-            print(
-                f"Could a track points out to more than one cluster? "
+            metrics.warn(
+                f"The track {track.id} points to more than one cluster: "
                 f"{', '.join(_.id for _ in cluster_tosonify)}")
  
         cluster = cluster_tosonify[0]
 
         if converted_photon == ' ':
-            print(f'Sonifying {track.id} and {cluster.id}')
+            logger.debug('Sonifying %s and %s', track.id, cluster.id)
             if track.is_muon:
                 # The element is a muon with cluster
                 """
@@ -155,9 +308,7 @@ def sonify_track(
                 # For the amplitude of the sound we use the transverse energy
                 # supposing a range of [0;100], we devide the value by 100
                 # to normalize it.
-                sound = lhc_sonification.muontrack_with_cluster(
-                    cluster.energy / 100
-                )
+                kind = 'muontrack_with_cluster'
             else:
                 # The element is an electron
                 """
@@ -166,9 +317,7 @@ def sonify_track(
                 3) a tone with different frequency: change from inner detector to red calorimeter
                 4) sound corresponding to the cluster
                 """
-                sound = lhc_sonification.singletrack_with_cluster(
-                    cluster.energy / 100
-                )
+                kind = 'singletrack_with_cluster'
         else:
             # The element is a converted photon
             """
@@ -177,10 +326,18 @@ def sonify_track(
             3) a tone with different frequency: change from inner detector to red calorimeter
             4) sound corresponding to the cluster
             """
-            print(f'Sonifying {track.id}, converted photon {converted_photon} and {cluster.id}')
-            sound = lhc_sonification.doubletrack_withcluster(
-                cluster.energy / 100
+            logger.debug(
+                'Sonifying %s, converted photon %s and %s', track.id, converted_photon, cluster.id
             )
+            metrics.count('converted_photons')
+            kind = 'doubletrack_withcluster'
+        return PlanElement(
+            kind,
+            track_id=track.id,
+            cluster_ids=[_.id for _ in cluster_tosonify],
+            partner_ids=[_.id for _ in close_tracks],
+            energy=cluster.energy,
+        )
     else:
         # The track doesn't point to a cluster
         """
@@ -188,33 +345,45 @@ def sonify_track(
         2) continuous sound during 2 seconds: the track in the inner detector
         3) a tone with different frequency: change from inner detector to red calorimeter
         """
-        print(f'Sonifying {track.id}')
+        logger.debug('Sonifying %s', track.id)
         if track.is_muon:
-            sound = lhc_sonification.muontrack_only()
+            kind = 'muontrack_only'
         else:
-            sound = lhc_sonification.singletrack_only()
-
-    return sound
+            kind = 'singletrack_only'
+        return PlanElement(kind, track_id=track.id)
 
 
-def sonify_cluster(cluster: Cluster, include_plot: bool) -> AudioTrack:
-    """
-    This method allows to iterate through a given event ploting and sonifying
-    the data provided.
+def sonify_cluster(
+    cluster: Cluster,
+    include_plot: bool = False,
+    plot: EventPlot | None = None,
+    metrics: NullMetrics = NULL_METRICS,
+) -> AudioTrack:
+    """Sonifies a cluster, as described in `plan_cluster`.
 
     Parameters:
         cluster: The cluster element.
-        play_sound_status: If true, play the cluster sonification.
         include_plot: If set to True, plot the cluster.
+        plot: The plot in which the cluster is drawn, if it is plotted.
+        metrics: The collector of the timings of the event.
     """
-
+    if include_plot and plot is None:
+        raise ValueError('The plot in which the cluster is drawn is not specified.')
+    element = plan_cluster(cluster)
     if include_plot:
-        lhc_plot.plot_cluster(
-            phi=cluster.phi,
-            theta=cluster.theta,
-            eta=cluster.eta,
-            amplitude=cluster.energy / 100,
-        )
+        with metrics.stage('plot'):
+            draw_element(plot, element, {}, {cluster.id: cluster})
+    return _render_element(element)
+
+
+def plan_cluster(cluster: Cluster) -> PlanElement:
+    """
+    This method allows to iterate through a given event choosing the sound of the
+    data provided. The element is plotted separately, by `draw_element`.
+
+    Parameters:
+        cluster: The cluster element.
+    """
 
     """
     1) bip: the beginning of the detector
@@ -222,5 +391,11 @@ def sonify_cluster(cluster: Cluster, include_plot: bool) -> AudioTrack:
     3) a tone with different frequency: change from inner detector to red calorimeter
     4) sound corresponding to the cluster
     """
-    print(f'Sonifying {cluster.id}')
-    return lhc_sonification.cluster_only(cluster.energy / 100)
+    logger.debug('Sonifying %s', cluster.id)
+    return PlanElement('cluster_only', cluster_ids=[cluster.id], energy=cluster.energy)
+
+
+def _render_element(element: PlanElement) -> AudioTrack:
+    """Synthesizes the sound of an element, without the blank that follows it."""
+    arguments = [] if element.amplitude is None else [element.amplitude]
+    return getattr(lhc_sonification, element.kind)(*arguments)
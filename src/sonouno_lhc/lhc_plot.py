@@ -8,10 +8,20 @@ Created on Thu Apr 28 07:51:54 2022
 This script is dedicated to 3D plot generation based on a LHC data set
 """
 
+from __future__ import annotations
+
+from functools import cache
+from typing import TYPE_CHECKING
+
 import numpy as np
 
 from .models import ParticleTrack
 
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+SPHERE_RESOLUTION = 100
+
 
 class ColorGetter:
     """A class to loop though a list of defined colors."""
@@ -45,140 +55,192 @@ class ColorGetter:
         return self.COLORS[self.counter % len(self.COLORS)]
 
 
-# Global counter for the colors
-current_color = ColorGetter()
+def new_figure() -> Figure:
+    """Returns a figure for headless rendering.
 
-
-def plot3D_init(figure):
+    Unlike those created by pyplot, this figure is not tracked by a GUI backend:
+    it is released as soon as it is no longer referenced.
     """
-    Initialize the subplots needed to lhc plot with the given figure.
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure, figaspect
 
-    Parameters
-    ----------
-    figure : TYPE Figure() of matplotlib
+    figure = Figure(figsize=figaspect(0.5))
+    FigureCanvasAgg(figure)
+    return figure
 
-    """
-    global ax_transversal, ax_longitudinal, fig
-    fig = figure
-    figure.clf()
-    # Transversal subplot
-    # set up the axes
-    ax_transversal = figure.add_subplot(1, 2, 1, projection='3d')
-    ax_transversal.set_xlabel('$X$')
-    ax_transversal.set_ylabel('$Y$')
-    ax_transversal.set_zlabel('$Z$')
-    ax_transversal.set_xlim([-150, 150])
-    ax_transversal.set_ylim([-150, 150])
-    ax_transversal.set_zlim([-150, 150])
-    ax_transversal.view_init(90, 270)
-
-    # Longitudinal subplot
-    # set up the axes
-    ax_longitudinal = figure.add_subplot(1, 2, 2, projection='3d')
-    ax_longitudinal.set_xlabel('$Z$')
-    ax_longitudinal.set_ylabel('$Y$')
-    ax_longitudinal.set_zlabel('$X$')
-    ax_longitudinal.set_xlim([-300, 300])
-    ax_longitudinal.set_ylim([-300, 300])
-    ax_longitudinal.set_zlim([-300, 300])
-    ax_longitudinal.view_init(90, 270)
-
-    # Refresh plot to update changes
-    figure.tight_layout()
-    figure.canvas.draw()
-    current_color.reset()
-
-
-def plot_muontrack(track: ParticleTrack, energy=3) -> None:
-    """
-    Plots the track of a muon, using the energy parameter to extend the track
-    outside the inner detector (muons pass all the detector layers).
 
-    Parameters:
-        track: The muon track to be displayed.
-        energy: The default is 3.
-    """
-    current_color.change()
-    color = current_color()
-    ax_transversal.plot3D(
-        [track.field13, track.field16 * energy],
-        [track.field14, track.field17 * energy],
-        [track.field15, track.field18 * energy],
-        color,
-    )
-    ax_longitudinal.plot3D(
-        [track.field15, track.field18 * energy],
-        [track.field14, track.field17 * energy],
-        [track.field13, track.field16 * energy],
-        color,
-    )
-
-    # Refresh plot to update changes
-    fig.tight_layout()
-    fig.canvas.draw()
-
-
-def plot_innertrack(track: ParticleTrack) -> None:
-    """
-    Plot the track of all particles except muons.
+class EventPlot:
+    """The transversal and longitudinal 3D views of an event.
 
-    Parameters
-    ----------
-    track_elements: TYPE list, contain the track elements
-    """
-    current_color.change()
-    color = current_color()
-    ax_transversal.plot3D(
-        [track.field13, track.field16],
-        [track.field14, track.field17],
-        [track.field15, track.field18],
-        color,
-    )
-    ax_longitudinal.plot3D(
-        [track.field15, track.field18],
-        [track.field14, track.field17],
-        [track.field13, track.field16],
-        color,
-    )
-    
-    # Refresh plot to update changes
-    fig.tight_layout()
-    fig.canvas.draw()
-
-
-def plot_cluster(phi: float, theta: float, eta: float, amplitude: float = 10) -> None:
-    """Plots the cluster using an sphere.
-    
-    Phi, theta and eta indicate the position where the sphere has to be plotted.
-
-    Parameters
-    ----------
-    phi: Phi value of the 3D sphere coordinates.
-    theta: Theta value of the 3D sphere coordinates
-    eta: Eta value of the 3D sphere coordinates.
-    amplitude: The cluster energy.
+    Each instance holds its own figure, axes and colors, so that several events
+    can be plotted concurrently. An instance can be reused for the next event
+    after calling `reset`.
+
+    Attributes:
+        figure: The matplotlib figure.
+        draw_each_element: If set to True, the figure is laid out and redrawn after
+            each plotted element, which is useful for interactive display.
+        sphere_resolution: The number of points along the meridians and the
+            parallels of the cluster spheres.
     """
-    if amplitude != 10:
-        amplitude = amplitude * 10 + 2
-    # Depending on eta value set the r coordinate, information proportionated
-    # by WP5 team, REINFORCE project.
-    if np.abs(eta) < 1.5:
-        r = 150
-    else:
-        r = 210
-    # Pass from sphere coordinates to cartesian coordinates
-    x = r * np.sin(theta) * np.cos(phi)
-    y = r * np.sin(theta) * np.sin(phi)
-    z = r * np.cos(theta)
-    # Make the sphere
-    u = np.linspace(0, 2 * np.pi, 100)
-    v = np.linspace(0, np.pi, 100)
-    x = amplitude * np.outer(np.cos(u), np.sin(v)) + x
-    y = amplitude * np.outer(np.sin(u), np.sin(v)) + y
-    z = amplitude * np.outer(np.ones(np.size(u)), np.cos(v)) + z
-    # Plot the sphere in the subplots
-    ax_longitudinal.plot_surface(z, y, x, color='k')
-    ax_transversal.plot_surface(x, y, z, color='k')
-    # Refresh plot to update changes
-    fig.tight_layout()
-    fig.canvas.draw()
+
+    def __init__(
+        self,
+        figure: Figure | None = None,
+        draw_each_element: bool = False,
+        sphere_resolution: int = SPHERE_RESOLUTION,
+    ) -> None:
+        """The class constructor.
+
+        Parameters:
+            figure: The figure to plot in. By default, a headless figure is created.
+            draw_each_element: If set to True, the figure is redrawn after each element.
+            sphere_resolution: The resolution of the cluster spheres.
+        """
+        self.figure = figure if figure is not None else new_figure()
+        self.draw_each_element = draw_each_element
+        self.sphere_resolution = sphere_resolution
+        self.color = ColorGetter()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Initialize the subplots needed to lhc plot, removing the previous event.
+
+        The layout of the figure is computed once. Unless requested, the figure is
+        not redrawn after each element: it is only rendered when it is saved.
+        """
+        figure = self.figure
+        figure.clf()
+        # Transversal subplot
+        # set up the axes
+        self.ax_transversal = figure.add_subplot(1, 2, 1, projection='3d')
+        self.ax_transversal.set_xlabel('$X$')
+        self.ax_transversal.set_ylabel('$Y$')
+        self.ax_transversal.set_zlabel('$Z$')
+        self.ax_transversal.set_xlim([-150, 150])
+        self.ax_transversal.set_ylim([-150, 150])
+        self.ax_transversal.set_zlim([-150, 150])
+        self.ax_transversal.view_init(90, 270)
+
+        # Longitudinal subplot
+        # set up the axes
+        self.ax_longitudinal = figure.add_subplot(1, 2, 2, projection='3d')
+        self.ax_longitudinal.set_xlabel('$Z$')
+        self.ax_longitudinal.set_ylabel('$Y$')
+        self.ax_longitudinal.set_zlabel('$X$')
+        self.ax_longitudinal.set_xlim([-300, 300])
+        self.ax_longitudinal.set_ylim([-300, 300])
+        self.ax_longitudinal.set_zlim([-300, 300])
+        self.ax_longitudinal.view_init(90, 270)
+
+        figure.tight_layout()
+        if self.draw_each_element:
+            figure.canvas.draw()
+        self.color.reset()
+
+    def savefig(self, path, **keywords) -> None:
+        """Saves the figure, rendering it if needed."""
+        self.figure.savefig(path, **keywords)
+
+    def plot_muontrack(self, track: ParticleTrack, energy=3) -> None:
+        """
+        Plots the track of a muon, using the energy parameter to extend the track
+        outside the inner detector (muons pass all the detector layers).
+
+        Parameters:
+            track: The muon track to be displayed.
+            energy: The default is 3.
+        """
+        self.color.change()
+        color = self.color()
+        self.ax_transversal.plot3D(
+            [track.field13, track.field16 * energy],
+            [track.field14, track.field17 * energy],
+            [track.field15, track.field18 * energy],
+            color,
+        )
+        self.ax_longitudinal.plot3D(
+            [track.field15, track.field18 * energy],
+            [track.field14, track.field17 * energy],
+            [track.field13, track.field16 * energy],
+            color,
+        )
+
+        self._refresh()
+
+    def plot_innertrack(self, track: ParticleTrack) -> None:
+        """
+        Plot the track of all particles except muons.
+
+        Parameters:
+            track: The particle track to be displayed.
+        """
+        self.color.change()
+        color = self.color()
+        self.ax_transversal.plot3D(
+            [track.field13, track.field16],
+            [track.field14, track.field17],
+            [track.field15, track.field18],
+            color,
+        )
+        self.ax_longitudinal.plot3D(
+            [track.field15, track.field18],
+            [track.field14, track.field17],
+            [track.field13, track.field16],
+            color,
+        )
+
+        self._refresh()
+
+    def plot_cluster(self, phi: float, theta: float, eta: float, amplitude: float = 10) -> None:
+        """Plots the cluster using an sphere.
+
+        Phi, theta and eta indicate the position where the sphere has to be plotted.
+
+        Parameters:
+            phi: Phi value of the 3D sphere coordinates.
+            theta: Theta value of the 3D sphere coordinates
+            eta: Eta value of the 3D sphere coordinates.
+            amplitude: The cluster energy.
+        """
+        if amplitude != 10:
+            amplitude = amplitude * 10 + 2
+        # Depending on eta value set the r coordinate, information proportionated
+        # by WP5 team, REINFORCE project.
+        if np.abs(eta) < 1.5:
+            r = 150
+        else:
+            r = 210
+        # Pass from sphere coordinates to cartesian coordinates
+        x = r * np.sin(theta) * np.cos(phi)
+        y = r * np.sin(theta) * np.sin(phi)
+        z = r * np.cos(theta)
+        # Make the sphere
+        unit_x, unit_y, unit_z = _get_unit_sphere(self.sphere_resolution)
+        x = amplitude * unit_x + x
+        y = amplitude * unit_y + y
+        z = amplitude * unit_z + z
+        # Plot the sphere in the subplots
+        self.ax_longitudinal.plot_surface(z, y, x, color='k')
+        self.ax_transversal.plot_surface(x, y, z, color='k')
+        self._refresh()
+
+    def _refresh(self) -> None:
+        """Refreshes the plot to update changes, in interactive mode."""
+        if self.draw_each_element:
+            self.figure.tight_layout()
+            self.figure.canvas.draw()
+
+
+@cache
+def _get_unit_sphere(resolution: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the mesh of a sphere of unit radius, computed only once."""
+    u = np.linspace(0, 2 * np.pi, resolution)
+    v = np.linspace(0, np.pi, resolution)
+    x = np.outer(np.cos(u), np.sin(v))
+    y = np.outer(np.sin(u), np.sin(v))
+    z = np.outer(np.ones(np.size(u)), np.cos(v))
+    for array in x, y, z:
+        array.flags.writeable = False
+    return x, y, z
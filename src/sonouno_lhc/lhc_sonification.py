@@ -8,8 +8,12 @@ Created on Thu Apr 28 07:52:36 2022
 This script is dedicated to sonification based on a LHC data set
 """
 
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from functools import cache
 from pathlib import Path
+from typing import Callable
 
 import numpy as np
 
@@ -18,6 +22,10 @@ from sonounolib import Track
 MAX_AMPLITUDE = np.iinfo('int16').max
 DEFAULT_AMPLITUDE = MAX_AMPLITUDE / 16  # ~2048
 
+CLUSTER_FREQUENCIES = [300, 350, 600, 800, 1000, 800, 800, 1000, 700, 600]
+CLUSTER_NOTE_DURATION = 0.1
+ELEMENT_CACHE_SIZE = 256 * 2**20
+
 
 def get_bip() -> Track:
     """Returns the bip sound.
@@ -25,14 +33,49 @@ def get_bip() -> Track:
     It represents the beginning of the particle track, at the center of the inner
     detector.
     """
-    return Track.load(Path(__file__).parent / 'bip.wav', max_amplitude='int16')
+    rate, data = _get_bip_data()
+    return Track(rate=rate, max_amplitude='int16').add_raw_data(data)
+
+
+def get_rate() -> int:
+    """Returns the sampling rate of the sounds, in Hertz."""
+    return _get_bip_data()[0]
+
+
+@cache
+def _get_bip_data() -> tuple[int, np.ndarray]:
+    """Returns the sampling rate and the samples of the bip sound, read only once."""
+    bip = Track.load(Path(__file__).parent / 'bip.wav', max_amplitude='int16')
+    return bip.rate, _freeze(bip.get_data())
+
+
+@cache
+def _get_sine_wave(frequency: float | str, duration: float, amplitude: float = 1) -> np.ndarray:
+    """Returns the samples of a sine wave, synthesized only once."""
+    rate, _ = _get_bip_data()
+    sound = Track(rate=rate, max_amplitude='int16')
+    return _freeze(sound.add_sine_wave(frequency, duration, amplitude).get_data())
+
+
+@cache
+def _get_cluster_melody() -> np.ndarray:
+    """Returns the samples of the cluster melody, for a unit amplitude."""
+    return _freeze(np.concatenate([
+        _get_sine_wave(frequency, CLUSTER_NOTE_DURATION) for frequency in CLUSTER_FREQUENCIES
+    ]))
+
+
+def _freeze(data: np.ndarray) -> np.ndarray:
+    """Makes a cached array read-only, so that it cannot be altered by mistake."""
+    data.flags.writeable = False
+    return data
 
 
 def add_innersingletrack(sound: Track, duration: float = 2) -> None:
     """
     This method generates the sound of a track and return the associated audio `Track`.
     """
-    sound.add_sine_wave('D6', duration, DEFAULT_AMPLITUDE)
+    sound.add_raw_data(_get_sine_wave('D6', duration, DEFAULT_AMPLITUDE))
 
 
 def add_innerdoubletrack(sound: Track, duration: float = 2) -> None:
@@ -40,8 +83,8 @@ def add_innerdoubletrack(sound: Track, duration: float = 2) -> None:
     This method generates the sound of a double track and return the array.
     """
     cue = sound.duration
-    sound.add_sine_wave('C6', duration, DEFAULT_AMPLITUDE)
-    sound.set_cue_write(cue).add_sine_wave('D6', duration, DEFAULT_AMPLITUDE)
+    sound.add_raw_data(_get_sine_wave('C6', duration, DEFAULT_AMPLITUDE))
+    sound.set_cue_write(cue).add_raw_data(_get_sine_wave('D6', duration, DEFAULT_AMPLITUDE))
 
 
 def add_tickmark_inner_calorimeter(sound: Track, duration: float = 0.1) -> None:
@@ -49,7 +92,7 @@ def add_tickmark_inner_calorimeter(sound: Track, duration: float = 0.1) -> None:
     This method generate the sound of the tickmark that indicate the step from
     the inner detector to the green calorimeter and return the array.
     """
-    sound.add_sine_wave('F7', duration, DEFAULT_AMPLITUDE)
+    sound.add_raw_data(_get_sine_wave('F7', duration, DEFAULT_AMPLITUDE))
 
 
 def add_cluster(sound: Track, amplitude: float) -> None:
@@ -57,11 +100,283 @@ def add_cluster(sound: Track, amplitude: float) -> None:
     This method generate the sound of a cluster, setting the sound amplitude
     depending on the cluster energy, and return the array.
     """
-    frequencies = [300, 350, 600, 800, 1000, 800, 800, 1000, 700, 600]
+    sound.add_raw_data(_get_cluster_amplitude(amplitude) * _get_cluster_melody())
+
+
+def _get_cluster_amplitude(amplitude: float) -> float:
+    """Returns the amplitude of the cluster melody, from the normalized cluster energy."""
     if amplitude != 0:
         amplitude = amplitude * 2000 + 100
-    for frequency in frequencies:
-        sound.add_sine_wave(frequency, 0.1, amplitude)
+    if amplitude < 0:
+        raise ValueError(f'The amplitude is negative: {amplitude}')
+    if amplitude > MAX_AMPLITUDE:
+        raise ValueError(
+            f'The amplitude is greater than the maximum amplitude: {amplitude} '
+            f'> {MAX_AMPLITUDE}'
+        )
+    return amplitude
+
+
+@dataclass(frozen=True)
+class _Template:
+    """The pre-rendered sound of an element, without its cluster melody.
+
+    Attributes:
+        data: The samples of the element, up to its end.
+        cluster_cue: The start time of the cluster melody, if any.
+    """
+    data: np.ndarray
+    cluster_cue: float | None
+
+
+def _add_cluster_slot(sound: Track) -> float:
+    """Leaves room for the cluster melody, mixed in at rendering, and returns its start time."""
+    cue = sound.cue_write
+    sound.add_blank(len(_get_cluster_melody()) / sound.rate)
+    return cue
+
+
+_TEMPLATE_BUILDERS: dict[str, Callable[[Track], float | None]] = {}
+
+
+def _template_builder(function: Callable[[Track], float | None]) -> Callable[[Track], float | None]:
+    """Registers a function that composes the sound of an element after the bip."""
+    _TEMPLATE_BUILDERS[function.__name__.removeprefix('_build_')] = function
+    return function
+
+
+@cache
+def _get_template(name: str) -> _Template:
+    """Returns the pre-rendered sound of an element, composed only once."""
+    sound = get_bip()
+    cluster_cue = _TEMPLATE_BUILDERS[name](sound)
+    return _Template(_freeze(sound.get_data()), cluster_cue)
+
+
+def get_element_data(name: str, amplitude: float | None = None) -> np.ndarray:
+    """Returns the samples of an element, mixed from its cached template.
+
+    Parameters:
+        name: The name of the function sonifying the element, such as
+            `'muontrack_with_cluster'` or `'singletrack_only'`.
+        amplitude: The normalized cluster energy, for the elements with a cluster.
+    """
+    data = np.empty(get_element_length(name))
+    _mix_element(data, name, amplitude)
+    return data
+
+
+def get_element_length(name: str) -> int:
+    """Returns the number of samples of an element."""
+    return len(_get_template(name).data)
+
+
+def _mix_element(out: np.ndarray, name: str, amplitude: float | None) -> None:
+    """Writes the samples of an element in a buffer of the element length."""
+    template = _get_template(name)
+    out[:] = template.data
+    if template.cluster_cue is not None:
+        assert amplitude is not None
+        rate, _ = _get_bip_data()
+        melody = _get_cluster_melody()
+        start = round(template.cluster_cue * rate)
+        out[start:start + len(melody)] += _get_cluster_amplitude(amplitude) * melody
+
+
+class ElementCache:
+    """A bounded cache of the samples of the elements, across events.
+
+    The elements are keyed on their name and their normalized cluster energy, which
+    can be quantized so that close energies share the same samples. The least recently
+    used elements are evicted when the cache exceeds its size. The cache can be shared
+    by several threads.
+
+    Attributes:
+        step: The quantization step of the normalized cluster energies. If None or 0,
+            the energies are not quantized and the samples are identical to those
+            computed without the cache.
+        max_size: The maximum size of the cached samples, in bytes.
+        hits: The number of elements found in the cache.
+        misses: The number of elements that had to be computed.
+        evictions: The number of elements removed from the cache to make room.
+    """
+
+    def __init__(self, step: float | None = None, max_size: int = ELEMENT_CACHE_SIZE) -> None:
+        """The class constructor.
+
+        Parameters:
+            step: The quantization step of the normalized cluster energies.
+            max_size: The maximum size of the cached samples, in bytes.
+        """
+        if step is not None and step < 0:
+            raise ValueError(f'The quantization step is negative: {step}')
+        self.step = step or None
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        self._data: OrderedDict[tuple[str, float | None], np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def size(self) -> int:
+        """The size of the cached samples, in bytes."""
+        return self._size
+
+    def quantize(self, amplitude: float | None) -> float | None:
+        """Returns the normalized cluster energy used as key."""
+        if amplitude is None or self.step is None:
+            return amplitude
+        return round(amplitude / self.step) * self.step
+
+    def get(self, name: str, amplitude: float | None = None) -> np.ndarray:
+        """Returns the read-only samples of an element, computing them if needed.
+
+        Parameters:
+            name: The name of the element, as in `get_element_data`.
+            amplitude: The normalized cluster energy, for the elements with a cluster.
+        """
+        if _get_template(name).cluster_cue is None:
+            amplitude = None
+        key = name, self.quantize(amplitude)
+        with self._lock:
+            data = self._data.get(key)
+            if data is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+        data = _freeze(get_element_data(*key))
+        with self._lock:
+            if key not in self._data and data.nbytes <= self.max_size:
+                self._data[key] = data
+                self._size += data.nbytes
+                while self._size > self.max_size:
+                    _, evicted = self._data.popitem(last=False)
+                    self._size -= evicted.nbytes
+                    self.evictions += 1
+        return data
+
+    def clear(self) -> None:
+        """Removes all the elements and resets the statistics."""
+        with self._lock:
+            self._data.clear()
+            self._size = self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict[str, float]:
+        """Returns the statistics of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'elements': len(self._data),
+            'size': self._size,
+        }
+
+
+def _render(name: str, amplitude: float | None = None) -> Track:
+    """Renders the sound of an element as an audio track."""
+    rate, _ = _get_bip_data()
+    return Track(rate=rate, max_amplitude='int16').add_raw_data(get_element_data(name, amplitude))
+
+
+@dataclass(frozen=True)
+class Segment:
+    """An element placed on the timeline of an event.
+
+    Attributes:
+        name: The name of the element, as in `get_element_data`.
+        amplitude: The normalized cluster energy, for the elements with a cluster.
+        start: The index of the first sample of the element.
+        length: The number of samples of the element.
+    """
+    name: str
+    amplitude: float | None
+    start: int
+    length: int
+
+    @property
+    def stop(self) -> int:
+        """The index after the last sample of the element."""
+        return self.start + self.length
+
+
+@dataclass
+class Timeline:
+    """The planned sound of an event: the elements and the blanks between them.
+
+    Planning does not synthesize anything. The samples are only computed by `render`,
+    which allocates the whole buffer once and writes each element in place.
+
+    Attributes:
+        rate: The sampling rate, in Hertz.
+        segments: The elements, in chronological order.
+        length: The number of samples of the sound, including the trailing blanks.
+    """
+    rate: int = field(default_factory=get_rate)
+    segments: list[Segment] = field(default_factory=list)
+    length: int = 0
+
+    @property
+    def duration(self) -> float:
+        """The duration of the sound, in seconds."""
+        return self.length / self.rate
+
+    def add_element(self, name: str, amplitude: float | None = None) -> 'Timeline':
+        """Appends an element to the timeline.
+
+        Parameters:
+            name: The name of the element, such as `'muontrack_with_cluster'`.
+            amplitude: The normalized cluster energy, for the elements with a cluster.
+        """
+        if name not in _TEMPLATE_BUILDERS:
+            raise ValueError(f'Unknown element: {name}')
+        segment = Segment(name, amplitude, self.length, get_element_length(name))
+        self.segments.append(segment)
+        self.length = segment.stop
+        return self
+
+    def add_blank(self, duration: float) -> 'Timeline':
+        """Appends a silence to the timeline, rounded down as a sonounolib blank."""
+        self.length += int(duration * self.rate)
+        return self
+
+    def render(self, cache: ElementCache | None = None) -> np.ndarray:
+        """Returns the samples of the sound, mixed into a single buffer.
+
+        Parameters:
+            cache: If specified, the samples of the elements are looked up in this
+                cache, instead of being mixed from their templates.
+        """
+        data = np.zeros(self.length)
+        for segment in self.segments:
+            out = data[segment.start:segment.stop]
+            if cache is None:
+                _mix_element(out, segment.name, segment.amplitude)
+            else:
+                out += cache.get(segment.name, segment.amplitude)
+        return data
+
+    def to_track(self, cache: ElementCache | None = None) -> Track:
+        """Returns the rendered sound as an audio track."""
+        return Track(rate=self.rate, max_amplitude='int16').add_raw_data(self.render(cache))
+
+
+@_template_builder
+def _build_muontrack_with_cluster(sound: Track) -> float:
+    add_innersingletrack(sound)
+    add_tickmark_inner_calorimeter(sound)
+    cue = _add_cluster_slot(sound)
+    add_innersingletrack(sound.set_cue_write(cue), duration=1)
+    add_innersingletrack(sound)
+    sound.add_blank(0.5)
+    return cue
 
 
 def muontrack_with_cluster(amplitude: float) -> Track:
@@ -70,15 +385,18 @@ def muontrack_with_cluster(amplitude: float) -> Track:
     the array. Includes tickmarks indicating the beginning and transition
     between inner detector and green calorimeter.
     """
-    sound = get_bip()
+    return _render('muontrack_with_cluster', amplitude)
+
+
+@_template_builder
+def _build_muontrack_only(sound: Track) -> None:
     add_innersingletrack(sound)
     add_tickmark_inner_calorimeter(sound)
     cue = sound.duration
-    add_cluster(sound, amplitude)
     add_innersingletrack(sound.set_cue_write(cue), duration=1)
     add_innersingletrack(sound)
     sound.add_blank(0.5)
-    return sound
+
 
 def muontrack_only() -> Track:
     """
@@ -86,14 +404,15 @@ def muontrack_only() -> Track:
     the array. Include tickmarks indicating the beginning and transition 
     between inner detector and green calorimeter.
     """
-    sound = get_bip()
+    return _render('muontrack_only')
+
+
+@_template_builder
+def _build_singletrack_with_cluster(sound: Track) -> float:
     add_innersingletrack(sound)
     add_tickmark_inner_calorimeter(sound)
-    cue = sound.duration
-    add_innersingletrack(sound.set_cue_write(cue), duration=1)
-    add_innersingletrack(sound)
-    sound.add_blank(0.5)
-    return sound
+    return _add_cluster_slot(sound)
+
 
 def singletrack_with_cluster(amplitude: float) -> Track:
     """
@@ -101,11 +420,14 @@ def singletrack_with_cluster(amplitude: float) -> Track:
     the array. It includes tickmarks indicating the beginning and transition
     between inner detector and green calorimeter.
     """
-    sound = get_bip()
-    add_innersingletrack(sound)
+    return _render('singletrack_with_cluster', amplitude)
+
+
+@_template_builder
+def _build_doubletrack_withcluster(sound: Track) -> float:
+    add_innerdoubletrack(sound)
     add_tickmark_inner_calorimeter(sound)
-    add_cluster(sound, amplitude)
-    return sound
+    return _add_cluster_slot(sound)
 
 
 def doubletrack_withcluster(amplitude: float) -> Track:
@@ -114,11 +436,13 @@ def doubletrack_withcluster(amplitude: float) -> Track:
     the array. It includes tickmarks indicating the beginning and transition
     between inner detector and green calorimeter.
     """
-    sound = get_bip()
-    add_innerdoubletrack(sound)
+    return _render('doubletrack_withcluster', amplitude)
+
+
+@_template_builder
+def _build_singletrack_only(sound: Track) -> None:
+    add_innersingletrack(sound)
     add_tickmark_inner_calorimeter(sound)
-    add_cluster(sound, amplitude)
-    return sound
 
 
 def singletrack_only() -> Track:
@@ -127,10 +451,13 @@ def singletrack_only() -> Track:
     the array. It includes tickmarks indicating the beginning and transition
     between inner detector and green calorimeter.
     """
-    sound = get_bip()
-    add_innersingletrack(sound)
+    return _render('singletrack_only')
+
+
+@_template_builder
+def _build_doubletrack_only(sound: Track) -> None:
+    add_innerdoubletrack(sound)
     add_tickmark_inner_calorimeter(sound)
-    return sound
 
 
 def doubletrack_only() -> Track:
@@ -139,10 +466,14 @@ def doubletrack_only() -> Track:
     the array. It includes tickmarks indicating the beginning and transition
     between inner detector and green calorimeter.
     """
-    sound = get_bip()
-    add_innerdoubletrack(sound)
+    return _render('doubletrack_only')
+
+
+@_template_builder
+def _build_cluster_only(sound: Track) -> float:
+    sound.add_blank(2)
     add_tickmark_inner_calorimeter(sound)
-    return sound
+    return _add_cluster_slot(sound)
 
 
 def cluster_only(amplitude: float) -> Track:
@@ -151,8 +482,4 @@ def cluster_only(amplitude: float) -> Track:
     cluster energy) and returns the array. It includes tickmarks indicating the
     beginning and transition between inner detector and green calorimeter.
     """
-    sound = get_bip()
-    sound.add_blank(2)
-    add_tickmark_inner_calorimeter(sound)
-    add_cluster(sound, amplitude)
-    return sound
+    return _render('cluster_only', amplitude)
@@ -0,0 +1,183 @@
+"""Manifest of the outputs of a batch run, to skip the events that are up to date.
+
+The manifest is a JSON Lines file in the output directory, to which a line is
+appended as soon as the outputs of an event are written, so that it survives an
+interrupted run. Each line records, for each output of an event (its sound, and its
+plot if requested), the file name and a key hashing:
+
+- the raw lines of the event,
+- the parameters that change the output, such as the sample format,
+- the version of the package.
+
+An event is up to date if the keys of all its requested outputs match those of the
+manifest and its files exist.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import astuple
+from importlib import metadata
+from pathlib import Path
+from typing import Union
+
+from .models import Event
+
+MANIFEST_FILENAME = 'manifest.jsonl'
+
+# Incremented when the layout of the manifest changes.
+MANIFEST_VERSION = 1
+
+
+def get_version() -> str:
+    """Returns the version of the package, which is part of the output keys."""
+    try:
+        return metadata.version('sonouno_lhc')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+def get_output_keys(
+    item: Union[list[str], Event],
+    include_plot: bool,
+    format: str,
+    encoding: str = 'wav',
+    rate: int | None = None,
+    dedup: bool = False,
+) -> dict[str, str]:
+    """Returns the keys of the outputs of an event.
+
+    Parameters:
+        item: The raw lines of the event, or the event read from an event store.
+        include_plot: If set to True, the key of the plot is also returned.
+        format: The data type of the samples in the sound file.
+        encoding: The encoding of the sound file.
+        rate: The sampling rate of the sound file, if it is resampled.
+        dedup: True if the sound file is shared by the events with the same sound.
+    """
+    if isinstance(item, Event):
+        # The events of a store are hashed from their fields, not from raw lines.
+        lines = [item.id, item.description]
+        lines += [repr(astuple(_)) for _ in item.tracks]
+        lines += [repr(astuple(_)) for _ in item.clusters]
+    else:
+        lines = item
+    digest = hashlib.sha256('\n'.join(lines).encode()).hexdigest()
+    version = get_version()
+    options = [f'format={format}']
+    # The options added later are only hashed when they are used, so that the keys of
+    # the outputs written with the defaults do not change.
+    if encoding != 'wav':
+        options.append(f'encoding={encoding}')
+    if rate is not None:
+        options.append(f'rate={rate}')
+    if dedup:
+        options.append('dedup')
+    keys = {'sound': _hash(digest, version, *options)}
+    if include_plot:
+        keys['plot'] = _hash(digest, version)
+    return keys
+
+
+def _hash(*parts: str) -> str:
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()[:32]
+
+
+class Manifest:
+    """The manifest of the outputs of the events in an output directory.
+
+    Attributes:
+        path: The path of the manifest file.
+        entries: The latest outputs of each event ID, as a mapping from the output
+            name (`sound` or `plot`) to its file name and key.
+    """
+
+    def __init__(self, output_path: str | os.PathLike) -> None:
+        """The class constructor. The manifest is created if needed.
+
+        Parameters:
+            output_path: The directory of the outputs.
+        """
+        self.output_path = Path(output_path)
+        self.path = self.output_path / MANIFEST_FILENAME
+        self.entries: dict[str, dict[str, dict[str, str]]] = {}
+        nline = self._load()
+        if nline > 2 * len(self.entries):
+            self._compact()
+        self._file = self.path.open('a', encoding='utf-8')
+
+    def __enter__(self) -> Manifest:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def is_up_to_date(self, event_id: str, keys: dict[str, str]) -> bool:
+        """Returns True if the requested outputs of an event exist and match their keys."""
+        outputs = self.entries.get(event_id)
+        if outputs is None:
+            return False
+        for name, key in keys.items():
+            output = outputs.get(name)
+            if output is None or output['key'] != key:
+                return False
+            if not (self.output_path / output['file']).is_file():
+                return False
+        return True
+
+    def get_path(self, event_id: str, name: str) -> Path | None:
+        """Returns the path of an output of an event, if it is in the manifest."""
+        output = self.entries.get(event_id, {}).get(name)
+        return None if output is None else self.output_path / output['file']
+
+    def record(self, event_id: str, outputs: dict[str, tuple[Path, str]]) -> None:
+        """Records the outputs of an event, once they have been written.
+
+        Parameters:
+            event_id: The event ID.
+            outputs: The path and the key of each output.
+        """
+        entry = {
+            name: {'file': os.path.relpath(path, self.output_path), 'key': key}
+            for name, (path, key) in outputs.items()
+        }
+        # The outputs that have not been regenerated are kept
+        merged = {**self.entries.get(event_id, {}), **entry}
+        self.entries[event_id] = merged
+        self._write(event_id, merged)
+        self._file.flush()
+
+    def close(self) -> None:
+        """Closes the manifest file."""
+        self._file.close()
+
+    def _load(self) -> int:
+        """Reads the manifest and returns its number of lines."""
+        if not self.path.is_file():
+            return 0
+        nline = 0
+        with self.path.open(encoding='utf-8') as f:
+            for line in f:
+                nline += 1
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    # Line truncated by an interrupted run
+                    continue
+                if data.get('manifest_version') == MANIFEST_VERSION:
+                    self.entries[data['event_id']] = data['outputs']
+        return nline
+
+    def _compact(self) -> None:
+        """Rewrites the manifest with only the latest entry of each event."""
+        temporary_path = self.path.with_suffix('.tmp')
+        with temporary_path.open('w', encoding='utf-8') as self._file:
+            for event_id, outputs in self.entries.items():
+                self._write(event_id, outputs)
+        temporary_path.replace(self.path)
+
+    def _write(self, event_id: str, outputs: dict[str, dict[str, str]]) -> None:
+        line = {'manifest_version': MANIFEST_VERSION, 'event_id': event_id, 'outputs': outputs}
+        self._file.write(json.dumps(line) + '\n')
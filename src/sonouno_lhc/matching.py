@@ -0,0 +1,198 @@
+"""Neighbour searches between the particle tracks and the clusters of an event.
+
+A track points to a cluster if their distance in the (φ, θ) plane is at most
+`CLUSTER_DISTANCE`. Two tracks of opposite charges that are closer than
+`CONVERTED_PHOTON_DISTANCE` are the signature of a converted photon.
+
+Instead of comparing every track with every cluster and every other track, the
+points are binned in a grid whose cells are as large as the search radius, so that
+only the points of the 3 x 3 neighbouring cells are compared. All the tracks of an
+event are processed at once.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from .models import Event
+
+CLUSTER_DISTANCE = 0.07
+CONVERTED_PHOTON_DISTANCE = 0.04
+
+# The cells are slightly larger than the search radius, so that rounding errors
+# cannot move a neighbour beyond the adjacent cells.
+_CELL_MARGIN = 1 + 1e-6
+
+
+class AngularGrid:
+    """Grid index of points in the (φ, θ) plane, for fixed-radius neighbour searches.
+
+    Attributes:
+        radius: The search radius.
+        periodic: If set to True, the φ coordinate wraps around at ±π.
+    """
+
+    def __init__(self, phi: ArrayLike, theta: ArrayLike, radius: float, periodic: bool = False) -> None:
+        """The class constructor.
+
+        Parameters:
+            phi: The φ coordinates of the indexed points.
+            theta: The θ coordinates of the indexed points.
+            radius: The search radius.
+            periodic: If set to True, the φ coordinate wraps around at ±π.
+        """
+        self.radius = radius
+        self.periodic = periodic
+        self._cell_size = radius * _CELL_MARGIN
+        self._ncell_phi = int(2 * np.pi // self._cell_size) if periodic else 0
+        self.phi = np.asarray(phi, dtype=float)
+        self.theta = np.asarray(theta, dtype=float)
+        keys = self._keys(*self._cells(self.phi, self.theta))
+        self._order = np.argsort(keys, kind='stable')
+        self._sorted_keys = keys[self._order]
+
+    def query(
+        self, phi: ArrayLike, theta: ArrayLike, inclusive: bool = True
+    ) -> tuple[NDArray[np.int64], NDArray[np.int64]]:
+        """Returns the pairs of query and indexed points that are within the radius.
+
+        Parameters:
+            phi: The φ coordinates of the query points.
+            theta: The θ coordinates of the query points.
+            inclusive: If set to True, the points at a distance equal to the radius are
+                included.
+
+        Returns:
+            The indices of the query points and those of the indexed points, sorted by
+            query index and then by indexed point index.
+        """
+        phi = np.asarray(phi, dtype=float)
+        theta = np.asarray(theta, dtype=float)
+        cell_phi, cell_theta = self._cells(phi, theta)
+        query_indices = []
+        point_indices = []
+        for offset_phi in (-1, 0, 1):
+            neighbour_phi = cell_phi + offset_phi
+            if self.periodic:
+                neighbour_phi %= self._ncell_phi
+            for offset_theta in (-1, 0, 1):
+                keys = self._keys(neighbour_phi, cell_theta + offset_theta)
+                starts = np.searchsorted(self._sorted_keys, keys, 'left')
+                counts = np.searchsorted(self._sorted_keys, keys, 'right') - starts
+                query_indices.append(np.repeat(np.arange(len(keys)), counts))
+                point_indices.append(self._order[_expand_ranges(starts, counts)])
+        query_index = np.concatenate(query_indices)
+        point_index = np.concatenate(point_indices)
+        if self.periodic and self._ncell_phi < 3:
+            # The neighbouring cells are not distinct
+            query_index, point_index = np.unique(np.array([query_index, point_index]), axis=1)
+
+        delta_phi = phi[query_index] - self.phi[point_index]
+        if self.periodic:
+            delta_phi = (delta_phi + np.pi) % (2 * np.pi) - np.pi
+        distance = np.sqrt(delta_phi ** 2 + (theta[query_index] - self.theta[point_index]) ** 2)
+        is_close = distance <= self.radius if inclusive else distance < self.radius
+        query_index = query_index[is_close]
+        point_index = point_index[is_close]
+        order = np.lexsort((point_index, query_index))
+        return query_index[order], point_index[order]
+
+    def _cells(self, phi: NDArray[np.float64], theta: NDArray[np.float64]) -> tuple[NDArray[np.int64], NDArray[np.int64]]:
+        """Returns the cell coordinates of the points."""
+        if self.periodic:
+            phi = phi % (2 * np.pi)
+        cell_phi = np.floor(phi / self._cell_size).astype(np.int64)
+        if self.periodic:
+            cell_phi %= self._ncell_phi
+        return cell_phi, np.floor(theta / self._cell_size).astype(np.int64)
+
+    @staticmethod
+    def _keys(cell_phi: NDArray[np.int64], cell_theta: NDArray[np.int64]) -> NDArray[np.int64]:
+        """Combines the cell coordinates into a single sortable key."""
+        return (cell_phi << 32) + (cell_theta + 2**31)
+
+
+@dataclass
+class TrackMatches:
+    """The neighbours of each particle track of an event.
+
+    Attributes:
+        clusters: For each track, the indices of the clusters it points to.
+        partners: For each track, the indices of the following tracks of opposite charge
+            that are close enough to form a converted photon with it.
+    """
+    clusters: list[list[int]]
+    partners: list[list[int]]
+
+
+def match_event(event: Event, periodic: bool = False) -> TrackMatches:
+    """Matches the particle tracks of an event with its clusters and other tracks.
+
+    Parameters:
+        event: The event whose tracks are matched.
+        periodic: If set to True, the φ coordinate wraps around at ±π. The default
+            compares the φ values as they are, as the sonification always did.
+    """
+    return match_tracks(
+        [_.phi for _ in event.tracks],
+        [_.theta for _ in event.tracks],
+        [_.field1 for _ in event.tracks],
+        [_.phi for _ in event.clusters],
+        [_.theta for _ in event.clusters],
+        periodic=periodic,
+    )
+
+
+def match_tracks(
+    track_phi: ArrayLike,
+    track_theta: ArrayLike,
+    track_charge: ArrayLike,
+    cluster_phi: ArrayLike,
+    cluster_theta: ArrayLike,
+    periodic: bool = False,
+) -> TrackMatches:
+    """Matches particle tracks with clusters and with other tracks, from their columns.
+
+    Parameters:
+        track_phi: The φ coordinates of the tracks.
+        track_theta: The θ coordinates of the tracks.
+        track_charge: The charges of the tracks.
+        cluster_phi: The φ coordinates of the clusters.
+        cluster_theta: The θ coordinates of the clusters.
+        periodic: If set to True, the φ coordinate wraps around at ±π.
+    """
+    ntrack = len(track_phi)
+    track_charge = np.asarray(track_charge)
+
+    cluster_grid = AngularGrid(cluster_phi, cluster_theta, CLUSTER_DISTANCE, periodic)
+    track_index, cluster_index = cluster_grid.query(track_phi, track_theta)
+
+    track_grid = AngularGrid(track_phi, track_theta, CONVERTED_PHOTON_DISTANCE, periodic)
+    track_index1, track_index2 = track_grid.query(track_phi, track_theta, inclusive=False)
+    is_partner = (track_index2 > track_index1) & (
+        track_charge[track_index1] != track_charge[track_index2]
+    )
+    track_index1 = track_index1[is_partner]
+    track_index2 = track_index2[is_partner]
+
+    return TrackMatches(
+        clusters=_group(track_index, cluster_index, ntrack),
+        partners=_group(track_index1, track_index2, ntrack),
+    )
+
+
+def _expand_ranges(starts: NDArray[np.int64], counts: NDArray[np.int64]) -> NDArray[np.int64]:
+    """Concatenates the ranges [start, start + count) of each pair."""
+    ends = np.cumsum(counts)
+    return np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - ends + counts, counts)
+
+
+def _group(keys: NDArray[np.int64], values: NDArray[np.int64], nkey: int) -> list[list[int]]:
+    """Groups the values of the sorted keys in one list per key."""
+    if nkey == 0:
+        return []
+    counts = np.bincount(keys, minlength=nkey)
+    return [_.tolist() for _ in np.split(values, np.cumsum(counts)[:-1])]
@@ -0,0 +1,214 @@
+"""Instrumentation of the sonification: per-event timings, counts and warnings.
+
+The functions of the pipeline accept a `metrics` argument. By default, it is the
+no-op `NULL_METRICS` collector, whose methods do nothing, so that the instrumentation
+costs a few method calls per event when it is not used.
+
+With a `Metrics` collector, each event gets an `EventMetrics` record with:
+
+- the time spent in each stage: `parse`, `match`, `synth`, `plot` and `write`,
+- counts, such as the numbers of tracks, of matched and unmatched tracks, of unmatched
+  clusters and of sound elements of each kind (`elements.<name>`),
+- the warnings raised while sonifying the event.
+
+The records can be exported in JSON or CSV.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import csv
+import json
+import logging
+import os
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import IO, Callable, ContextManager, Iterator
+
+logger = logging.getLogger(__name__)
+
+STAGES = ['parse', 'match', 'synth', 'plot', 'write']
+
+
+@dataclass
+class EventMetrics:
+    """The metrics of the sonification of one event.
+
+    Attributes:
+        event_id: The event ID.
+        timings: The time spent in each stage, in seconds.
+        counts: The number of tracks, clusters, elements, etc.
+        warnings: The warnings raised while sonifying the event.
+    """
+    event_id: str
+    timings: dict[str, float] = field(default_factory=dict)
+    counts: dict[str, int] = field(default_factory=dict)
+    warnings: list[str] = field(default_factory=list)
+
+
+class NullMetrics:
+    """A metrics collector that does not collect anything."""
+    enabled = False
+
+    def start_event(self, event_id: str) -> None:
+        pass
+
+    def stage(self, name: str) -> ContextManager[None]:
+        return _NULL_CONTEXT
+
+    def count(self, name: str, value: int = 1) -> None:
+        pass
+
+    def warn(self, message: str) -> None:
+        logger.warning(message)
+
+    def add(self, record: EventMetrics) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+
+_NULL_CONTEXT = contextlib.nullcontext()
+NULL_METRICS = NullMetrics()
+
+
+class Metrics(NullMetrics):
+    """A collector of the metrics of the sonified events.
+
+    Attributes:
+        events: The records of the events, in the order in which they were started.
+        callback: A function called with the record of each event, once it is complete.
+    """
+    enabled = True
+
+    def __init__(self, callback: Callable[[EventMetrics], None] | None = None) -> None:
+        """The class constructor.
+
+        Parameters:
+            callback: A function called with the record of each event, once the next
+                event is started or the record is added.
+        """
+        self.events: list[EventMetrics] = []
+        self.callback = callback
+        self._current: EventMetrics | None = None
+
+    @property
+    def current(self) -> EventMetrics | None:
+        """The record of the event being sonified."""
+        return self._current
+
+    def start_event(self, event_id: str) -> None:
+        """Starts the record of an event, completing the previous one.
+
+        Nothing is done if the current record is already that of the event, so that
+        the stages of an event can be recorded by different functions. Call `finish`
+        to separate two consecutive events with the same ID.
+        """
+        if self._current is not None and self._current.event_id == event_id:
+            return
+        self._complete()
+        self._current = EventMetrics(event_id)
+
+    def stage(self, name: str) -> ContextManager[None]:
+        """Returns a context manager adding its duration to a stage of the current event."""
+        return self._time(name)
+
+    @contextlib.contextmanager
+    def _time(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self._current is not None:
+                timings = self._current.timings
+                timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Increments a count of the current event."""
+        if self._current is not None:
+            self._current.counts[name] = self._current.counts.get(name, 0) + value
+
+    def warn(self, message: str) -> None:
+        """Logs a warning and records it in the current event."""
+        super().warn(message)
+        if self._current is not None:
+            self._current.warnings.append(message)
+
+    def add(self, record: EventMetrics) -> None:
+        """Adds the record of an event collected elsewhere, such as in a worker process."""
+        self._complete()
+        self._current = record
+        self._complete()
+
+    def finish(self) -> None:
+        """Completes the record of the current event."""
+        self._complete()
+
+    def _complete(self) -> None:
+        if self._current is None:
+            return
+        self.events.append(self._current)
+        if self.callback is not None:
+            self.callback(self._current)
+        self._current = None
+
+    def summary(self) -> dict:
+        """Returns the totals over the events."""
+        timings: Counter[str] = Counter()
+        counts: Counter[str] = Counter()
+        for record in self.events:
+            timings.update(record.timings)
+            counts.update(record.counts)
+        return {
+            'events': len(self.events),
+            'timings': dict(timings),
+            'counts': dict(counts),
+            'warnings': sum(len(_.warnings) for _ in self.events),
+        }
+
+    def to_json(self, file: str | os.PathLike | IO[str]) -> None:
+        """Writes the summary and the records of the events in JSON."""
+        data = {'summary': self.summary(), 'events': [asdict(_) for _ in self.events]}
+        with _open(file) as f:
+            json.dump(data, f, indent=2)
+            f.write('\n')
+
+    def to_csv(self, file: str | os.PathLike | IO[str]) -> None:
+        """Writes the records of the events in CSV, one row per event.
+
+        The timings are in seconds, in the `time.<stage>` columns. The warnings are
+        joined by newlines.
+        """
+        timing_names = list(STAGES)
+        count_names: list[str] = []
+        for record in self.events:
+            timing_names += [_ for _ in record.timings if _ not in timing_names]
+            count_names += [_ for _ in record.counts if _ not in count_names]
+        with _open(file, newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                ['event_id'] + [f'time.{_}' for _ in timing_names] + count_names + ['warnings']
+            )
+            for record in self.events:
+                writer.writerow(
+                    [record.event_id]
+                    + [record.timings.get(_, 0.0) for _ in timing_names]
+                    + [record.counts.get(_, 0) for _ in count_names]
+                    + ['\n'.join(record.warnings)]
+                )
+
+    def export(self, path: str | os.PathLike) -> None:
+        """Writes the metrics in CSV if the file extension is .csv, in JSON otherwise."""
+        if os.fspath(path).endswith('.csv'):
+            self.to_csv(path)
+        else:
+            self.to_json(path)
+
+
+def _open(file: str | os.PathLike | IO[str], **keywords) -> ContextManager[IO[str]]:
+    """Opens a path for writing, or returns an open stream as is."""
+    if isinstance(file, (str, os.PathLike)):
+        return open(file, 'w', encoding='utf-8', **keywords)
+    return contextlib.nullcontext(file)
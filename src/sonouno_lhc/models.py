@@ -1,24 +1,27 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any
 
+import numpy as np
 
-@dataclass
+
+@dataclass(slots=True)
 class ParticleTrack:
     """Class representing a particule track."""
     id: str
-    field1: str
-    field2: str
-    field3: str
+    field1: int
+    field2: float
+    field3: float
     phi: float
     theta: float
     eta: float
-    field7: str
-    field8: str
-    field9: str
-    field10: str
+    field7: float
+    field8: float
+    field9: float
+    field10: float
     is_muon: bool
-    field12: str
+    field12: float
     field13: float
     field14: float
     field15: float
@@ -30,49 +33,235 @@ class ParticleTrack:
     def from_data(cls, line: str) -> 'ParticleTrack':
         id, f1, f2, f3, phi, theta, eta, f7, f8, f9, f10, is_muon, f12, f13, f14, f15, f16, f17, f18 = line.split()
         return ParticleTrack(
-            id=id, field1=f1, field2=f2, field3=f3, phi=float(phi), theta=float(theta), eta=float(eta),
-            field7=f7, field8=f8, field9=f9, field10=f10, is_muon=bool(int(is_muon)==1), field12=f12, field13=float(f13), field14=float(f14),
-            field15=float(f15), field16=float(f16), field17=float(f17), field18=float(f18),
+            id=id, field1=_parse_charge(f1), field2=float(f2), field3=float(f3), phi=float(phi), theta=float(theta), eta=float(eta),
+            field7=float(f7), field8=float(f8), field9=float(f9), field10=float(f10), is_muon=bool(int(is_muon)==1), field12=float(f12),
+            field13=float(f13), field14=float(f14), field15=float(f15), field16=float(f16), field17=float(f17), field18=float(f18),
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class Cluster:
     """Class representing a particule cluster."""
     id: str
-    field1: str
-    field2: str
+    field1: float
+    field2: float
     energy: float
     phi: float
     theta: float
     eta: float
-    field7: str
-    field8: str
-    field9: str
-    field10: str
-    field11: str
-    field12: str
-    field13: str
-    field14: str
-    field15: str
-    field16: str
-    field17: str
-    field18: str
+    field7: float
+    field8: float
+    field9: float
+    field10: float
+    field11: float
+    field12: float
+    field13: float
+    field14: float
+    field15: float
+    field16: float
+    field17: float
+    field18: float
 
     @classmethod
     def from_data(cls, line: str) -> 'Cluster':
         id, f1, f2, energy, phi, theta, eta, f7, f8, f9, f10, f11, f12, f13, f14, f15, f16, f17, f18 = line.split()
         return Cluster(
-            id=id, field1=f1, field2=f2, energy=float(energy), phi=float(phi), theta=float(theta), eta=float(eta),
-            field7=f7, field8=f8, field9=f9, field10=f10, field11=f11, field12=f12, field13=f13, field14=f14,
-            field15=f15, field16=f16, field17=f17, field18=f18,
+            id=id, field1=float(f1), field2=float(f2), energy=float(energy), phi=float(phi), theta=float(theta), eta=float(eta),
+            field7=float(f7), field8=float(f8), field9=float(f9), field10=float(f10), field11=float(f11), field12=float(f12),
+            field13=float(f13), field14=float(f14), field15=float(f15), field16=float(f16), field17=float(f17), field18=float(f18),
         )
 
 
-@dataclass
+@dataclass(slots=True)
+class EventHeader:
+    """Class representing the description line of an event."""
+    missing_et: float
+    missing_et_phi: float
+    date: str
+    event_number: int
+    run_number: int
+
+    @classmethod
+    def from_data(cls, line: str) -> 'EventHeader':
+        # The date and time span several columns, so the last ones are counted from the end
+        missing_et, missing_et_phi, *date, event_number, run_number, _, _, _ = line.split()
+        return EventHeader(
+            missing_et=float(missing_et), missing_et_phi=float(missing_et_phi), date=' '.join(date),
+            event_number=int(event_number), run_number=int(run_number),
+        )
+
+
+@dataclass(slots=True)
 class Event:
     """Class representing a unit of work."""
     id: str
     description: str
     tracks: list[ParticleTrack]
     clusters: list[Cluster]
+    # The raw lines of the sections following the tracks and clusters, by section name,
+    # or None if they are not available, as for the events of an event store
+    sections: dict[str, list[str]] | None = field(default_factory=dict)
+    # The errors of the lines skipped when the event was parsed in lenient mode
+    errors: list[ValueError] = field(default_factory=list)
+    # The arrays parsed from the sections, on first access
+    _arrays: dict[str, Any] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    @property
+    def header(self) -> EventHeader:
+        """The fields of the description line."""
+        return EventHeader.from_data(self.description)
+
+    @property
+    def tiles(self) -> np.ndarray:
+        """The hits in the hadronic calorimeter, of data type `TILE_DTYPE`.
+
+        The Tiles section is parsed on first access.
+        """
+        if 'tiles' not in self._arrays:
+            self._arrays['tiles'] = _parse_section(self, 'Tiles', TILE_DTYPE)
+        return self._arrays['tiles']
+
+    @property
+    def cluster_hits(self) -> np.ndarray:
+        """The constituent hits of the clusters, of data type `CLUSTER_HIT_DTYPE`.
+
+        The Clusters section is parsed on first access. The hits are sorted by cluster
+        name, so that those of a cluster are contiguous (see `get_cluster_hits`).
+        """
+        return self._get_cluster_hits()[0]
+
+    def get_cluster_hits(self, cluster_id: str) -> np.ndarray:
+        """Returns the constituent hits of a cluster, as a view of `cluster_hits`."""
+        hits, index = self._get_cluster_hits()
+        start, stop = index.get(cluster_id, (0, 0))
+        return hits[start:stop]
+
+    def _get_cluster_hits(self) -> tuple[np.ndarray, dict[str, tuple[int, int]]]:
+        """Returns the constituent hits sorted by cluster name, and their index."""
+        if 'cluster_hits' not in self._arrays:
+            hits = _parse_section(self, 'Clusters', CLUSTER_HIT_DTYPE)
+            hits = hits[np.argsort(hits['cluster'], kind='stable')]
+            names, starts, counts = np.unique(
+                hits['cluster'], return_index=True, return_counts=True
+            )
+            index = {
+                name: (start, start + count)
+                for name, start, count in zip(names.tolist(), starts.tolist(), counts.tolist())
+            }
+            self._arrays['cluster_hits'] = hits, index
+        return self._arrays['cluster_hits']
+
+
+def _parse_charge(value: str) -> int:
+    """Converts the charge of a particle track, which is encoded as a sign."""
+    if value == '+':
+        return 1
+    if value == '-':
+        return -1
+    return int(value)
+
+
+# Column layouts of the particle tracks and clusters, when they are stored as
+# structured arrays. The field names are those of the model attributes.
+TRACK_DTYPE = np.dtype(
+    [('id', 'U16'), ('field1', 'i1')]
+    + [(name, 'f8') for name in ['field2', 'field3', 'phi', 'theta', 'eta', 'field7', 'field8', 'field9', 'field10']]
+    + [('is_muon', '?'), ('field12', 'f8')]
+    + [(f'field{index}', 'f8') for index in range(13, 19)]
+)
+CLUSTER_DTYPE = np.dtype(
+    [('id', 'U16'), ('field1', 'f8'), ('field2', 'f8'), ('energy', 'f8'), ('phi', 'f8'), ('theta', 'f8'), ('eta', 'f8')]
+    + [(f'field{index}', 'f8') for index in range(7, 19)]
+)
+
+# Column layouts of the Tiles section (hits in the hadronic calorimeter) and of the
+# Clusters section (constituent hits of the clusters, with the name of their cluster).
+TILE_DTYPE = np.dtype([('id', 'i8'), ('et', 'f8'), ('phi', 'f8'), ('theta', 'f8')])
+CLUSTER_HIT_DTYPE = np.dtype(
+    [('et', 'f8'), ('phi', 'f8'), ('theta', 'f8'), ('cluster', 'U16'), ('kind', 'i8')]
+)
+
+
+def _parse_section(event: Event, name: str, dtype: np.dtype) -> np.ndarray:
+    """Converts the lines of a section of an event into a structured array.
+
+    The lines are parsed in bulk by NumPy's C tokenizer.
+
+    Raises:
+        ValueError: When the section is invalid, or the sections of the event are not
+            available.
+    """
+    if event.sections is None:
+        raise ValueError(
+            f'Event {event.id}: the {name} section is not available for the events of an '
+            'event store.'
+        )
+    lines = event.sections.get(name)
+    if not lines:
+        return np.empty(0, dtype)
+    try:
+        return _load_rows(lines, dtype)
+    except ValueError as exc:
+        raise ValueError(f'Event {event.id}: invalid {name} section: {exc}') from None
+
+
+def _load_rows(lines: list[str], dtype: np.dtype) -> np.ndarray:
+    """Parses lines into a structured array, with NumPy's C tokenizer.
+
+    NumPy silently truncates the strings longer than their field: they are read one
+    character wider, and rejected if they do not fit.
+
+    Raises:
+        ValueError: When a line is invalid or a string is longer than its field.
+    """
+    widths = {name: dtype[name].itemsize // 4 for name in dtype.names if dtype[name].kind == 'U'}
+    wide_dtype = np.dtype([
+        (name, f'U{widths[name] + 1}' if name in widths else dtype[name]) for name in dtype.names
+    ])
+    rows = np.loadtxt(lines, dtype=wide_dtype, comments=None, ndmin=1)
+    for name, width in widths.items():
+        too_long = np.char.str_len(rows[name]) > width
+        if too_long.any():
+            value = rows[name][too_long.argmax()]
+            raise ValueError(f'{name} longer than {width} characters: {value!r}...')
+    return rows.astype(dtype)
+
+
+@dataclass
+class EventBatch:
+    """Class representing a batch of events, stored column-wise.
+
+    The tracks (resp. clusters) of all the events are concatenated in a single
+    structured array. Those of the i-th event are located between the offsets
+    `track_offsets[i]` and `track_offsets[i+1]` (resp. `cluster_offsets`). The lines
+    of the other sections of each event are kept as is in `sections`, unless they are
+    not available, as for the batches of an event store.
+    """
+    ids: list[str]
+    descriptions: list[str]
+    tracks: np.ndarray
+    clusters: np.ndarray
+    track_offsets: np.ndarray
+    cluster_offsets: np.ndarray
+    sections: list[dict[str, list[str]]] | None = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def event_tracks(self, index: int) -> np.ndarray:
+        """Returns the tracks of the i-th event of the batch."""
+        return self.tracks[self.track_offsets[index]:self.track_offsets[index + 1]]
+
+    def event_clusters(self, index: int) -> np.ndarray:
+        """Returns the clusters of the i-th event of the batch."""
+        return self.clusters[self.cluster_offsets[index]:self.cluster_offsets[index + 1]]
+
+    def event(self, index: int) -> Event:
+        """Converts the i-th event of the batch into an Event instance."""
+        return Event(
+            id=self.ids[index],
+            description=self.descriptions[index],
+            tracks=[ParticleTrack(*_) for _ in self.event_tracks(index).tolist()],
+            clusters=[Cluster(*_) for _ in self.event_clusters(index).tolist()],
+            sections=self.sections[index] if self.sections is not None else None,
+        )
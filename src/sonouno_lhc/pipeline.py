@@ -0,0 +1,406 @@
+"""Pipelined sonification, overlapping the reading, the synthesis and the writes.
+
+The events go through three stages, run by threads and connected by bounded queues:
+
+- reader: one thread selects the events in the input data,
+- synth: worker threads convert, match and synthesize the events, encode their
+  samples and render their plots into PNG data,
+- writer: a pool of threads writes the sound and plot files.
+
+The queues provide the backpressure: a stage waits when the next one is behind, so that
+at most a few events per stage are held in memory. The writes to a slow output volume,
+which release the GIL, are thus overlapped with the synthesis of the next events.
+
+The time spent by each stage working, waiting for its input (starved) and waiting for
+room in its output queue (blocked) is recorded in `Pipeline.stats`, to locate the stage
+that limits the throughput.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Collection, Iterator
+
+import numpy as np
+
+from .batch import (
+    PLOT_FILENAME, SOUND_FILENAME, EventResult, _Collector, _get_event_id, _iter_works,
+    _select, sonify_item,
+)
+from .encoding import Encoding, check_encoding, encode_sound, write_samples
+from .filters import Filter
+from .io import Source
+from .lhc_plot import EventPlot
+from .lhc_sonification import ElementCache, get_rate
+from .manifest import Manifest
+from .metrics import NULL_METRICS, Metrics, NullMetrics
+from .store import EventStore
+from .wav import Format
+
+DEFAULT_WRITERS = 2
+DEFAULT_QUEUE_SIZE = 4
+
+STAGES = ['reader', 'synth', 'writer']
+
+# Interval at which the blocked threads check whether the pipeline has been aborted.
+_POLL_INTERVAL = 0.1
+
+# Marks the end of the items of a queue.
+_END = object()
+
+
+class _Aborted(Exception):
+    """Raised in the threads of a pipeline that has been aborted."""
+
+
+@dataclass
+class StageStats:
+    """The activity of a stage of the pipeline.
+
+    Attributes:
+        name: The name of the stage.
+        workers: The number of threads of the stage.
+        items: The number of events processed by the stage.
+        busy: The time spent processing the events, summed over the threads, in seconds.
+        starved: The time spent waiting for an event from the previous stage.
+        blocked: The time spent waiting for room in the queue of the next stage.
+        elapsed: The duration of the run, in seconds.
+    """
+    name: str
+    workers: int
+    items: int = 0
+    busy: float = 0.0
+    starved: float = 0.0
+    blocked: float = 0.0
+    elapsed: float = 0.0
+
+    @property
+    def utilization(self) -> float:
+        """The fraction of the time the threads of the stage were busy."""
+        if not self.elapsed:
+            return 0.0
+        return self.busy / (self.elapsed * self.workers)
+
+
+class Pipeline:
+    """Sonifies events and writes their outputs, with the stages running concurrently.
+
+    Attributes:
+        output_path: The directory in which the sound and plot files are written.
+        include_plot: If set to True, the events are also plotted.
+        synth_workers: The number of threads of the synthesis stage.
+        writers: The number of threads of the writer stage.
+        queue_size: The maximum number of events waiting between two stages.
+        format: The data type of the samples in the sound files.
+        element_cache: The quantization step and the size of the cache of the sound
+            elements of each synthesis thread, if it is used.
+        strict: If set to False, the invalid lines of the events are skipped.
+        encoding: The encoding of the sound files.
+        rate: The sampling rate of the sound files, if the sounds are resampled.
+        stats: The activity of each stage during the current or last run.
+    """
+
+    def __init__(
+        self,
+        output_path: str | Path,
+        include_plot: bool = False,
+        synth_workers: int = 1,
+        writers: int = DEFAULT_WRITERS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        format: Format = 'int16',
+        element_cache: tuple[float | None, int] | None = None,
+        strict: bool = True,
+        encoding: Encoding = 'wav',
+        rate: int | None = None,
+    ) -> None:
+        """The class constructor.
+
+        Parameters:
+            output_path: The directory in which the sound and plot files are written.
+            include_plot: If set to True, the events are also plotted.
+            synth_workers: The number of threads of the synthesis stage.
+            writers: The number of threads of the writer stage.
+            queue_size: The maximum number of events waiting between two stages.
+            format: The data type of the samples in the sound files.
+            element_cache: If specified, the quantization step of the cluster energies
+                and the maximum size in bytes of the cache of the sound elements. Each
+                synthesis thread has its own cache.
+            strict: If set to False, the invalid lines of the events are skipped and
+                reported in the `warnings` of their results.
+            encoding: The encoding of the sound files (see `encoding`).
+            rate: If specified, the sounds are resampled to this rate, in Hertz.
+        """
+        if synth_workers < 1 or writers < 1:
+            raise ValueError('The numbers of synthesis and writer threads must be positive.')
+        if queue_size < 1:
+            raise ValueError(f'The queue size is not positive: {queue_size}.')
+        check_encoding(encoding, format)
+        self.output_path = Path(output_path)
+        self.include_plot = include_plot
+        self.synth_workers = synth_workers
+        self.writers = writers
+        self.queue_size = queue_size
+        self.format = format
+        self.element_cache = element_cache
+        self.strict = strict
+        self.encoding = encoding
+        self.rate = rate
+        self.stats = self._new_stats()
+
+    def run(
+        self,
+        source: Source | EventStore,
+        event_ids: Collection[str] | None = None,
+        start: int = 0,
+        stop: int | None = None,
+        where: Filter | str | None = None,
+        metrics: Metrics | None = None,
+        incremental: bool = False,
+    ) -> Iterator[EventResult]:
+        """Sonifies the selected events of a HYPATIA dump or of an event store.
+
+        The results are yielded as soon as the outputs of the events are written, which
+        may not be in the input order. The failure of an event does not stop the others.
+
+        Parameters:
+            source: The path of the HYPATIA dump, an open stream, an iterable of lines
+                or an event store.
+            event_ids: If specified, only the events with these IDs are sonified.
+            start: The position in the input data of the first event to be sonified.
+            stop: The position in the input data after the last event to be sonified.
+            where: If specified, only the events satisfying this filter are sonified.
+            metrics: If specified, the timings and counts of each event are added to
+                this collector.
+            incremental: If set to True, skip the events whose outputs are up to date,
+                according to the manifest of the output directory.
+
+        Raises:
+            Exception: The error that stopped the reading of the input data.
+        """
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        self.stats = self._new_stats()
+        self._errors: list[BaseException] = []
+        self._aborted = threading.Event()
+        self._synth_queue: queue.Queue = queue.Queue(self.queue_size)
+        self._write_queue: queue.Queue = queue.Queue(self.queue_size)
+        self._result_queue: queue.Queue = queue.Queue(self.queue_size)
+        self._running_synths = self.synth_workers
+        self._lock = threading.Lock()
+
+        with contextlib.ExitStack() as stack:
+            manifest = stack.enter_context(Manifest(self.output_path)) if incremental else None
+            collect = _Collector(None, metrics, manifest)
+            works = _iter_works(
+                _select(source, event_ids, start, stop, where), 1, collect,
+                self.include_plot, self.format, self.encoding, self.rate,
+            )
+            threads = [threading.Thread(target=self._guard(self._read), args=(works,))]
+            threads += [
+                threading.Thread(target=self._guard(self._synthesize), args=(metrics is not None,))
+                for _ in range(self.synth_workers)
+            ]
+            threads += [
+                threading.Thread(target=self._guard(self._write)) for _ in range(self.writers)
+            ]
+            start_time = time.perf_counter()
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+            try:
+                remaining_writers = self.writers
+                while remaining_writers:
+                    item = self._get(self._result_queue)
+                    if item is _END:
+                        remaining_writers -= 1
+                        continue
+                    yield from collect([item])
+            except _Aborted:
+                pass
+            finally:
+                # Also reached when the caller stops iterating over the results.
+                self._aborted.set()
+                for thread in threads:
+                    thread.join()
+                for stats in self.stats.values():
+                    stats.elapsed = time.perf_counter() - start_time
+        if self._errors:
+            raise self._errors[0]
+
+    def _read(self, works: Iterator[list[Any] | EventResult]) -> None:
+        """Selects the events and queues them for the synthesis."""
+        stats = self.stats['reader']
+        try:
+            while True:
+                with self._timer(stats, 'busy'):
+                    work = next(works, _END)
+                if work is _END:
+                    break
+                if isinstance(work, EventResult):
+                    # The outputs of the event are up to date
+                    with self._timer(stats, 'blocked'):
+                        self._put(self._result_queue, work)
+                    continue
+                self._add(stats, 'items', 1)
+                with self._timer(stats, 'blocked'):
+                    self._put(self._synth_queue, work[0])
+        finally:
+            for _ in range(self.synth_workers):
+                self._put(self._synth_queue, _END, force=True)
+
+    def _synthesize(self, collect_metrics: bool) -> None:
+        """Sonifies the events and renders their plots, until the end of the input."""
+        stats = self.stats['synth']
+        plot = EventPlot() if self.include_plot else None
+        metrics = Metrics() if collect_metrics else NULL_METRICS
+        cache = ElementCache(*self.element_cache) if self.element_cache is not None else None
+        try:
+            while True:
+                with self._timer(stats, 'starved'):
+                    item = self._get(self._synth_queue)
+                if item is _END:
+                    break
+                with self._timer(stats, 'busy'):
+                    work = self._sonify(item, plot, metrics, cache)
+                self._add(stats, 'items', 1)
+                with self._timer(stats, 'blocked'):
+                    self._put(self._write_queue, work)
+        finally:
+            with self._lock:
+                self._running_synths -= 1
+                last = self._running_synths == 0
+            if last:
+                for _ in range(self.writers):
+                    self._put(self._write_queue, _END, force=True)
+
+    def _sonify(
+        self,
+        item: tuple[int, Any],
+        plot: EventPlot | None,
+        metrics: NullMetrics,
+        cache: ElementCache | None,
+    ) -> tuple[EventResult, np.ndarray | None, bytes | None]:
+        """Sonifies an event and renders its plot, as `batch.sonify_chunk` does.
+
+        The samples are encoded here rather than by the writers, which only do I/O and
+        thus hold the GIL as little as possible.
+        """
+        index, lines = item
+        result = EventResult(index, _get_event_id(lines))
+        metrics.start_event(result.event_id)
+        samples = png = None
+        try:
+            sound = sonify_item(lines, result, plot, metrics, cache, self.strict)
+            samples = encode_sound(sound, self.format, self.rate)
+            if plot is not None:
+                with metrics.stage('plot'):
+                    buffer = io.BytesIO()
+                    plot.savefig(buffer, format='png')
+                    png = buffer.getvalue()
+        except Exception as exc:
+            result.error = f'{type(exc).__name__}: {exc}'
+        if metrics.enabled:
+            result.metrics = metrics.current
+        metrics.finish()
+        return result, samples, png
+
+    def _write(self) -> None:
+        """Writes the sound and plot files of the events, until the end of the input."""
+        stats = self.stats['writer']
+        try:
+            while True:
+                with self._timer(stats, 'starved'):
+                    work = self._get(self._write_queue)
+                if work is _END:
+                    break
+                result, samples, png = work
+                with self._timer(stats, 'busy'):
+                    self._write_outputs(result, samples, png)
+                self._add(stats, 'items', 1)
+                with self._timer(stats, 'blocked'):
+                    self._put(self._result_queue, result)
+        finally:
+            self._put(self._result_queue, _END, force=True)
+
+    def _write_outputs(
+        self, result: EventResult, samples: np.ndarray | None, png: bytes | None
+    ) -> None:
+        """Writes the outputs of an event, recording the error of the writes if any."""
+        if samples is None:
+            return
+        start = time.perf_counter()
+        try:
+            if png is not None:
+                result.plot_path = self.output_path / PLOT_FILENAME.format(result.event_id)
+                result.plot_path.write_bytes(png)
+            result.sound_path = self.output_path / SOUND_FILENAME.format(
+                result.event_id, self.encoding
+            )
+            write_samples(
+                result.sound_path, samples, self.rate or get_rate(), self.format, self.encoding
+            )
+        except Exception as exc:
+            result.error = f'{type(exc).__name__}: {exc}'
+        if result.metrics is not None:
+            result.metrics.timings['write'] = time.perf_counter() - start
+
+    def _put(self, queue_: queue.Queue, item: Any, force: bool = False) -> None:
+        """Puts an item in a queue, waiting for room unless the pipeline is aborted.
+
+        Parameters:
+            force: If set to True, the end markers are still queued once the pipeline is
+                aborted, if there is room for them.
+        """
+        while True:
+            try:
+                queue_.put(item, timeout=_POLL_INTERVAL)
+                return
+            except queue.Full:
+                if self._aborted.is_set():
+                    if force:
+                        return
+                    raise _Aborted from None
+
+    def _get(self, queue_: queue.Queue) -> Any:
+        """Gets an item from a queue, waiting for one unless the pipeline is aborted."""
+        while True:
+            try:
+                return queue_.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if self._aborted.is_set():
+                    raise _Aborted from None
+
+    def _guard(self, function: Callable[..., None]) -> Callable[..., None]:
+        """Records the error of a thread and aborts the pipeline."""
+        def wrapper(*args) -> None:
+            try:
+                function(*args)
+            except _Aborted:
+                pass
+            except BaseException as exc:
+                self._errors.append(exc)
+                self._aborted.set()
+        return wrapper
+
+    @contextlib.contextmanager
+    def _timer(self, stats: StageStats, name: str) -> Iterator[None]:
+        """Adds the time spent in the block to an attribute of the stage statistics."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(stats, name, time.perf_counter() - start)
+
+    def _add(self, stats: StageStats, name: str, value: float) -> None:
+        """Increments an attribute of the statistics of a stage shared by several threads."""
+        with self._lock:
+            setattr(stats, name, getattr(stats, name) + value)
+
+    def _new_stats(self) -> dict[str, StageStats]:
+        workers = {'reader': 1, 'synth': self.synth_workers, 'writer': self.writers}
+        return {_: StageStats(_, workers[_]) for _ in STAGES}
@@ -0,0 +1,149 @@
+"""Sonification plans: the sound elements of an event, independently of their rendering.
+
+A plan is computed once per event by `lhc_data.plan_event`, which matches the tracks
+and clusters. It lists, in order, the elements of the event with their kind, the IDs
+of the track, clusters and partner tracks they stand for, and the cluster energy.
+
+The plan is then rendered separately:
+
+- into audio, by `EventPlan.to_track`, without the event,
+- into a plot, by `lhc_data.draw_plan`, which looks the tracks and clusters up in the
+  event by ID.
+
+The plans are serializable, and can be stored in a JSON Lines file, one plan per line,
+to be rendered later without matching the events again.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import IO, ContextManager, Iterable, Iterator
+
+from sonounolib import Track
+
+from .lhc_sonification import ElementCache, Timeline
+
+# Incremented when the layout of the serialized plans changes.
+PLAN_VERSION = 1
+
+SECONDS_BETWEEN_ELEMENTS = 1
+
+
+@dataclass
+class PlanElement:
+    """A sound element of an event.
+
+    Attributes:
+        kind: The name of the `lhc_sonification` element.
+        track_id: The ID of the sonified track, or None for a cluster alone.
+        cluster_ids: The IDs of the clusters pointed by the track, or of the cluster
+            alone. Only the first one is sonified.
+        partner_ids: The IDs of the close tracks of opposite charge, which are drawn
+            with the track.
+        energy: The energy of the sonified cluster, if any.
+    """
+    kind: str
+    track_id: str | None = None
+    cluster_ids: list[str] = field(default_factory=list)
+    partner_ids: list[str] = field(default_factory=list)
+    energy: float | None = None
+
+    @property
+    def amplitude(self) -> float | None:
+        """The normalized cluster energy, supposing a range of [0;100]."""
+        return None if self.energy is None else self.energy / 100
+
+
+@dataclass
+class EventPlan:
+    """The ordered sound elements of an event.
+
+    Attributes:
+        event_id: The event ID.
+        elements: The sound elements, in the order in which they are played.
+        gap: The duration of the silence after each element, in seconds.
+    """
+    event_id: str
+    elements: list[PlanElement] = field(default_factory=list)
+    gap: float = SECONDS_BETWEEN_ELEMENTS
+
+    def to_timeline(self) -> Timeline:
+        """Returns the layout of the samples of the elements."""
+        timeline = Timeline()
+        for element in self.elements:
+            timeline.add_element(element.kind, element.amplitude).add_blank(self.gap)
+        return timeline
+
+    def to_track(self, cache: ElementCache | None = None) -> Track:
+        """Renders the sound of the event.
+
+        Parameters:
+            cache: If specified, the samples of the elements are looked up in this cache.
+        """
+        return self.to_timeline().to_track(cache)
+
+    def fingerprint(self, step: float | None = None) -> str:
+        """Returns a digest of the sound of the plan, independent of the event.
+
+        The plans with the same element kinds, in the same order, with the same
+        amplitudes and gap have the same fingerprint, and thus the same sound.
+
+        Parameters:
+            step: If specified, the amplitudes are quantized to this step, as they are by
+                an `ElementCache` with this step before the elements are rendered.
+        """
+        amplitudes = [_.amplitude for _ in self.elements]
+        if step:
+            amplitudes = [None if _ is None else round(_ / step) * step for _ in amplitudes]
+        content = [
+            PLAN_VERSION, self.gap, [[_.kind, a] for _, a in zip(self.elements, amplitudes)]
+        ]
+        return hashlib.sha256(json.dumps(content).encode()).hexdigest()[:32]
+
+    def to_dict(self) -> dict:
+        """Returns the plan as a JSON-serializable dictionary."""
+        return {'plan_version': PLAN_VERSION, **asdict(self)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> EventPlan:
+        """Creates a plan from a dictionary returned by `to_dict`.
+
+        Raises:
+            ValueError: When the plan has been serialized by an incompatible version.
+        """
+        if data.get('plan_version') != PLAN_VERSION:
+            raise ValueError(f'Unsupported plan version: {data.get("plan_version")}.')
+        return cls(
+            event_id=data['event_id'],
+            elements=[PlanElement(**_) for _ in data['elements']],
+            gap=data['gap'],
+        )
+
+
+def save_plans(plans: Iterable[EventPlan], file: str | os.PathLike | IO[str]) -> int:
+    """Writes plans in JSON Lines, one plan per line, and returns their number."""
+    count = 0
+    with _open(file, 'w') as f:
+        for plan in plans:
+            f.write(json.dumps(plan.to_dict()) + '\n')
+            count += 1
+    return count
+
+
+def load_plans(file: str | os.PathLike | IO[str]) -> Iterator[EventPlan]:
+    """Reads the plans written by `save_plans`, one at a time."""
+    with _open(file, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield EventPlan.from_dict(json.loads(line))
+
+
+def _open(file: str | os.PathLike | IO[str], mode: str) -> ContextManager[IO[str]]:
+    """Opens a path, or returns an open stream as is."""
+    if isinstance(file, (str, os.PathLike)):
+        return open(file, mode, encoding='utf-8')
+    return contextlib.nullcontext(file)
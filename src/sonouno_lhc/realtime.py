@@ -0,0 +1,447 @@
+"""Real-time playback of the sonification of a sequence of events.
+
+A producer thread sonifies the upcoming events into a bounded ring buffer, a few
+seconds ahead of the playback (the lookahead), while a consumer thread feeds the
+audio sink with small blocks (the latency). The events are played one after the
+other, without gaps as long as the producer keeps ahead of the playback.
+
+When the ring buffer runs dry while a clocked sink, such as a sound card, is waiting
+for samples, a block of silence is played instead and an underrun is counted.
+
+Three sinks are provided: `SoundDeviceSink` for the sound card, which requires the
+PortAudio library, `FileSink` to record the playback in a WAV file and `NullSink`,
+which discards the samples and is used to test the playback without sound hardware.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import BinaryIO, Callable, Iterable
+
+import numpy as np
+
+from .lhc_data import sonify_event
+from .lhc_sonification import MAX_AMPLITUDE, get_rate
+from .models import Event
+from .wav import Format, WavStreamWriter
+
+DEFAULT_LOOKAHEAD = 5.0
+DEFAULT_LATENCY = 0.05
+
+
+class RingBuffer:
+    """A bounded first-in first-out buffer of samples, shared by two threads.
+
+    Attributes:
+        capacity: The maximum number of samples in the buffer.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """The class constructor.
+
+        Parameters:
+            capacity: The maximum number of samples in the buffer.
+        """
+        if capacity < 1:
+            raise ValueError(f'The capacity of the buffer is not positive: {capacity}.')
+        self.capacity = capacity
+        self._data = np.zeros(capacity)
+        self._start = 0
+        self._size = 0
+        self._closed = False
+        self._aborted = False
+        self._condition = threading.Condition()
+
+    def __len__(self) -> int:
+        """Returns the number of samples in the buffer."""
+        return self._size
+
+    @property
+    def closed(self) -> bool:
+        """True if no more samples will be written."""
+        return self._closed
+
+    def write(self, data: np.ndarray) -> bool:
+        """Appends samples, waiting for room in the buffer.
+
+        Returns:
+            False if the buffer has been aborted before all the samples are written.
+        """
+        offset = 0
+        with self._condition:
+            while offset < len(data):
+                self._condition.wait_for(lambda: self._size < self.capacity or self._aborted)
+                if self._aborted:
+                    return False
+                count = min(len(data) - offset, self.capacity - self._size)
+                stop = (self._start + self._size) % self.capacity
+                first = min(count, self.capacity - stop)
+                self._data[stop:stop + first] = data[offset:offset + first]
+                self._data[:count - first] = data[offset + first:offset + count]
+                self._size += count
+                offset += count
+                self._condition.notify_all()
+        return True
+
+    def read(self, count: int, timeout: float | None = None) -> np.ndarray:
+        """Removes samples from the buffer.
+
+        Parameters:
+            count: The requested number of samples.
+            timeout: The maximum time to wait for the requested samples, in seconds.
+                If None, wait until they are available or the buffer is closed.
+
+        Returns:
+            At most `count` samples, fewer if the wait has timed out or if the buffer
+            is closed.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._size >= count or self._closed or self._aborted, timeout
+            )
+            count = min(count, self._size)
+            first = min(count, self.capacity - self._start)
+            data = np.concatenate([
+                self._data[self._start:self._start + first], self._data[:count - first]
+            ])
+            self._start = (self._start + count) % self.capacity
+            self._size -= count
+            self._condition.notify_all()
+        return data
+
+    def wait_for_fill(self, count: int) -> None:
+        """Waits until the buffer holds at least `count` samples, or is closed."""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._size >= min(count, self.capacity) or self._closed or self._aborted
+            )
+
+    def close(self) -> None:
+        """Signals that no more samples will be written."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def abort(self) -> None:
+        """Wakes up the waiting threads and makes the next writes fail."""
+        with self._condition:
+            self._aborted = True
+            self._closed = True
+            self._condition.notify_all()
+
+
+class Sink:
+    """The destination of the played samples.
+
+    The samples are float64 arrays scaled like the audio tracks, so that the int16
+    maximum amplitude stands for full scale.
+
+    Attributes:
+        clocked: True if the sink consumes the samples at the sampling rate, in which
+            case the playback does not wait for late samples and plays silence.
+    """
+    clocked = False
+
+    def open(self, rate: int, blocksize: int) -> None:
+        """Prepares the sink before the first block."""
+
+    def write(self, block: np.ndarray) -> bool:
+        """Plays a block of samples, and returns True if the sink has underflowed."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Releases the sink, after the last block."""
+
+
+class NullSink(Sink):
+    """A sink discarding the samples, at the pace of a sound card if it is clocked.
+
+    Attributes:
+        nframe: The number of samples written to the sink.
+    """
+
+    def __init__(self, clocked: bool = True) -> None:
+        """The class constructor.
+
+        Parameters:
+            clocked: If set to True, each block is consumed in real time.
+        """
+        self.clocked = clocked
+        self.nframe = 0
+
+    def open(self, rate: int, blocksize: int) -> None:
+        self._rate = rate
+        self._start_time = time.perf_counter()
+        self.nframe = 0
+
+    def write(self, block: np.ndarray) -> bool:
+        late = False
+        if self.clocked:
+            # Like a sound card, wait until the previous samples have been played.
+            delay = self._start_time + self.nframe / self._rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            late = delay < -len(block) / self._rate
+        self.nframe += len(block)
+        return late
+
+
+class FileSink(Sink):
+    """A sink recording the samples in a WAV file, or as raw PCM data."""
+
+    def __init__(
+        self,
+        file: str | os.PathLike | BinaryIO,
+        format: Format = 'int16',
+        raw: bool = False,
+        clocked: bool = False,
+    ) -> None:
+        """The class constructor.
+
+        Parameters:
+            file: The path of the output file, or a binary stream.
+            format: The data type of the samples in the file.
+            raw: If set to True, only the samples are written, without a WAV header.
+            clocked: If set to True, the file is treated as a sound card, so that
+                silence is recorded when the samples are late.
+        """
+        self.file = file
+        self.format = format
+        self.raw = raw
+        self.clocked = clocked
+        self._writer: WavStreamWriter | None = None
+
+    def open(self, rate: int, blocksize: int) -> None:
+        self._writer = WavStreamWriter(self.file, rate, self.format, raw=self.raw)
+
+    def write(self, block: np.ndarray) -> bool:
+        assert self._writer is not None
+        self._writer.write(block)
+        return False
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+class SoundDeviceSink(Sink):
+    """A sink playing the samples on a sound card, through the sounddevice package."""
+    clocked = True
+
+    def __init__(self, device: int | str | None = None) -> None:
+        """The class constructor.
+
+        Parameters:
+            device: The output device, as understood by sounddevice. By default, the
+                default output device is used.
+        """
+        self.device = device
+        self._stream = None
+
+    def open(self, rate: int, blocksize: int) -> None:
+        try:
+            import sounddevice
+        except (ImportError, OSError) as exc:
+            raise RuntimeError(f'The sound card cannot be used: {exc}') from exc
+        self._stream = sounddevice.OutputStream(
+            samplerate=rate,
+            blocksize=blocksize,
+            device=self.device,
+            channels=1,
+            dtype='float32',
+            latency='low',
+        )
+        self._stream.start()
+
+    def write(self, block: np.ndarray) -> bool:
+        assert self._stream is not None
+        return bool(self._stream.write((block / MAX_AMPLITUDE).astype(np.float32)))
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+
+
+@dataclass
+class PlaybackStats:
+    """The statistics of a playback.
+
+    Attributes:
+        events: The number of events sonified.
+        failed_events: The IDs of the events that could not be sonified, and the errors.
+        played_frames: The number of samples sent to the sink, silences included.
+        underruns: The number of blocks that were not ready in time.
+        underrun_frames: The number of samples of silence played instead.
+        sink_underruns: The number of underflows reported by the sink itself.
+        min_fill: The smallest number of samples ahead of the playback, once started.
+    """
+    events: int = 0
+    failed_events: list[tuple[str, str]] = field(default_factory=list)
+    played_frames: int = 0
+    underruns: int = 0
+    underrun_frames: int = 0
+    sink_underruns: int = 0
+    min_fill: int | None = None
+
+
+class RealtimePlayer:
+    """Plays the sonification of events as they are produced.
+
+    Attributes:
+        sink: The destination of the samples.
+        rate: The sampling rate, in Hertz.
+        lookahead: The maximum duration of sound synthesized ahead of the playback,
+            in seconds. It is the size of the ring buffer.
+        latency: The duration of the blocks sent to the sink, in seconds.
+        prefill: The duration of sound synthesized before the playback starts, in
+            seconds.
+        stats: The statistics of the current or last playback.
+    """
+
+    def __init__(
+        self,
+        sink: Sink,
+        lookahead: float = DEFAULT_LOOKAHEAD,
+        latency: float = DEFAULT_LATENCY,
+        prefill: float | None = None,
+    ) -> None:
+        """The class constructor.
+
+        Parameters:
+            sink: The destination of the samples.
+            lookahead: The maximum duration of sound synthesized ahead of the playback.
+            latency: The duration of the blocks sent to the sink.
+            prefill: The duration of sound synthesized before the playback starts. By
+                default, half of the lookahead.
+        """
+        if latency <= 0 or lookahead < latency:
+            raise ValueError('The latency must be positive and not exceed the lookahead.')
+        self.sink = sink
+        self.rate = get_rate()
+        self.lookahead = lookahead
+        self.latency = latency
+        self.prefill = lookahead / 2 if prefill is None else min(prefill, lookahead)
+        self.stats = PlaybackStats()
+        self._threads: list[threading.Thread] = []
+        self._errors: list[BaseException] = []
+
+    def play(
+        self, events: Iterable[Event], on_event: Callable[[str, float], None] | None = None
+    ) -> PlaybackStats:
+        """Plays the events and waits for the end of the playback.
+
+        Parameters:
+            events: The events to be played, which may be produced on the fly.
+            on_event: A function called with the event ID and the playback time, in
+                seconds, when an event starts being played.
+        """
+        self.start(events, on_event)
+        return self.join()
+
+    def start(
+        self, events: Iterable[Event], on_event: Callable[[str, float], None] | None = None
+    ) -> None:
+        """Starts the playback of the events in the background.
+
+        Parameters:
+            events: The events to be played, which may be produced on the fly.
+            on_event: A function called with the event ID and the playback time, in
+                seconds, when an event starts being played.
+        """
+        if any(_.is_alive() for _ in self._threads):
+            raise RuntimeError('The player is already playing.')
+        self.stats = PlaybackStats()
+        self._errors = []
+        self._buffer = RingBuffer(max(1, round(self.lookahead * self.rate)))
+        # Start positions of the events in the played stream, for the callback.
+        self._starts: deque[tuple[int, str]] = deque()
+        self._threads = [
+            threading.Thread(target=self._guard(self._produce), args=(events,), daemon=True),
+            threading.Thread(target=self._guard(self._consume), args=(on_event,), daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> PlaybackStats:
+        """Interrupts the playback."""
+        if self._threads:
+            self._buffer.abort()
+        return self.join()
+
+    def join(self) -> PlaybackStats:
+        """Waits for the end of the playback.
+
+        Raises:
+            Exception: The error that interrupted the producer or the consumer.
+        """
+        for thread in self._threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+        return self.stats
+
+    def _guard(self, function: Callable[..., None]) -> Callable[..., None]:
+        """Records the error of a thread and stops the other one."""
+        def wrapper(*args) -> None:
+            try:
+                function(*args)
+            except BaseException as exc:
+                self._errors.append(exc)
+                self._buffer.abort()
+        return wrapper
+
+    def _produce(self, events: Iterable[Event]) -> None:
+        """Sonifies the events into the ring buffer."""
+        written = 0
+        try:
+            for event in events:
+                try:
+                    sound, _ = sonify_event(event, include_plot=False)
+                except Exception as exc:
+                    self.stats.failed_events.append((event.id, f'{type(exc).__name__}: {exc}'))
+                    continue
+                data = sound.get_data()
+                self._starts.append((written, event.id))
+                if not self._buffer.write(data):
+                    return
+                written += len(data)
+                self.stats.events += 1
+        finally:
+            self._buffer.close()
+
+    def _consume(self, on_event: Callable[[str, float], None] | None) -> None:
+        """Feeds the sink with blocks taken from the ring buffer."""
+        stats = self.stats
+        blocksize = max(1, round(self.latency * self.rate))
+        self._buffer.wait_for_fill(round(self.prefill * self.rate))
+        self.sink.open(self.rate, blocksize)
+        # Number of samples taken from the buffer, which excludes the inserted silences
+        consumed = 0
+        try:
+            while True:
+                if stats.min_fill is None or len(self._buffer) < stats.min_fill:
+                    stats.min_fill = len(self._buffer)
+                # A clocked sink sets the pace: the samples that are not ready are late.
+                block = self._buffer.read(blocksize, 0 if self.sink.clocked else None)
+                if len(block) == 0 and self._buffer.closed:
+                    break
+                if on_event is not None:
+                    while self._starts and self._starts[0][0] < consumed + len(block):
+                        start, event_id = self._starts.popleft()
+                        on_event(event_id, (stats.played_frames + start - consumed) / self.rate)
+                consumed += len(block)
+                if len(block) < blocksize and not self._buffer.closed:
+                    # The producer is late: fill the block with silence.
+                    stats.underruns += 1
+                    stats.underrun_frames += blocksize - len(block)
+                    block = np.concatenate([block, np.zeros(blocksize - len(block))])
+                if self.sink.write(block):
+                    stats.sink_underruns += 1
+                stats.played_frames += len(block)
+        finally:
+            self.sink.close()
@@ -0,0 +1,282 @@
+"""Binary event store, for random access to the events of converted HYPATIA dumps.
+
+A HYPATIA dump is converted once into a directory holding:
+
+- `meta.json`: the format version, and the data type and length of each array.
+- `events.bin`: one record per event, with its ID, run and event numbers and the
+  offsets of its description, tracks and clusters in the other arrays.
+- `tracks.bin` and `clusters.bin`: the structured arrays of all the particle tracks
+  and clusters, as produced by `io.extract_batches`.
+- `descriptions.bin`: the UTF-8 encoded description lines, concatenated.
+
+The arrays are memory-mapped when the store is opened, so that an event is loaded
+without reading the rest of the store.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from .filters import Filter
+from .io import Source, as_filter, extract_batches
+from .models import CLUSTER_DTYPE, TRACK_DTYPE, Cluster, Event, EventBatch, EventHeader, ParticleTrack
+
+FORMAT_NAME = 'sonouno-lhc-store'
+FORMAT_VERSION = 1
+META_FILENAME = 'meta.json'
+
+EVENT_DTYPE = np.dtype([
+    ('id', 'U32'),
+    ('run_number', 'i8'),
+    ('event_number', 'i8'),
+    ('description_start', 'i8'),
+    ('description_stop', 'i8'),
+    ('track_start', 'i8'),
+    ('track_stop', 'i8'),
+    ('cluster_start', 'i8'),
+    ('cluster_stop', 'i8'),
+])
+
+_ARRAY_DTYPES = {
+    'events': EVENT_DTYPE,
+    'tracks': TRACK_DTYPE,
+    'clusters': CLUSTER_DTYPE,
+    'descriptions': np.dtype('u1'),
+}
+
+
+def is_store(path: str | os.PathLike) -> bool:
+    """Returns True if the path is the directory of an event store."""
+    return (Path(path) / META_FILENAME).is_file()
+
+
+def convert_to_store(
+    source: Source,
+    path: str | os.PathLike,
+    batch_size: int = 1000,
+    where: Filter | str | None = None,
+    strict: bool = True,
+) -> EventStore:
+    """Converts a HYPATIA dump into an event store.
+
+    The dump is read and written one batch of events at a time.
+
+    Parameters:
+        source: The path of the HYPATIA dump, an open stream or an iterable of lines.
+        path: The directory of the event store. It is created if needed.
+        batch_size: The number of events converted at once.
+        where: If specified, only the events satisfying this filter are stored.
+        strict: If set to False, the invalid lines are skipped and logged, instead of
+            stopping the conversion (see `io.convert_batch`).
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    counts = dict.fromkeys(_ARRAY_DTYPES, 0)
+    files = {name: (path / f'{name}.bin').open('wb') for name in _ARRAY_DTYPES}
+    try:
+        for batch in extract_batches(source, batch_size, where, strict):
+            descriptions = [_.encode() for _ in batch.descriptions]
+            description_offsets = np.cumsum([0] + [len(_) for _ in descriptions])
+            events = np.empty(len(batch), EVENT_DTYPE)
+            events['id'] = batch.ids
+            events['run_number'], events['event_number'] = np.array(
+                [_parse_numbers(_) for _ in batch.descriptions], dtype=np.int64
+            ).reshape(-1, 2).T
+            events['description_start'] = counts['descriptions'] + description_offsets[:-1]
+            events['description_stop'] = counts['descriptions'] + description_offsets[1:]
+            events['track_start'] = counts['tracks'] + batch.track_offsets[:-1]
+            events['track_stop'] = counts['tracks'] + batch.track_offsets[1:]
+            events['cluster_start'] = counts['clusters'] + batch.cluster_offsets[:-1]
+            events['cluster_stop'] = counts['clusters'] + batch.cluster_offsets[1:]
+
+            for name, data in [
+                ('events', events),
+                ('tracks', batch.tracks),
+                ('clusters', batch.clusters),
+                ('descriptions', np.frombuffer(b''.join(descriptions), np.uint8)),
+            ]:
+                data.tofile(files[name])
+                counts[name] += len(data)
+    finally:
+        for file in files.values():
+            file.close()
+
+    meta = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'arrays': {
+            name: {'dtype': np.lib.format.dtype_to_descr(dtype), 'length': counts[name]}
+            for name, dtype in _ARRAY_DTYPES.items()
+        },
+    }
+    (path / META_FILENAME).write_text(json.dumps(meta, indent=2))
+    return EventStore(path)
+
+
+def _parse_numbers(description: str) -> tuple[int, int]:
+    """Returns the run and event numbers of a description line, or -1 if it is invalid."""
+    try:
+        header = EventHeader.from_data(description)
+    except ValueError:
+        return -1, -1
+    return header.run_number, header.event_number
+
+
+class EventStore:
+    """Read access to an event store, by position or by event ID.
+
+    Attributes:
+        path: The directory of the event store.
+        events: The event records, of data type `EVENT_DTYPE`.
+        tracks: The particle tracks of all the events.
+        clusters: The clusters of all the events.
+    """
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        """The class constructor.
+
+        Parameters:
+            path: The directory of the event store.
+        """
+        self.path = Path(path)
+        meta = json.loads((self.path / META_FILENAME).read_text())
+        if meta.get('format') != FORMAT_NAME or meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f'Unsupported event store format in {self.path}.')
+        arrays = {}
+        for name, dtype in _ARRAY_DTYPES.items():
+            info = meta['arrays'][name]
+            if np.lib.format.descr_to_dtype(_as_descr(info['dtype'])) != dtype:
+                raise ValueError(f'Unexpected data type for the {name} of {self.path}.')
+            arrays[name] = _memmap(self.path / f'{name}.bin', dtype, info['length'])
+        self.events = arrays['events']
+        self.tracks = arrays['tracks']
+        self.clusters = arrays['clusters']
+        self._descriptions = arrays['descriptions']
+        self._index: dict[str, list[int]] | None = None
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def __iter__(self) -> Iterator[Event]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, index: int) -> Event:
+        """Returns the event at the specified position."""
+        record = self.events[index]
+        return Event(
+            id=str(record['id']),
+            description=self._descriptions[record['description_start']:record['description_stop']].tobytes().decode(),
+            tracks=[ParticleTrack(*_) for _ in self.tracks[record['track_start']:record['track_stop']].tolist()],
+            clusters=[Cluster(*_) for _ in self.clusters[record['cluster_start']:record['cluster_stop']].tolist()],
+            # The store only keeps the tracks and clusters
+            sections=None,
+        )
+
+    @property
+    def ids(self) -> np.ndarray:
+        """The IDs of the events."""
+        return self.events['id']
+
+    def positions(self, event_id: str, run_number: int | None = None) -> list[int]:
+        """Returns the positions of the events with an ID and possibly a run number.
+
+        The index of the event IDs is built on first use.
+        """
+        if self._index is None:
+            self._index = {}
+            for index, id_ in enumerate(self.events['id'].tolist()):
+                self._index.setdefault(id_, []).append(index)
+        candidates = self._index.get(str(event_id), [])
+        if run_number is not None:
+            candidates = [_ for _ in candidates if self.events['run_number'][_] == run_number]
+        return candidates
+
+    def find(self, event_id: str, run_number: int | None = None) -> int:
+        """Returns the position of an event.
+
+        Parameters:
+            event_id: The event ID.
+            run_number: The run number, required if several runs have an event with
+                the same ID.
+
+        Raises:
+            KeyError: When the event is not in the store.
+            ValueError: When the event ID is ambiguous.
+        """
+        candidates = self.positions(event_id, run_number)
+        if not candidates:
+            raise KeyError(event_id if run_number is None else (event_id, run_number))
+        if len(candidates) > 1:
+            raise ValueError(f'Several events have the ID {event_id}: specify the run number.')
+        return candidates[0]
+
+    def get(self, event_id: str, run_number: int | None = None) -> Event:
+        """Returns an event, given its ID and possibly its run number."""
+        return self[self.find(event_id, run_number)]
+
+    def select(
+        self, where: Filter | str, start: int = 0, stop: int | None = None, batch_size: int = 10_000
+    ) -> np.ndarray:
+        """Returns the positions of the events satisfying a filter.
+
+        The filter is evaluated on the columns of the memory-mapped arrays, one batch of
+        events at a time, without creating the events.
+
+        Parameters:
+            where: The filter (see `filters`).
+            start: The position of the first event to be tested.
+            stop: The position after the last event to be tested.
+            batch_size: The number of events tested at once.
+        """
+        where = as_filter(where)
+        start, stop, _ = slice(start, stop).indices(len(self))
+        positions = [np.empty(0, np.int64)]
+        for batch_start in range(start, stop, batch_size):
+            batch = self.batch(batch_start, min(batch_start + batch_size, stop))
+            positions.append(batch_start + np.flatnonzero(where.evaluate(batch)))
+        return np.concatenate(positions)
+
+    def batch(self, start: int = 0, stop: int | None = None) -> EventBatch:
+        """Returns a range of events, without copying their tracks and clusters.
+
+        Parameters:
+            start: The position of the first event.
+            stop: The position after the last event.
+        """
+        records = self.events[start:stop]
+        if len(records) == 0:
+            return EventBatch([], [], self.tracks[:0], self.clusters[:0], np.zeros(1, np.int64), np.zeros(1, np.int64))
+        track_start, cluster_start = records['track_start'][0], records['cluster_start'][0]
+        track_stop, cluster_stop = records['track_stop'][-1], records['cluster_stop'][-1]
+        return EventBatch(
+            ids=records['id'].tolist(),
+            descriptions=[
+                self._descriptions[_['description_start']:_['description_stop']].tobytes().decode()
+                for _ in records
+            ],
+            tracks=self.tracks[track_start:track_stop],
+            clusters=self.clusters[cluster_start:cluster_stop],
+            track_offsets=np.append(records['track_start'], track_stop) - track_start,
+            cluster_offsets=np.append(records['cluster_start'], cluster_stop) - cluster_start,
+        )
+
+
+def _as_descr(descr: str | list) -> str | list:
+    """Restores the tuples of a data type description read from JSON."""
+    if isinstance(descr, str):
+        return descr
+    return [tuple(_as_descr(_) if isinstance(_, list) else _ for _ in field) for field in descr]
+
+
+def _memmap(path: Path, dtype: np.dtype, length: int) -> np.ndarray:
+    """Memory-maps an array file in read-only mode."""
+    if length == 0:
+        # Empty files cannot be memory-mapped
+        return np.empty(0, dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(length,))
@@ -0,0 +1,230 @@
+"""Streaming output of the sonification of many events, as one continuous sound.
+
+The samples are appended to the output as soon as they are synthesized, so that the
+memory does not depend on the number of events. The output is either a WAV file,
+whose header is fixed up when the writer is closed, or raw PCM samples, which can be
+piped to another program (for example `aplay -f S16_LE -r 44100`).
+
+The boundaries of the events can be recorded as markers, in a cue chunk of the WAV
+file and/or in a CSV sidecar file.
+"""
+
+from __future__ import annotations
+
+import csv
+import os
+import struct
+from typing import BinaryIO, Literal
+
+import numpy as np
+
+Format = Literal['int8', 'int16', 'int32', 'float32', 'float64']
+
+# The RIFF sizes are 32-bit unsigned integers.
+_MAX_RIFF_SIZE = 0xFFFFFFFF
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_IEEE_FLOAT = 0x0003
+
+
+def encode(data: np.ndarray, format: Format, max_amplitude: float = np.iinfo('int16').max) -> np.ndarray:
+    """Converts samples to the data type of a sound file, as `Track.to_wav` does.
+
+    Parameters:
+        data: The samples, such that `max_amplitude` is the maximum amplitude.
+        format: The data type of the samples in the sound file.
+        max_amplitude: The maximum amplitude of the input samples.
+    """
+    if format.startswith('float'):
+        required_max_amplitude = 1.0
+    else:
+        required_max_amplitude = float(np.iinfo(format).max)
+    return (data * (required_max_amplitude / max_amplitude)).astype(format, copy=False)
+
+
+class WavStreamWriter:
+    """Writes a sound to a WAV file or a raw PCM stream, one piece at a time.
+
+    The writer is a context manager, which closes the output on exit.
+
+    Attributes:
+        rate: The sampling rate, in Hertz.
+        format: The data type of the samples.
+        nframe: The number of samples written so far.
+        markers: The position, in samples, and the label of each marker.
+    """
+
+    def __init__(
+        self,
+        file: str | os.PathLike | BinaryIO,
+        rate: int,
+        format: Format = 'int16',
+        raw: bool = False,
+        cue_chunk: bool = False,
+        sidecar: str | os.PathLike | None = None,
+    ) -> None:
+        """The class constructor.
+
+        Parameters:
+            file: The path of the output file, or a binary stream such as
+                `sys.stdout.buffer`. If the stream cannot be sought, the sizes in the
+                WAV header are left to their maximum value, as is common for streamed
+                WAV data.
+            rate: The sampling rate, in Hertz.
+            format: The data type of the samples.
+            raw: If set to True, only the samples are written, without a WAV header.
+            cue_chunk: If set to True, the markers are written in a cue chunk and their
+                labels in an associated data list, at the end of the WAV file. It
+                requires a file that can be sought.
+            sidecar: The path of a CSV file in which the markers are written as they
+                are added.
+        """
+        if raw and cue_chunk:
+            raise ValueError('Markers cannot be written in a cue chunk of raw PCM data.')
+        self.rate = rate
+        self.format = format
+        self.raw = raw
+        self.cue_chunk = cue_chunk
+        self.nframe = 0
+        self.markers: list[tuple[int, str]] = []
+        self._dtype = np.dtype(format).newbyteorder('<')
+
+        if isinstance(file, (str, os.PathLike)):
+            self._file: BinaryIO = open(file, 'wb')
+            self._owns_file = True
+        else:
+            self._file = file
+            self._owns_file = False
+        self._seekable = _is_seekable(self._file)
+        self._origin = self._file.tell() if self._seekable else 0
+        if cue_chunk and not self._seekable:
+            raise ValueError('Markers can only be written in a cue chunk of a regular file.')
+
+        self._sidecar = None
+        if sidecar is not None:
+            self._sidecar = open(sidecar, 'w', newline='', encoding='utf-8')
+            self._sidecar_writer = csv.writer(self._sidecar)
+            self._sidecar_writer.writerow(['label', 'sample', 'time'])
+
+        self._data_start = 0
+        if not raw:
+            self._write_header()
+        self.closed = False
+
+    def __enter__(self) -> WavStreamWriter:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @property
+    def duration(self) -> float:
+        """The duration of the sound written so far, in seconds."""
+        return self.nframe / self.rate
+
+    def write(self, data: np.ndarray, encoded: bool = False) -> None:
+        """Appends samples to the output.
+
+        Parameters:
+            data: The samples, with the int16 maximum amplitude of the audio tracks.
+            encoded: If set to True, the samples have already been converted by `encode`
+                to the data type of the output.
+        """
+        if not encoded:
+            data = encode(data, self.format)
+        elif data.dtype != np.dtype(self.format):
+            raise ValueError(f'The samples are not encoded as {self.format}: {data.dtype}.')
+        if not self.raw:
+            size = self._data_start + (self.nframe + len(data)) * self._dtype.itemsize
+            if size > _MAX_RIFF_SIZE:
+                raise ValueError('The WAV file size limit is reached: use a raw PCM output.')
+        data = data.astype(self._dtype, copy=False)
+        if self._dtype.itemsize == 1:
+            # The 8-bit samples of WAV files are unsigned: flipping the sign bit adds 128.
+            data = data.view(np.uint8) ^ 0x80
+        self._file.write(data.tobytes())
+        self.nframe += len(data)
+
+    def add_marker(self, label: str) -> None:
+        """Marks the current position of the output, such as the start of an event."""
+        self.markers.append((self.nframe, label))
+        if self._sidecar is not None:
+            self._sidecar_writer.writerow([label, self.nframe, f'{self.duration:.6f}'])
+            self._sidecar.flush()
+
+    def close(self) -> None:
+        """Writes the markers, fixes up the WAV header and closes the output."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if not self.raw and self._seekable:
+                data_size = self.nframe * self._dtype.itemsize
+                if data_size % 2:
+                    self._file.write(b'\x00')
+                if self.cue_chunk and self.markers:
+                    self._file.write(_build_cue_chunks(self.markers))
+                end = self._file.tell()
+                self._file.seek(self._origin + 4)
+                self._file.write(struct.pack('<I', end - self._origin - 8))
+                self._file.seek(self._origin + self._data_start - 4)
+                self._file.write(struct.pack('<I', data_size))
+                if self._fact_position is not None:
+                    self._file.seek(self._origin + self._fact_position)
+                    self._file.write(struct.pack('<I', self.nframe))
+                self._file.seek(end)
+            self._file.flush()
+        finally:
+            if self._owns_file:
+                self._file.close()
+            if self._sidecar is not None:
+                self._sidecar.close()
+
+    def _write_header(self) -> None:
+        """Writes the WAV header, with placeholder sizes if the output can be sought."""
+        is_float = self._dtype.kind == 'f'
+        unknown_size = 0 if self._seekable else _MAX_RIFF_SIZE
+        bit_depth = self._dtype.itemsize * 8
+        fmt = struct.pack(
+            '<HHIIHH',
+            _WAVE_FORMAT_IEEE_FLOAT if is_float else _WAVE_FORMAT_PCM,
+            1,
+            self.rate,
+            self.rate * self._dtype.itemsize,
+            self._dtype.itemsize,
+            bit_depth,
+        )
+        if is_float:
+            # cbSize field, for non-PCM formats
+            fmt += b'\x00\x00'
+        header = b'RIFF' + struct.pack('<I', unknown_size) + b'WAVE'
+        header += b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+        self._fact_position = None
+        if is_float:
+            # fact chunk, for non-PCM formats
+            self._fact_position = len(header) + 8
+            header += b'fact' + struct.pack('<II', 4, unknown_size)
+        header += b'data' + struct.pack('<I', unknown_size)
+        self._file.write(header)
+        self._data_start = len(header)
+
+
+def _build_cue_chunks(markers: list[tuple[int, str]]) -> bytes:
+    """Returns the cue chunk and the associated data list of the markers."""
+    cue = struct.pack('<I', len(markers))
+    labels = b''
+    for identifier, (position, label) in enumerate(markers, 1):
+        cue += struct.pack('<II4sIII', identifier, position, b'data', 0, 0, position)
+        text = label.encode() + b'\x00'
+        labels += b'labl' + struct.pack('<II', 4 + len(text), identifier) + text
+        if len(text) % 2:
+            labels += b'\x00'
+    adtl = b'adtl' + labels
+    return b'cue ' + struct.pack('<I', len(cue)) + cue + b'LIST' + struct.pack('<I', len(adtl)) + adtl
+
+
+def _is_seekable(file: BinaryIO) -> bool:
+    """Returns True if the output can be sought, to fix up the WAV header."""
+    try:
+        return file.seekable()
+    except (AttributeError, ValueError):
+        return False
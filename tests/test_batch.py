@@ -0,0 +1,54 @@
+from importlib import resources
+
+import pytest
+
+from sonouno_lhc import data
+from sonouno_lhc.batch import sonify_events
+from sonouno_lhc.io import SEPARATOR, iter_event_lines
+
+WHERE = 'any(tracks.field3 > 1)'
+
+
+@pytest.fixture
+def bad_dump(tmp_path):
+    """The first two events of the data sample, with an invalid track line each."""
+    events = list(iter_event_lines(resources.files(data) / 'sonification_reduced.txt'))[:2]
+    # A non-numeric value in the column read by the filter, and a short row
+    events[0].insert(2, 'track_99 + 1 abc 0.1 1.5 0 0 0 0 0 0 0 0 0 0 0 0 0')
+    events[1].insert(3, 'track_99 +')
+    path = tmp_path / 'bad.txt'
+    path.write_text(''.join('\n'.join(_) + f'\n{SEPARATOR}\n' for _ in events))
+    return path, [_[0] for _ in events]
+
+
+def test_lenient_with_filter(bad_dump, tmp_path):
+    path, event_ids = bad_dump
+    results = list(sonify_events(path, tmp_path / 'outputs', where=WHERE, strict=False))
+    assert [_.event_id for _ in results] == event_ids
+    assert all(_.ok for _ in results)
+    assert [len(_.warnings) for _ in results] == [1, 1]
+    assert 'line 3' in results[0].warnings[0]
+    assert 'line 4' in results[1].warnings[0]
+
+
+def test_strict_with_filter(bad_dump, tmp_path):
+    path, event_ids = bad_dump
+    results = list(sonify_events(path, tmp_path / 'outputs', where=WHERE))
+    assert [_.event_id for _ in results] == event_ids
+    assert [_.ok for _ in results] == [False, False]
+    assert 'line 3' in results[0].error
+
+
+def test_dedup_renders_once(tmp_path):
+    lines = next(iter_event_lines(resources.files(data) / 'sonification_reduced.txt'))
+    path = tmp_path / 'same.txt'
+    path.write_text(''.join('\n'.join([str(_), *lines[1:]]) + f'\n{SEPARATOR}\n' for _ in range(12)))
+    results = list(
+        sonify_events(path, tmp_path / 'outputs', workers=4, chunksize=1, dedup=True)
+    )
+    assert all(_.ok for _ in results)
+    assert len({_.sound_path for _ in results}) == 1
+    assert sum(not _.reused for _ in results) == 1
+    assert sorted(_.name for _ in (tmp_path / 'outputs').iterdir()) == [
+        'dedup.jsonl', results[0].sound_path.name
+    ]
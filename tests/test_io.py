@@ -0,0 +1,36 @@
+from importlib import resources
+
+import pytest
+
+from sonouno_lhc import data
+from sonouno_lhc.io import convert_batch, convert_event, iter_event_lines
+
+INVALID_LINE = 'track_99 + 1 2'
+
+
+@pytest.fixture
+def lines():
+    """The first event of the data sample, with the same invalid line twice."""
+    lines = next(iter_event_lines(resources.files(data) / 'sonification_reduced.txt'))
+    lines.insert(2, INVALID_LINE)
+    lines.insert(5, INVALID_LINE)
+    return lines
+
+
+def test_convert_event_line_numbers(lines):
+    event = convert_event(lines, strict=False)
+    assert [_.line_number for _ in event.errors] == [3, 6]
+
+
+def test_convert_batch_line_numbers(lines, caplog):
+    convert_batch([lines], strict=False)
+    assert ['line 3' in _.message for _ in caplog.records] == [True, False]
+    assert ['line 6' in _.message for _ in caplog.records] == [False, True]
+
+
+
+def test_batch_sections():
+    lines = next(iter_event_lines(resources.files(data) / 'sonification_reduced.txt'))
+    lines += ['Tiles', '1 2.5 0.1 0.2']
+    assert len(convert_event(lines).tiles) == 1
+    assert len(convert_batch([lines]).event(0).tiles) == 1
@@ -0,0 +1,72 @@
+import math
+
+import numpy as np
+import pytest
+
+from sonouno_lhc.lhc_data import _render_element, plan_event, sonify_track
+from sonouno_lhc.matching import match_tracks
+from sonouno_lhc.models import Cluster, Event, ParticleTrack
+
+
+def brute_force(track_phi, track_theta, track_charge, cluster_phi, cluster_theta):
+    """The nested loops of the former sonification."""
+    clusters = []
+    partners = []
+    for i, (phi, theta) in enumerate(zip(track_phi, track_theta)):
+        clusters.append([
+            j for j, (phi2, theta2) in enumerate(zip(cluster_phi, cluster_theta))
+            if math.sqrt((phi - phi2) ** 2 + (theta - theta2) ** 2) <= 0.07
+        ])
+        partners.append([
+            j for j in range(i + 1, len(track_phi))
+            if math.sqrt((phi - track_phi[j]) ** 2 + (theta - track_theta[j]) ** 2) < 0.04
+            and track_charge[i] != track_charge[j]
+        ])
+    return clusters, partners
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_match_tracks_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    ntrack = rng.integers(0, 30)
+    ncluster = rng.integers(0, 10)
+    # A small region, so that many tracks and clusters are neighbours
+    extent = rng.choice([0.1, 0.5, np.pi])
+    track_phi = rng.uniform(-extent, extent, ntrack).tolist()
+    track_theta = rng.uniform(0, extent, ntrack).tolist()
+    track_charge = rng.choice([-1, 1], ntrack).tolist()
+    cluster_phi = rng.uniform(-extent, extent, ncluster).tolist()
+    cluster_theta = rng.uniform(0, extent, ncluster).tolist()
+
+    matches = match_tracks(track_phi, track_theta, track_charge, cluster_phi, cluster_theta)
+    expected_clusters, expected_partners = brute_force(
+        track_phi, track_theta, track_charge, cluster_phi, cluster_theta
+    )
+    assert matches.clusters == expected_clusters
+    assert matches.partners == expected_partners
+
+
+def make_track(id, charge, phi, theta, is_muon=False):
+    return ParticleTrack(id, charge, 1, 1, phi, theta, 0, 0, 0, 0, 0, is_muon, *[0] * 7)
+
+
+def make_cluster(id, phi, theta, energy=50):
+    return Cluster(id, 0, 0, energy, phi, theta, 0, *[0] * 12)
+
+
+def test_sonify_track_matches():
+    """sonify_track searches the pointed clusters and close tracks in its arguments."""
+    tracks = [
+        make_track('track_1', 1, 0.5, 1.0),
+        make_track('track_2', -1, 0.51, 1.0),
+        make_track('track_3', 1, -1.0, 2.0),
+    ]
+    clusters = [make_cluster('cluster_1', 0.52, 1.0), make_cluster('cluster_2', 2.0, 0.5)]
+    event = Event('1', '', tracks, clusters)
+    element = plan_event(event).elements[0]
+    assert element.kind == 'doubletrack_withcluster'
+
+    sonified_ids = set()
+    sound = sonify_track(sonified_ids, tracks[0], tracks[1:], clusters, False)
+    assert sonified_ids == {'track_2', 'cluster_1'}
+    assert np.array_equal(sound.get_data(), _render_element(element).get_data())